@@ -0,0 +1,263 @@
+"""
+Benchmarks for the geometry and processing pipeline of libnanocnc.
+
+Every stage is run on synthetic jobs of increasing vertex count and the best
+time of several runs and the peak memory of one run are reported.
+
+Usage:
+    python benchmarks/bench_nanocnc.py
+    python benchmarks/bench_nanocnc.py --sizes 1000 1000000 --save baseline.json
+    python benchmarks/bench_nanocnc.py --compare baseline.json --threshold 1.2
+"""
+
+import argparse
+import copy
+import io
+import json
+import logging
+import math
+import pathlib
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from nanocnc import libnanocnc  # noqa: E402
+from nanocnc.libnanocnc import Point, Polygon  # noqa: E402
+
+
+def ngon(n, radius=100.0, cx=0.0, cy=0.0):
+    """Regular polygon with n vertices."""
+    t = [2 * math.pi * index / n for index in range(n)]
+    xlist = [cx + radius * math.cos(v) for v in t]
+    ylist = [cy + radius * math.sin(v) for v in t]
+    return Polygon(xlist + xlist[:1], ylist + ylist[:1])
+
+
+def star(n, radius=100.0, ratio=0.5, cx=0.0, cy=0.0):
+    """Star polygon with n vertices alternating between radius and ratio * radius."""
+    t = [2 * math.pi * index / n for index in range(n)]
+    r = [radius if index % 2 == 0 else radius * ratio for index in range(n)]
+    xlist = [cx + rv * math.cos(v) for rv, v in zip(r, t)]
+    ylist = [cy + rv * math.sin(v) for rv, v in zip(r, t)]
+    return Polygon(xlist + xlist[:1], ylist + ylist[:1])
+
+
+def nested_sheet(n, seed=0):
+    """Sheet of parts with holes with n vertices in total, returns list of Polygon."""
+    rnd = random.Random(seed)
+    polygonlist = []
+    count = 0
+    column = 0
+    while count < n:
+        vertices = rnd.randint(8, 64)
+        cx, cy = 100 * (column % 50), 100 * (column // 50)
+        polygonlist.append(ngon(vertices, rnd.uniform(30, 45), cx, cy))
+        polygonlist.append(star(vertices, rnd.uniform(10, 20), 0.6, cx, cy))
+        count += 2 * vertices
+        column += 1
+    return polygonlist
+
+
+def bezier_svg(n, number_of_samples=50):
+    """SVG document with closed paths of cubic Bezier curves flattening to n vertices."""
+    curves = max(4, n // number_of_samples)
+    pathlist = []
+    while curves > 0:
+        count = min(curves, 400)
+        curves -= count
+        cx, cy = 300 * len(pathlist), 0
+        commands = []
+        for index in range(count):
+            a0, a1 = 2 * math.pi * index / count, 2 * math.pi * (index + 1) / count
+            r = 100 if index % 2 else 80
+            x0, y0 = cx + r * math.cos(a0), cy + r * math.sin(a0)
+            x1, y1 = cx + 100 * math.cos(a1), cy + 100 * math.sin(a1)
+            if index == 0:
+                commands.append(f"M {x0:.4f} {y0:.4f}")
+            commands.append(f"C {x0 + 5:.4f} {y0 + 5:.4f} {x1 - 5:.4f} {y1 - 5:.4f} {x1:.4f} {y1:.4f}")
+        commands.append("Z")
+        pathlist.append('<path d="{}"/>'.format(" ".join(commands)))
+    return '<svg xmlns="http://www.w3.org/2000/svg">{}</svg>'.format("".join(pathlist))
+
+
+def fragment_svg(n):
+    """SVG document with closed contours of n single line paths in shuffled order."""
+    rnd = random.Random(0)
+    pathlist = []
+    for start in range(0, n, 64):
+        cx, cy = 100 * (start // 64 % 50), 100 * (start // 64 // 50)
+        for index in range(min(64, n - start)):
+            a0, a1 = 2 * math.pi * index / 64, 2 * math.pi * (index + 1) / 64
+            pathlist.append(f'<path d="M {cx + 40 * math.cos(a0):.6f} {cy + 40 * math.sin(a0):.6f} L {cx + 40 * math.cos(a1):.6f} {cy + 40 * math.sin(a1):.6f}"/>')
+    rnd.shuffle(pathlist)
+    return '<svg xmlns="http://www.w3.org/2000/svg">{}</svg>'.format("".join(pathlist))
+
+
+def dxf_text(n):
+    """ASCII DXF document with n vertices in closed LWPOLYLINEs, contours of LINEs and CIRCLEs."""
+    pairs = ["0", "SECTION", "2", "ENTITIES"]
+    count, column = 0, 0
+    while count < n:
+        cx, cy = 100 * (column % 50), 100 * (column // 50)
+        pairs += ["0", "LWPOLYLINE", "8", "0", "90", "64", "70", "1"]
+        for index in range(64):
+            t = 2 * math.pi * index / 64
+            pairs += ["10", f"{cx + 40 * math.cos(t):.6f}", "20", f"{cy + 40 * math.sin(t):.6f}"]
+            if index % 8 == 0:
+                pairs += ["42", "0.1"]
+        corners = [(cx - 10, cy - 10), (cx + 10, cy - 10), (cx + 10, cy + 10), (cx - 10, cy + 10)]
+        for (x1, y1), (x2, y2) in zip(corners, corners[1:] + corners[:1]):
+            pairs += ["0", "LINE", "8", "0", "10", f"{x1:.6f}", "20", f"{y1:.6f}", "30", "0.0", "11", f"{x2:.6f}", "21", f"{y2:.6f}", "31", "0.0"]
+        pairs += ["0", "CIRCLE", "8", "0", "10", f"{cx + 25:.6f}", "20", f"{cy:.6f}", "30", "0.0", "40", "5.0"]
+        count += 64 + 4
+        column += 1
+    return "\n".join(pairs + ["0", "ENDSEC", "0", "EOF"]) + "\n"
+
+
+def adjacent_cuts(n, diameter=3.0):
+    """Cut paths of a grid of squares spaced by diameter with n vertices in total, returns list of list of Point."""
+    side = 10.0
+    pitch = side + diameter
+    columns = max(1, int(math.sqrt(n / 16)))
+    pointlists = []
+    for index in range(max(1, n // 16)):
+        x0, y0 = pitch * (index % columns) - diameter / 2, pitch * (index // columns) - diameter / 2
+        t = [pitch * k / 4 for k in range(4)]
+        xy = [(x0 + v, y0) for v in t] + [(x0 + pitch, y0 + v) for v in t] + [(x0 + pitch - v, y0 + pitch) for v in t] + [(x0, y0 + pitch - v) for v in t]
+        pointlists.append([Point(x, y) for x, y in xy + xy[:1]])
+    return pointlists
+
+
+def make_job(polygonlist, diameter=3.0):
+    """Job dictionary with an inner cut, corners, tabs and overcuts for every polygon."""
+    pathlist, cornerlist, tablist = [], [], []
+    for polygon in polygonlist:
+        parentid, cutid = len(pathlist), len(pathlist) + 1
+        cutpolygon = polygon.expand(diameter / 2)
+        pathlist.append(dict(id=parentid, parentid=None, pathattr=2, tool=0, polygon=polygon.asdict()))
+        pathlist.append(dict(id=cutid, parentid=parentid, pathattr=5, tool=0, polygon=cutpolygon.asdict()))
+        for x, y in zip(cutpolygon.xlist[:-1], cutpolygon.ylist[:-1]):
+            cornerlist.append(dict(id=len(cornerlist), parentid=cutid, pos=[x, y]))
+        x1, y1, x2, y2 = cutpolygon.xlist[0], cutpolygon.ylist[0], cutpolygon.xlist[1], cutpolygon.ylist[1]
+        tablist.append(dict(refid=cutid, parentid=parentid, pos=[(x1 + x2) / 2, (y1 + y2) / 2], width=4.0, height=2.0, linepoints=[x1, y1, x2, y2]))
+    dictobj = dict(settings=dict(savez=10, materialthickness=10), pathlist=pathlist, tablist=tablist, overcutlist=[], cornerlist=cornerlist, toollist=[dict(Diameter=diameter)])
+    libnanocnc.auto_overcuts(dictobj)
+    return dictobj
+
+
+def with_polygonpoints(dictobj):
+    dictobj = copy.deepcopy(dictobj)
+    for path in dictobj["pathlist"]:
+        path["polygonpoints"] = [Point(x, y) for x, y in zip(path["polygon"]["xlist"], path["polygon"]["ylist"])]
+    return dictobj
+
+
+def stages(size, tmpdir):
+    """Return list of (stage name, setup, function), setup() returns the argument of function."""
+    svgfile = pathlib.Path(tmpdir) / f"bezier{size}.svg"
+    svgfile.write_text(bezier_svg(size))
+    fragmentfile = pathlib.Path(tmpdir) / f"fragments{size}.svg"
+    fragmentfile.write_text(fragment_svg(size))
+    dxffile = pathlib.Path(tmpdir) / f"parts{size}.dxf"
+    dxffile.write_text(dxf_text(size))
+    circle, spiky = ngon(size), star(size)
+    grid = adjacent_cuts(size)
+    job = make_job(nested_sheet(size))
+    text = json.dumps(job)
+    program = libnanocnc.make_gcode(with_polygonpoints(job))
+    toolpath = libnanocnc.parse_gcode(program)
+    return [
+        ("svg2polygon", lambda: svgfile, lambda filename: libnanocnc.svg2polygon(filename)),
+        ("svg2polygon fragments", lambda: fragmentfile, lambda filename: libnanocnc.svg2polygon(filename)),
+        ("dxf2polygon", lambda: dxffile, lambda filename: libnanocnc.dxf2polygon(filename)),
+        ("simplify ngon", lambda: circle, lambda polygon: polygon.simplify(0.01)),
+        ("expand ngon", lambda: circle, lambda polygon: polygon.expand(1.5)),
+        ("expand star", lambda: spiky, lambda polygon: polygon.expand(-1.5)),
+        ("pocket ngon", lambda: circle, lambda polygon: libnanocnc.pocket(polygon, 1.5, 1.2)),
+        ("auto_tabs", lambda: dict(pathlist=job["pathlist"], tablist=[]), lambda dictobj: libnanocnc.auto_tabs(dictobj, 4.0, 2.0, count=4)),
+        ("auto_overcuts", lambda: dict(pathlist=job["pathlist"], cornerlist=list(job["cornerlist"]), overcutlist=[]), libnanocnc.auto_overcuts),
+        ("process_overcuts", lambda: with_polygonpoints(job), libnanocnc.process_overcuts),
+        ("process_tabs", lambda: with_polygonpoints(job), libnanocnc.process_tabs),
+        ("common_lines", lambda: grid, libnanocnc.common_lines),
+        ("parse_gcode", lambda: program, libnanocnc.parse_gcode),
+        ("optimize_gcode", lambda: program, libnanocnc.optimize_gcode),
+        ("toolpath times", lambda: toolpath, lambda toolpath: toolpath.times()),
+        ("json dump", lambda: job, lambda dictobj: json.dump(dictobj, io.StringIO(), indent=4)),
+        ("json load", lambda: text, json.loads),
+    ]
+
+
+def measure(setup, function, repeat):
+    """Return best time in seconds of repeat runs and peak memory in bytes of one run."""
+    best = math.inf
+    for _ in range(repeat):
+        argument = setup()
+        start = time.perf_counter()
+        function(argument)
+        best = min(best, time.perf_counter() - start)
+    argument = setup()
+    tracemalloc.start()
+    function(argument)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def run(sizes, repeat, only=None):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for size in sizes:
+            for name, setup, function in stages(size, tmpdir):
+                if only and not any(item in name for item in only):
+                    continue
+                seconds, peak = measure(setup, function, repeat)
+                results[f"{name} [{size}]"] = dict(seconds=seconds, peak=peak)
+                print(f"{name + ' [' + str(size) + ']':40s} {seconds * 1000:10.2f} ms {peak / 2 ** 20:10.2f} MiB", flush=True)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Print the ratio to baseline for every stage and return list of regressed stages."""
+    regressions = []
+    for key, value in results.items():
+        if key not in baseline:
+            continue
+        ratio = value["seconds"] / max(baseline[key]["seconds"], 1E-9)
+        mark = ""
+        if ratio > threshold:
+            regressions.append(key)
+            mark = "  REGRESSION"
+        print(f"{key:40s} {ratio:8.2f} x{mark}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="number of vertices")
+    parser.add_argument("--repeat", type=int, default=3, help="number of timed runs per stage")
+    parser.add_argument("--only", nargs="+", help="run only stages containing one of these names")
+    parser.add_argument("--save", help="save results as baseline to this file")
+    parser.add_argument("--compare", help="compare results to baseline in this file")
+    parser.add_argument("--threshold", type=float, default=1.25, help="maximum allowed ratio to baseline time")
+    args = parser.parse_args()
+    # paths without space for tabs are expected in the synthetic jobs
+    libnanocnc.logger.setLevel(logging.ERROR)
+
+    results = run(args.sizes, args.repeat, args.only)
+    if args.save:
+        with open(args.save, "w") as fh:
+            json.dump(results, fh, indent=4)
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)
+        print()
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
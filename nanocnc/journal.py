@@ -0,0 +1,137 @@
+import json
+import logging
+import os
+import threading
+try:
+    from . import libnanocnc
+except ImportError:
+    # run as script from the nanocnc folder, see nanocnc.py
+    import libnanocnc
+
+
+logger = logging.getLogger(__name__)
+
+
+def apply_journal(dictobj, records):
+    """Replay journal records on a job.
+
+    Record types are
+        {"op": "path", "id": id, "pathattr": value, "tool": tool, "cut": path or None, "cornerlist": [corner, ...], "overcutlist": [overcut, ...], "tablist": [tab, ...]}
+            set pathattr and tool of path id and replace its cut path and the corners, overcuts and tabs of the cut path
+        {"op": "tab", "add": bool, "tab": tab}
+            add or remove a tab, tabs are identified by refid and pos
+        {"op": "overcut", "add": bool, "overcut": overcut}
+            turn a corner into an overcut or an overcut back into a corner
+
+    Args:
+        dictobj: job, see MainWindow.save()
+        records: list of records
+    """
+    for record in records:
+        op = record["op"]
+        if op == "path":
+            for path in dictobj["pathlist"]:
+                if path["id"] == record["id"]:
+                    path["pathattr"], path["tool"] = record["pathattr"], record["tool"]
+            cutids = {path["id"] for path in dictobj["pathlist"] if path["parentid"] == record["id"]}
+            dictobj["pathlist"] = [path for path in dictobj["pathlist"] if path["id"] not in cutids]
+            dictobj["cornerlist"] = [corner for corner in dictobj["cornerlist"] if corner["parentid"] not in cutids]
+            dictobj["overcutlist"] = [overcut for overcut in dictobj["overcutlist"] if overcut["parentid"] not in cutids]
+            dictobj["tablist"] = [tab for tab in dictobj["tablist"] if tab["refid"] not in cutids]
+            if record["cut"] is not None:
+                dictobj["pathlist"].append(record["cut"])
+                dictobj["cornerlist"].extend(record["cornerlist"])
+                dictobj["overcutlist"].extend(record.get("overcutlist", []))
+                dictobj["tablist"].extend(record.get("tablist", []))
+        elif op == "tab":
+            tab = record["tab"]
+            if record["add"]:
+                dictobj["tablist"].append(tab)
+            else:
+                key = (tab["refid"], libnanocnc.gridkey(*tab["pos"]))
+                dictobj["tablist"] = [item for item in dictobj["tablist"] if (item["refid"], libnanocnc.gridkey(*item["pos"])) != key]
+        elif op == "overcut":
+            overcut = record["overcut"]
+            source, target = ("cornerlist", "overcutlist") if record["add"] else ("overcutlist", "cornerlist")
+            dictobj[source] = [item for item in dictobj[source] if item["id"] != overcut["id"]]
+            dictobj[target].append(overcut)
+        else:
+            raise ValueError("unknown journal record {!r}".format(record))
+    return dictobj
+
+
+class Journal():
+    """Append-only journal of the edits of a job in the sidecar file <filename>.journal.
+
+    append() only queues a record, a background thread writes the queued records
+    as JSON lines and fsyncs them every interval seconds. compact() writes the
+    full job to filename and truncates the journal.
+    """
+    def __init__(self, filename, interval=2.0):
+        self.filename = str(filename)
+        self.journalname = self.filename + ".journal"
+        self.interval = interval
+        self.count = 0
+        self._pending = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="journal", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def append(self, record):
+        """Queue record for writing."""
+        with self._lock:
+            self._pending.append(json.dumps(record))
+            self.count += 1
+
+    def flush(self):
+        """Write queued records to the journal."""
+        with self._lock:
+            if not self._pending:
+                return
+            with open(self.journalname, "a") as fh:
+                fh.write("\n".join(self._pending) + "\n")
+                fh.flush()
+                os.fsync(fh.fileno())
+            self._pending = []
+
+    def compact(self, dictobj, indent=4):
+        """Write dictobj to filename and truncate the journal."""
+        with self._lock:
+            tmpname = self.filename + ".tmp"
+            with open(tmpname, "w") as fh:
+                json.dump(dictobj, fh, indent=indent)
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.replace(tmpname, self.filename)
+            self._pending = []
+            self.count = 0
+            if os.path.exists(self.journalname):
+                os.remove(self.journalname)
+
+    def close(self):
+        """Stop the background thread and write the queued records."""
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+
+    @staticmethod
+    def read(filename):
+        """Return the records of the journal of filename, an incomplete last record is ignored."""
+        records = []
+        try:
+            fh = open(str(filename) + ".journal")
+        except FileNotFoundError:
+            return records
+        with fh:
+            for line in fh:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    logger.warning("journal of %s: ignoring incomplete record", filename)
+                    break
+        return records
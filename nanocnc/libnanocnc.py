@@ -1,7 +1,16 @@
 from dataclasses import dataclass
+import atexit
+import collections
+import contextlib
 import json
 import logging
 import math
+import heapq
+import os
+import re
+import sys
+import time
+import numpy as np
 import svgpathtools
 from PyQt5 import QtWidgets, QtCore, QtGui
 
@@ -9,11 +18,137 @@ from PyQt5 import QtWidgets, QtCore, QtGui
 logger = logging.getLogger(__name__)
 
 
+class Profiler():
+    """Collect time spent in named, nestable spans and counters of the processing stages.
+
+    When disabled span() returns a shared no-op context manager and count() returns
+    immediately, so instrumented code pays nothing.
+    Setting the environment variable NANOCNC_PROFILE enables the module profiler and
+    prints its report at exit, or writes it as JSON if the value ends with .json.
+    """
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self):
+        self.spans = {}
+        self.counters = {}
+        self._stack = []
+
+    @contextlib.contextmanager
+    def _span(self, name):
+        self._stack.append(name)
+        key = "/".join(self._stack)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self._stack.pop()
+            calls, seconds = self.spans.get(key, (0, 0.0))
+            self.spans[key] = (calls + 1, seconds + elapsed)
+
+    def span(self, name):
+        """Return a context manager measuring the time spent within."""
+        if not self.enabled:
+            return _NULLSPAN
+        return self._span(name)
+
+    def count(self, name, value=1):
+        """Add value to counter name."""
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def report(self):
+        """Return spans and counters as dict."""
+        spans = {key: dict(calls=calls, seconds=seconds) for key, (calls, seconds) in self.spans.items()}
+        return dict(spans=spans, counters=dict(self.counters))
+
+    def format(self):
+        """Return report as text table."""
+        lines = ["{:50s} {:>8s} {:>12s}".format("span", "calls", "ms")]
+        for key, (calls, seconds) in self.spans.items():
+            lines.append("{:50s} {:8d} {:12.3f}".format(key, calls, seconds * 1000))
+        lines.append("{:50s} {:>8s}".format("counter", "value"))
+        for key, value in self.counters.items():
+            lines.append("{:50s} {:8d}".format(key, value))
+        return "\n".join(lines)
+
+
+_NULLSPAN = contextlib.nullcontext()
+profiler = Profiler(enabled=bool(os.environ.get("NANOCNC_PROFILE")))
+
+
+class Tracer():
+    """Record geometry events to a ring buffer holding the last size events.
+
+    Callers check the enabled attribute before calling record(), so nothing is
+    formatted or stored when tracing is disabled.
+    Setting the environment variable NANOCNC_TRACE to a size enables the module tracer.
+    """
+    def __init__(self, size=0):
+        self.enable(size)
+
+    def enable(self, size=10000):
+        """Enable tracing with a ring buffer of size events, size 0 disables tracing."""
+        self.enabled = size > 0
+        self.events = collections.deque(maxlen=max(size, 1))
+
+    def record(self, event, **data):
+        """Record event with data."""
+        self.events.append((time.perf_counter(), event, data))
+
+    def format(self):
+        """Return recorded events as text, one event per line."""
+        return "\n".join("{:14.6f} {:20s} {}".format(timestamp, event, data) for timestamp, event, data in self.events)
+
+
+tracer = Tracer(int(os.environ.get("NANOCNC_TRACE", 0)))
+
+
+@atexit.register
+def _write_profile():
+    target = os.environ.get("NANOCNC_PROFILE")
+    if not profiler.enabled or not target:
+        return
+    if target.endswith(".json"):
+        with open(target, "w") as fh:
+            json.dump(profiler.report(), fh, indent=4)
+    else:
+        print(profiler.format(), file=sys.stderr)
+
+
+GRID = 1E-3        # resolution of the integer grid in mm used to match points
+
+
+def to_grid(values, resolution=GRID):
+    """Convert coordinates to integer multiples of resolution.
+
+    Points at the same grid position compare and hash equal, so points are
+    matched by exact comparison and dictionary lookup instead of a tolerance.
+
+    Returns:
+        int64 array
+    """
+    return np.rint(np.asarray(values, dtype=float) / resolution).astype(np.int64)
+
+
+def gridkey(x, y, resolution=GRID):
+    """Return the integer grid position of the point x, y as hashable tuple."""
+    return (round(x / resolution), round(y / resolution))
+
+
+def is_closed(xarr, yarr):
+    """Return True if the first and the last point of a polyline are at the same grid position."""
+    return len(xarr) > 0 and gridkey(xarr[0], yarr[0]) == gridkey(xarr[-1], yarr[-1])
+
+
 @dataclass
 class Point:
     x: float
     y: float
     tabwidth: float = 0.0
+    tabheight: float = 0.0
 
     def xv(self):
         return self.x if self.tabwidth == 0 else [self.x, self.tabwidth]
@@ -23,10 +158,121 @@ class Point:
 
 
 class Polygon():
+    """Polygon with lazily computed geometric properties.
+
+    The properties are cached until xlist or ylist is assigned. After
+    changing xlist or ylist in place call invalidate().
+    """
     def __init__(self, xlist, ylist):
         assert len(xlist) == len(ylist)
-        xylist = [(x, y) for i, (x, y) in enumerate(zip(xlist, ylist)) if i == 0 or (x, y) != (xlist[i - 1], ylist[i - 1])]
-        self.xlist, self.ylist = [item[0] for item in xylist], [item[1] for item in xylist]
+        keep = _distinct(np.column_stack((xlist, ylist)).reshape(-1, 2)).tolist()
+        self.xlist = [x for x, k in zip(xlist, keep) if k]
+        self.ylist = [y for y, k in zip(ylist, keep) if k]
+
+    @property
+    def xlist(self):
+        return self._xlist
+
+    @xlist.setter
+    def xlist(self, xlist):
+        self._xlist = xlist
+        self._cache = {}
+
+    @property
+    def ylist(self):
+        return self._ylist
+
+    @ylist.setter
+    def ylist(self, ylist):
+        self._ylist = ylist
+        self._cache = {}
+
+    def invalidate(self):
+        """Forget the cached properties after xlist or ylist was changed in place."""
+        self._cache = {}
+
+    def _cached(self, name, compute):
+        if name not in self._cache:
+            self._cache[name] = compute()
+        return self._cache[name]
+
+    @property
+    def xy(self):
+        """(n, 2) array of the points, read only."""
+        def compute():
+            xy = np.column_stack((self.xlist, self.ylist)).astype(float).reshape(-1, 2)
+            xy.flags.writeable = False
+            return xy
+        return self._cached("xy", compute)
+
+    @property
+    def gridxy(self):
+        """(n, 2) int64 array of the grid positions of the points, read only, see to_grid()."""
+        def compute():
+            gridxy = to_grid(self.xy)
+            gridxy.flags.writeable = False
+            return gridxy
+        return self._cached("gridxy", compute)
+
+    @property
+    def signed_area(self):
+        """Signed area, positive if the points run counterclockwise in a y up coordinate system."""
+        return self._cached("signed_area", lambda: signed_area(self.xy[:, 0], self.xy[:, 1]))
+
+    @property
+    def orientation(self):
+        """1 for positive, -1 for negative and 0 for zero signed area."""
+        return int(np.sign(self.signed_area))
+
+    @property
+    def bbox(self):
+        """Bounding box as (xmin, ymin, xmax, ymax)."""
+        def compute():
+            if not len(self.xy):
+                return (math.nan, math.nan, math.nan, math.nan)
+            return (*self.xy.min(axis=0).tolist(), *self.xy.max(axis=0).tolist())
+        return self._cached("bbox", compute)
+
+    @property
+    def cumulative_length(self):
+        """Length along the polygon at every point, read only."""
+        def compute():
+            length = cumulative_length(self.xy[:, 0], self.xy[:, 1])
+            length.flags.writeable = False
+            return length
+        return self._cached("cumulative_length", compute)
+
+    @property
+    def perimeter(self):
+        """Length of the polygon."""
+        return float(self.cumulative_length[-1])
+
+    def orient(self, orientation=1):
+        """Reverse the points in place if the polygon runs against orientation.
+
+        Args:
+            orientation: 1 or -1, see orientation
+        Returns:
+            (Polygon) self
+        """
+        if self.orientation == -orientation:
+            cache = self._cache
+            self.xlist, self.ylist = self.xlist[::-1], self.ylist[::-1]
+            # reversing keeps the bounding box and negates the area
+            if "bbox" in cache:
+                self._cache["bbox"] = cache["bbox"]
+            if "signed_area" in cache:
+                self._cache["signed_area"] = -cache["signed_area"]
+        return self
+
+    @classmethod
+    def fromarray(cls, xy):
+        """Create a polygon from a (n, 2) array without looping over the points in Python."""
+        xy = np.asarray(xy, dtype=float)
+        keep = _distinct(xy)
+        polygon = cls.__new__(cls)
+        polygon.xlist, polygon.ylist = xy[keep, 0].tolist(), xy[keep, 1].tolist()
+        return polygon
 
     def __str__(self):
         return ", ".join("({:f}, {:f})".format(x, y) for x, y in zip(self.xlist, self.ylist))
@@ -34,104 +280,648 @@ class Polygon():
     def asdict(self):
         return dict(xlist=self.xlist, ylist=self.ylist)
 
-    def _parallel(self, distance: float, x1: float, y1: float, x2: float, y2: float):
-        """Compute coordinates of points on a line which is parallel to the given.
+    def simplify(self, tolerance, method="douglas-peucker"):
+        """Simplify polygon, see simplify().
 
         Args:
-            distance: Distance to the line
-            x1, y1  : coordinates of first line point
-            x2, y2  : coordinates of second line point
+            tolerance: maximum deviation of the simplified polygon
+            method   : "douglas-peucker" or "visvalingam"
         Returns:
-            (tuple) with coordinates of first shifted point and coordinates of second shifted point
+            (Polygon) simplified
         """
-        dx = x2 - x1
-        dy = y2 - y1
-        length = math.sqrt(dx ** 2 + dy ** 2)
-        if length == 0:
-            print(x1, y1, x2, y2)
-        udx = dx / length
-        udy = dy / length
-
-        x1h = x1 - udy * distance
-        y1h = y1 + udx * distance
-        x2h = x1h + dx
-        y2h = y1h + dy
-
-        return (x1h, y1h, x2h, y2h)
-
-    def expand(self, distance):
+        xarr, yarr = simplify(self.xlist, self.ylist, tolerance, method)
+        return Polygon(xarr.tolist(), yarr.tolist())
+
+    def expand(self, distance, tolerance=None):
         """Expond polygon by distance.
 
         Args:
-            distance: Distance to expand.
+            distance : Distance to expand.
+            tolerance: if not None simplify the expanded polygon with this tolerance
         Returns:
             (Polygon) expanded
         """
-        llist = []
-        # compute m, b for all parallels of all segments and put (m, b) im llist
-        for index in range(len(self.xlist) - 1):
-            x1, y1, x2, y2 = self._parallel(distance, self.xlist[index], self.ylist[index], self.xlist[index + 1], self.ylist[index + 1])
-            if x1 - x2 == 0:
-                # line is parallel to y axis, vertical line
-                m = None
-                b = x1
-            else:
-                m = (y1 - y2) / (x1 - x2)
-                b = (y2 * x1 - y1 * x2) / (x1 - x2)
-            llist.append((m, b))
-        # last (m, b) is equal to first (m, b)
-        llist.append(llist[0])
-        # compute all intersection points of parallels and put to xlist, ylist
-        xlist, ylist = [], []
-        for index in range(len(llist) - 1):
-            if llist[index][0] is None:
-                # first line is vertical line
-                # x is llist[index][1]
-                xlist.append(llist[index][1])
-                # y is computed from (m, b) of second line
-                ylist.append(llist[index + 1][0] * xlist[-1] + llist[index + 1][1])
-            elif llist[index + 1][0] is None:
-                # second line is vertical line
-                # x is llist[index +1][1]
-                xlist.append(llist[index + 1][1])
-                # y is computed from (m, b) of first line
-                ylist.append(llist[index][0] * xlist[-1] + llist[index][1])
-            else:
-                #             b               - t                    /  n                   - m
-                xlist.append((llist[index][1] - llist[index + 1][1]) / (llist[index + 1][0] - llist[index][0]))
-                #            m               * x         + b
-                ylist.append(llist[index][0] * xlist[-1] + llist[index][1])
-        # it is a closed polygon, therefore last point is equal to frist point
-        xlist.append(xlist[0])
-        ylist.append(ylist[0])
-        return Polygon(xlist, ylist)
-
-
-def svg2polygon(filename, number_of_samples=50):
-    pathlist, attributelist = svgpathtools.svg2paths(filename)
-
-    polygonlist = []
-    for _, subpathlist in enumerate(pathlist):
-        print(_)
-        pointlist = []
-        for path in subpathlist:
-            if isinstance(path, svgpathtools.CubicBezier) or isinstance(path, svgpathtools.Arc):
-                for index in range(number_of_samples):
-                    pointlist.append(path.point(index / number_of_samples))
-            elif isinstance(path, svgpathtools.Line):
-                pointlist.append(path.start)
-                pointlist.append(path.end)
+        with profiler.span("expand"):
+            polygon = self._expand(distance)
+            if tolerance is not None:
+                polygon = polygon.simplify(tolerance)
+        profiler.count("expand.vertices_in", len(self.xlist))
+        profiler.count("expand.vertices_out", len(polygon.xlist))
+        return polygon
+
+    def _expand(self, distance):
+        # vertex i of the expanded polygon is the intersection of the parallels of segment i and i + 1
+        xy = self.xy[1:] + distance * _miter(self.xy)
+        xy = np.vstack((xy, xy[:1]))
+        return Polygon(xy[:, 0].tolist(), xy[:, 1].tolist())
+
+
+def _distinct(xy, resolution=GRID):
+    """Return a mask of the points of xy not at the grid position of the point before."""
+    keep = np.ones(len(xy), dtype=bool)
+    keep[1:] = (np.diff(to_grid(xy, resolution), axis=0) != 0).any(axis=1)
+    if len(xy) > 1 and not keep[-1]:
+        # of duplicates at the end keep the last point, which closes a polygon
+        first = np.flatnonzero(keep)[-1]
+        if first > 0:
+            keep[first], keep[-1] = False, True
+    return keep
+
+
+def _miter(xy):
+    """Compute the offset of the vertices of a closed polygon per unit distance.
+
+    Args:
+        xy: (n + 1, 2) array of points of a closed polygon, first point equal to last
+    Returns:
+        (n, 2) array, row i is the offset of point i + 1 to the intersection of the
+        parallels of segment i and i + 1 at distance 1, positive distances to the left
+    """
+    direction = np.diff(xy, axis=0)
+    length = np.hypot(direction[:, 0], direction[:, 1])
+    if not length.all():
+        index = int(np.argmin(length))
+        logger.error("zero length segment from (%f, %f) to (%f, %f)", *xy[index], *xy[index + 1])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        normal = np.column_stack((-direction[:, 1], direction[:, 0])) / length[:, None]
+        following = np.roll(normal, -1, axis=0)
+        return (normal + following) / (1 + (normal * following).sum(axis=1))[:, None]
+
+
+def _segment_distance(xy, a, b):
+    """Compute the distances of all points in xy to the line segment a--b.
+
+    Args:
+        xy: (n, 2) array of points
+        a, b: (2, ) arrays with start and end point of segment
+    Returns:
+        (n, ) array of distances
+    """
+    ab = b - a
+    abab = np.dot(ab, ab)
+    if abab == 0:
+        return np.hypot(xy[:, 0] - a[0], xy[:, 1] - a[1])
+    t = np.clip(((xy - a) @ ab) / abab, 0, 1)
+    return np.hypot(*(xy - (a + t[:, None] * ab)).T)
+
+
+def _douglas_peucker(xy, tolerance):
+    """Return a mask of the points of xy kept by the Douglas-Peucker algorithm."""
+    keep = np.zeros(len(xy), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(xy) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        dist = _segment_distance(xy[first + 1:last], xy[first], xy[last])
+        index = int(np.argmax(dist))
+        if dist[index] > tolerance:
+            index += first + 1
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return keep
+
+
+def _triangle_area(xy, prev, index, next):
+    """Compute the areas of the triangles prev, index, next."""
+    a, b, c = xy[prev], xy[index], xy[next]
+    return 0.5 * np.abs((b[..., 0] - a[..., 0]) * (c[..., 1] - a[..., 1]) - (c[..., 0] - a[..., 0]) * (b[..., 1] - a[..., 1]))
+
+
+def _visvalingam(xy, tolerance):
+    """Return a mask of the points of xy kept by the Visvalingam-Whyatt algorithm.
+
+    Points are removed while their effective area is below tolerance ** 2
+    and all points removed between the remaining neighbours stay closer than
+    tolerance to the new segment.
+    """
+    n = len(xy)
+    keep = np.ones(n, dtype=bool)
+    if n < 3:
+        return keep
+    prev = np.arange(-1, n - 1)
+    next = np.arange(1, n + 1)
+    index = np.arange(1, n - 1)
+    area = np.full(n, np.inf)
+    area[1:-1] = _triangle_area(xy, index - 1, index, index + 1)
+    heap = [(a, i) for i, a in zip(index.tolist(), area[1:-1].tolist())]
+    heapq.heapify(heap)
+    threshold = tolerance ** 2
+    while heap:
+        a, i = heapq.heappop(heap)
+        if a >= threshold:
+            break
+        if not keep[i] or a != area[i]:
+            # removed or outdated entry
+            continue
+        p, q = prev[i], next[i]
+        if _segment_distance(xy[p + 1:q], xy[p], xy[q]).max() > tolerance:
+            # kept until a neighbour is removed
+            continue
+        keep[i] = False
+        next[p], prev[q] = q, p
+        for j in (p, q):
+            if 0 < j < n - 1:
+                # the area of a neighbour never gets smaller than the area of the removed point
+                area[j] = max(float(_triangle_area(xy, prev[j], j, next[j])), a)
+                heapq.heappush(heap, (area[j], j))
+    return keep
+
+
+def simplify(xlist, ylist, tolerance, method="douglas-peucker"):
+    """Simplify a polyline.
+
+    Every point of the polyline stays closer than tolerance to the simplified
+    polyline, so near duplicate points are removed together with nearly
+    collinear points. The first and the last point are always kept, so closed
+    polygons stay closed.
+
+    Args:
+        xlist, ylist: coordinates of the polyline
+        tolerance   : maximum deviation of the simplified polyline
+        method      : "douglas-peucker" or "visvalingam"
+    Returns:
+        (tuple) of numpy arrays with x and y coordinates
+    """
+    xy = np.column_stack((np.asarray(xlist, dtype=float), np.asarray(ylist, dtype=float)))
+    if len(xy) < 3:
+        return xy[:, 0], xy[:, 1]
+    if method == "douglas-peucker":
+        keep = _douglas_peucker(xy, tolerance)
+    elif method == "visvalingam":
+        keep = _visvalingam(xy, tolerance)
+    else:
+        raise ValueError(f"unknown simplification method {method!r}")
+    return xy[keep, 0], xy[keep, 1]
+
+
+def svg2polygon(filename, number_of_samples=50, tolerance=None, snap=0.001):
+    """Convert all paths in a SVG file to polygons.
+
+    Paths which are not closed are joined with other paths at end points
+    closer than snap, see join_contours(). Duplicated paths are removed,
+    see remove_duplicates().
+
+    Args:
+        filename         : name of SVG file
+        number_of_samples: number of points for flattening an Arc or CubicBezier
+        tolerance        : if not None simplify the polygons with this tolerance
+        snap             : maximum distance of joined end points and resolution for finding duplicates
+    Returns:
+        (list) of Polygon
+    """
+    with profiler.span("svg2polygon"):
+        with profiler.span("parse"):
+            pathlist, attributelist = svgpathtools.svg2paths(filename)
+
+        pieces = []
+        for subpathlist in pathlist:
+            with profiler.span("flatten"):
+                pointlist = []
+                for path in subpathlist:
+                    if isinstance(path, svgpathtools.CubicBezier) or isinstance(path, svgpathtools.Arc):
+                        for sample in range(number_of_samples):
+                            pointlist.append(path.point(sample / number_of_samples))
+                    elif isinstance(path, svgpathtools.Line):
+                        pointlist.append(path.start)
+                        pointlist.append(path.end)
+                    else:
+                        raise ValueError(path)
+                if len(subpathlist):
+                    pointlist.append(subpathlist[-1].end)
+                pieces.append(np.array([(p.real, p.imag) for p in pointlist]).reshape(-1, 2))
+        contours = join_contours(remove_duplicates([piece for piece in pieces if len(piece)], snap), snap)
+        polygonlist = []
+        for index, points in enumerate(remove_duplicates([points for points, _ in contours], snap)):
+            polygon = Polygon.fromarray(points)
+            profiler.count("svg2polygon.vertices_in", len(polygon.xlist))
+            if tolerance is not None:
+                with profiler.span("simplify"):
+                    polygon = polygon.simplify(tolerance)
+            profiler.count("svg2polygon.vertices_out", len(polygon.xlist))
+            if tracer.enabled:
+                tracer.record("svg2polygon", path=index, vertices=len(polygon.xlist))
+            polygonlist.append(polygon)
+        profiler.count("svg2polygon.paths", len(polygonlist))
+    return polygonlist
+
+
+DXF_UNITS = {1: 25.4, 2: 304.8, 4: 1.0, 5: 10.0, 6: 1000.0}    # $INSUNITS to mm
+_DXF_TYPES = {b"LINE": 1, b"CIRCLE": 2, b"ARC": 3, b"LWPOLYLINE": 4, b"SPLINE": 5}
+_DXF_NUMBERS = [10, 11, 20, 21, 40, 41, 42, 50, 51, 70, 71, 90]     # group codes with numbers used here
+
+
+def _dxf_pairs(data):
+    """Tokenize complete group code pairs of an ASCII DXF file.
+
+    The group codes and the values of the numeric group codes in _DXF_NUMBERS
+    are parsed at once by blanking all other lines of the buffer.
+
+    Args:
+        data: bytes, only the complete pairs are tokenized
+    Returns:
+        (codes, numbers, start), numbers is nan for not numeric values, the
+        value of pair i is data[start[2 * i + 1]:start[2 * i + 2]]
+    """
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    newline = buffer == ord("\n")
+    start = np.concatenate(([0], np.flatnonzero(newline) + 1))
+    count = (len(start) - 1) // 2
+    start = start[:2 * count + 1]
+    buffer, newline = buffer[:start[-1]], newline[:start[-1]]
+    line = np.cumsum(newline) - newline
+
+    def parse(selected, dtype):
+        text = np.where(selected[line], buffer, ord(" ")).astype(np.uint8).tobytes()
+        return np.fromstring(text, dtype=dtype, sep=" ")
+
+    selected = np.zeros(2 * count, dtype=bool)
+    selected[0::2] = True
+    codes = parse(selected, int)
+    if len(codes) != count:
+        raise ValueError("malformed DXF, group code is not a number")
+    numeric = np.isin(codes, _DXF_NUMBERS)
+    selected[0::2], selected[1::2] = False, numeric
+    numbers = np.full(count, np.nan)
+    numbers[numeric] = parse(selected, float)
+    return codes, numbers, start
+
+
+def _dxf_chunks(fh, size=1 << 22):
+    """Read the group code pairs of an ASCII DXF file opened in binary mode in chunks of about size bytes.
+
+    Every chunk ends before a group code 0, so no entity is split between chunks.
+
+    Yields:
+        (codes, numbers, value), value(i) returns the stripped value of pair i as bytes
+    """
+    rest = b""
+    while True:
+        data = fh.read(size)
+        final = not data
+        data = rest + data
+        if final and not data.endswith(b"\n"):
+            data += b"\n"
+        codes, numbers, start = _dxf_pairs(data)
+        # the last entity may continue in the next chunk
+        entities = np.flatnonzero(codes == 0)
+        last = len(codes) if final else int(entities[-1]) if len(entities) else 0
+        if last:
+            chunk = data[:start[2 * last]]
+
+            def value(index, chunk=chunk, start=start):
+                return chunk[start[2 * index + 1]:start[2 * index + 2]].strip()
+
+            yield codes[:last], numbers[:last], value
+            data = data[len(chunk):]
+        if final:
+            return
+        rest = data
+
+
+def _arcs(cx, cy, radius, start, sweep, flatness):
+    """Flatten arcs, angles in radians, sweep < 0 is clockwise.
+
+    Returns:
+        (points, count), points is a (n, 2) array with the points of all arcs
+        including their start and end points, count the number of points per arc
+    """
+    with np.errstate(invalid="ignore"):
+        step = np.where(radius > flatness, 2 * np.arccos(1 - flatness / radius), np.pi / 2)
+    count = np.maximum(2, np.ceil(np.abs(sweep) / step).astype(int) + 1)
+    arc = np.repeat(np.arange(len(count)), count)
+    index = np.arange(len(arc)) - np.repeat(np.cumsum(count) - count, count)
+    angle = start[arc] + sweep[arc] * index / (count[arc] - 1)
+    return np.column_stack((cx[arc] + radius[arc] * np.cos(angle), cy[arc] + radius[arc] * np.sin(angle))), count
+
+
+def _spline_points(degree, knots, control, weights, flatness):
+    """Evaluate a NURBS curve with de Boor's algorithm and thin out the points to flatness."""
+    control = np.asarray(control, dtype=float)
+    knots = np.asarray(knots, dtype=float)
+    weights = np.asarray(weights, dtype=float) if len(weights) == len(control) else np.ones(len(control))
+    homogeneous = np.column_stack((control * weights[:, None], weights))
+    t = np.linspace(knots[degree], knots[len(control)], max(64, 16 * len(control)))
+    span = np.clip(np.searchsorted(knots, t, side="right") - 1, degree, len(control) - 1)
+    d = homogeneous[span[:, None] - degree + np.arange(degree + 1)]
+    for r in range(1, degree + 1):
+        for j in range(degree, r - 1, -1):
+            left, right = knots[j + span - degree], knots[j + 1 + span - r]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                alpha = np.where(right > left, (t - left) / (right - left), 0.0)[:, None]
+            d[:, j] = (1 - alpha) * d[:, j - 1] + alpha * d[:, j]
+    xy = d[:, degree, :2] / d[:, degree, 2:]
+    return xy[_douglas_peucker(xy, flatness)]
+
+
+def _dxf_spline(codes, numbers, flatness):
+    """Return (points, closed) of the SPLINE entity with the given group codes and numbers."""
+    def number(code):
+        return numbers[codes == code]
+
+    closed = bool(int(number(70)[0]) & 1) if len(number(70)) else False
+    if len(number(10)):
+        points = _spline_points(int(number(71)[0]), number(40), np.column_stack((number(10), number(20))), number(41), flatness)
+    else:
+        # splines without control points are approximated by their fit points
+        points = np.column_stack((number(11), number(21)))
+    if closed and not np.allclose(points[0], points[-1]):
+        points = np.vstack((points, points[:1]))
+    return points, closed
+
+
+def _dxf_geometry(codes, numbers, types, flatness):
+    """Flatten the entities of one chunk of group code pairs of the ENTITIES section.
+
+    The entities are handled per type, all entities of a type at once.
+
+    Args:
+        codes, numbers: group codes and numbers, see _dxf_pairs()
+        types         : type of every entity, see _DXF_TYPES
+        flatness      : maximum distance of the points to the curves
+    Returns:
+        (list) of (points, closed), points is a (n, 2) array
+    """
+    start = np.flatnonzero(codes == 0)
+    entity = np.cumsum(codes == 0) - 1
+    kind = types[entity]
+
+    def number(mask):
+        return numbers[mask]
+
+    result = []
+    line = kind == 1
+    if line.any():
+        points = np.stack((number(line & (codes == 10)), number(line & (codes == 20)), number(line & (codes == 11)), number(line & (codes == 21))), axis=1)
+        result += [(xy, False) for xy in points.reshape(-1, 2, 2)]
+    for type, closed in ((2, True), (3, False)):
+        arc = kind == type
+        if not arc.any():
+            continue
+        cx, cy, radius = number(arc & (codes == 10)), number(arc & (codes == 20)), number(arc & (codes == 40))
+        if closed:
+            first, sweep = np.zeros(len(cx)), np.full(len(cx), 2 * np.pi)
+        else:
+            first, last = np.radians(number(arc & (codes == 50))), np.radians(number(arc & (codes == 51)))
+            sweep = (last - first) % (2 * np.pi)
+            sweep[sweep == 0] = 2 * np.pi
+        points, count = _arcs(cx, cy, radius, first, sweep, flatness)
+        result += [(xy, closed) for xy in np.split(points, np.cumsum(count)[:-1])]
+    polyline = kind == 4
+    if polyline.any():
+        result += _dxf_lwpolylines(codes, entity, polyline, number, flatness)
+    for index in np.flatnonzero(types == 5):
+        end = start[index + 1] if index + 1 < len(start) else len(codes)
+        result.append(_dxf_spline(codes[start[index]:end], numbers[start[index]:end], flatness))
+    return result
+
+
+def _dxf_lwpolylines(codes, entity, polyline, number, flatness):
+    """Flatten the LWPOLYLINE entities of a chunk, arcs given by bulges are inserted between their vertices."""
+    vertex = polyline & (codes == 10)
+    x, y = number(vertex), number(polyline & (codes == 20))
+    owner = entity[vertex]
+    # a bulge belongs to the vertex before it
+    bulge = np.zeros(len(x))
+    bulged = polyline & (codes == 42)
+    bulge[np.cumsum(vertex)[bulged] - 1] = number(bulged)
+    entities, first, count = np.unique(owner, return_index=True, return_counts=True)
+    flags = np.zeros(entity[-1] + 1, dtype=int)
+    flagged = polyline & (codes == 70)
+    flags[entity[flagged]] = number(flagged).astype(int)
+    closed = (flags[entities] & 1).astype(bool)
+    following = np.arange(1, len(x) + 1)
+    following[first + count - 1] = np.where(closed, first, -1)
+    arc = (bulge != 0) & (following >= 0)
+    # inserted points per vertex
+    inserted = np.zeros(len(x), dtype=int)
+    if arc.any():
+        p1 = np.column_stack((x[arc], y[arc]))
+        p2 = np.column_stack((x[following[arc]], y[following[arc]]))
+        sweep = 4 * np.arctan(bulge[arc])
+        chord = p2 - p1
+        length = np.hypot(chord[:, 0], chord[:, 1])
+        radius = length / (2 * np.abs(np.sin(sweep / 2)))
+        # the center lies left of the chord for arcs turning counterclockwise by less than 180 degrees
+        center = (p1 + p2) / 2 + np.column_stack((-chord[:, 1], chord[:, 0])) * (0.5 / np.tan(sweep / 2))[:, None]
+        angle = np.arctan2(p1[:, 1] - center[:, 1], p1[:, 0] - center[:, 0])
+        points, arccount = _arcs(center[:, 0], center[:, 1], radius, angle, sweep, flatness)
+        inner = np.ones(len(points), dtype=bool)
+        inner[np.cumsum(arccount) - 1] = False
+        inner[np.cumsum(arccount) - arccount] = False
+        inserted[arc] = arccount - 2
+    total = 1 + inserted
+    position = np.cumsum(total) - total
+    xy = np.empty((total.sum(), 2))
+    xy[position] = np.column_stack((x, y))
+    if arc.any():
+        # the inner points of an arc follow its first vertex
+        m = inserted[arc]
+        xy[np.repeat(position[arc] + 1 - (np.cumsum(m) - m), m) + np.arange(m.sum())] = points[inner]
+    pieces = np.split(xy, np.cumsum(np.add.reduceat(total, first))[:-1])
+    return [(np.vstack((piece, piece[:1])) if flag else piece, bool(flag)) for piece, flag in zip(pieces, closed)]
+
+
+def join_contours(pieces, tolerance):
+    """Join polylines with end points within tolerance to contours.
+
+    The end points are put into a hash grid of cells of size tolerance, so
+    the matching end point is searched in the neighboured cells only and
+    joining takes O(n) expected time. Joined end points are snapped to the
+    end point of the contour built so far. Contours which cannot be closed
+    are kept open and logged.
+
+    Args:
+        pieces   : list of (n, 2) arrays
+        tolerance: maximum distance of joined end points
+    Returns:
+        (list) of (points, closed)
+    """
+    if not pieces:
+        return []
+    with profiler.span("join_contours"):
+        ends = np.array([(piece[0], piece[-1]) for piece in pieces], dtype=float)
+        cells = np.floor(ends / tolerance).astype(np.int64).tolist()
+        grid = collections.defaultdict(list)
+        for index, (head, tail) in enumerate(cells):
+            grid[tuple(head)].append((index, 0))
+            grid[tuple(tail)].append((index, 1))
+        used = np.zeros(len(pieces), dtype=bool)
+
+        def follow(point):
+            """Return the nearest unused piece with an end within tolerance of point, starting at that end."""
+            cx, cy = math.floor(point[0] / tolerance), math.floor(point[1] / tolerance)
+            nearest, best = None, tolerance
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    for index, end in grid.get((cx + dx, cy + dy), ()):
+                        if not used[index]:
+                            distance = math.hypot(*(ends[index, end] - point))
+                            if distance <= best:
+                                nearest, best = (index, end), distance
+            if nearest is None:
+                return None
+            used[nearest[0]] = True
+            piece = pieces[nearest[0]]
+            return piece if nearest[1] == 0 else piece[::-1]
+
+        contours = []
+        for index, piece in enumerate(pieces):
+            if used[index]:
+                continue
+            used[index] = True
+            chain = [piece]
+            closed = len(piece) > 2 and math.hypot(*(piece[-1] - piece[0])) <= tolerance
+            while not closed:
+                following = follow(chain[-1][-1])
+                if following is None:
+                    break
+                chain.append(following[1:])
+                closed = math.hypot(*(chain[-1][-1] - chain[0][0])) <= tolerance
+            if not closed:
+                # extend the open contour backwards from its start
+                preceding = follow(chain[0][0])
+                while preceding is not None:
+                    chain.insert(0, preceding[::-1][:-1])
+                    preceding = follow(chain[0][0])
+            points = np.vstack(chain)
+            if closed:
+                points[-1] = points[0]
             else:
-                raise ValueError(path)
-        xlist = [p.real for p in pointlist]
-        ylist = [p.imag for p in pointlist]
-        polygonlist.append(Polygon(xlist, ylist))
+                logger.warning("open contour from (%f, %f) to (%f, %f)", *points[0], *points[-1])
+            contours.append((points, closed))
+        profiler.count("join_contours.pieces", len(pieces))
+        profiler.count("join_contours.open", sum(not closed for _, closed in contours))
+    return contours
+
+
+def _same_shape(a, b, closed, resolution):
+    """Return True if the points of b lie within resolution of the points of a, see remove_duplicates().
+
+    b may be reversed, a closed b may start at another point.
+    """
+    for points in (b, b[::-1]):
+        if closed:
+            points = np.roll(points, -int(np.argmin(np.hypot(*(points - a[0]).T))), axis=0)
+        if np.hypot(*(points - a).T).max() <= resolution:
+            return True
+    return False
+
+
+def remove_duplicates(polylines, resolution=GRID):
+    """Remove polylines with the same shape as an earlier polyline.
+
+    Exported drawings often contain outlines twice, e.g. as stroke and as
+    fill or in stacked layers. Polylines are duplicates if they have the
+    same number of points and every point lies within resolution of the
+    corresponding point of the other polyline, in any orientation and for
+    closed polylines with any start point. The polylines are put into a
+    hash grid of cells of size resolution by the lower left corner of
+    their bounding box, so a polyline is compared with the polylines in
+    the neighboured cells only, like in join_contours().
+
+    Args:
+        polylines : list of Polygon or (n, 2) arrays
+        resolution: maximum distance of corresponding points of duplicates
+    Returns:
+        (list) of the first polyline of every shape in the order of polylines
+    """
+    with profiler.span("remove_duplicates"):
+        grid, result = collections.defaultdict(list), []
+        for polyline in polylines:
+            xy = polyline.xy if isinstance(polyline, Polygon) else np.asarray(polyline, dtype=float).reshape(-1, 2)
+            points = xy[np.concatenate(([True], (np.diff(xy, axis=0) != 0).any(axis=1)))]
+            closed = len(points) > 2 and math.hypot(*(points[-1] - points[0])) <= resolution
+            if closed:
+                points = points[:-1]
+            cx, cy = np.floor(points.min(axis=0) / resolution).astype(np.int64).tolist()
+            if any(_same_shape(points, other, closed, resolution)
+                   for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                   for other in grid.get((closed, len(points), cx + dx, cy + dy), ())):
+                logger.info("removed duplicate polyline with %d points starting at (%f, %f)", len(xy), *xy[0])
+                continue
+            grid[closed, len(points), cx, cy].append(points)
+            result.append(polyline)
+        removed = len(polylines) - len(result)
+        if removed:
+            logger.warning("removed %d duplicate polylines", removed)
+        profiler.count("remove_duplicates.removed", removed)
+    return result
+
+
+def dxf2polygon(filename, flatness=0.01, tolerance=None, snap=0.001):
+    """Convert the LINE, LWPOLYLINE, ARC, CIRCLE and SPLINE entities of a DXF file to polygons.
+
+    The file is read in chunks, so the memory needed does not depend on the
+    file size but on the number of resulting points. Entities with common
+    end points are joined to one polygon, see join_contours(), duplicated
+    entities and polygons are removed, see remove_duplicates(). Coordinates
+    are converted to mm if the drawing units are given by $INSUNITS.
+
+    Args:
+        filename : name of ASCII DXF file
+        flatness : maximum distance of the polygons to the arcs and splines
+        tolerance: if not None simplify the polygons with this tolerance
+        snap     : maximum distance of joined end points and resolution for finding duplicates in mm
+    Returns:
+        (list) of Polygon
+    """
+    with profiler.span("dxf2polygon"):
+        closedlist, pieces = [], []
+        section, scale = None, 1.0
+        with profiler.span("parse"):
+            with open(filename, "rb") as fh:
+                if fh.readline().startswith(b"AutoCAD Binary DXF"):
+                    raise ValueError(f"{filename}: binary DXF is not supported")
+                fh.seek(0)
+                for codes, numbers, value in _dxf_chunks(fh):
+                    # keep the entities of the ENTITIES section only
+                    start = np.flatnonzero(codes == 0)
+                    types = np.zeros(len(start), dtype=np.int8)
+                    inside = np.zeros(len(start), dtype=bool)
+                    header = np.zeros(len(start), dtype=bool)
+                    for index, position in enumerate(start.tolist()):
+                        name = value(position)
+                        if name == b"SECTION":
+                            section = value(position + 1)
+                        elif name == b"ENDSEC":
+                            section = None
+                        elif section == b"ENTITIES":
+                            inside[index] = True
+                            types[index] = _DXF_TYPES.get(name, 0)
+                        header[index] = section == b"HEADER"
+                    entity = np.cumsum(codes == 0) - 1
+                    # the section is carried over from the previous chunk, a header
+                    # variable is a group code 9 followed by its value
+                    for variable in np.flatnonzero(header[entity] & (codes == 9)).tolist():
+                        if value(variable) == b"$INSUNITS" and variable + 1 < len(codes) and codes[variable + 1] == 70:
+                            scale = DXF_UNITS.get(int(numbers[variable + 1]), 1.0)
+                    keep = inside[entity]
+                    if not keep.any():
+                        continue
+                    for points, closed in _dxf_geometry(codes[keep], numbers[keep], types[inside], flatness / scale):
+                        (closedlist if closed else pieces).append(points * scale if scale != 1 else points)
+                    profiler.count("dxf2polygon.entities", int(inside.sum()))
+        contours = closedlist + [points for points, _ in join_contours(remove_duplicates(pieces, snap), snap)]
+        polygonlist = []
+        for points in remove_duplicates(contours, snap):
+            polygon = Polygon.fromarray(points)
+            profiler.count("dxf2polygon.vertices_in", len(polygon.xlist))
+            if tolerance is not None:
+                with profiler.span("simplify"):
+                    polygon = polygon.simplify(tolerance)
+            profiler.count("dxf2polygon.vertices_out", len(polygon.xlist))
+            polygonlist.append(polygon)
+        profiler.count("dxf2polygon.paths", len(polygonlist))
     return polygonlist
 
 
 def _searchpoint(ps, pointlist):
+    key = gridkey(ps.x, ps.y)
     for index, p in enumerate(pointlist):
-        if math.isclose(p.x, ps.x, rel_tol=1E-3) and math.isclose(p.y, ps.y, rel_tol=1E-3):
+        if gridkey(p.x, p.y) == key:
             return index
     return None
 
@@ -158,218 +948,456 @@ def dotproduct(v, u):
     return v.x * u.x + v.y * u.y
 
 
+@dataclass
+class TabResolution:
+    """Result of resolve_tabs(), every attribute is an array with one entry per tab.
+
+    start, end: (n, 2) coordinates of the tab points at tab position -/+ tab width / 2
+    t         : (n, 2) projection parameters of start and end on the line, 0 is first, 1 is second line point
+    aligned   : (n, ) True if the tab position lies on the line
+    inside    : (n, 2) True if start, end lies within the line segment
+    fits      : (n, ) True if the tab width is not larger than the line length
+    """
+    start: np.ndarray
+    end: np.ndarray
+    t: np.ndarray
+    aligned: np.ndarray
+    inside: np.ndarray
+    fits: np.ndarray
+
+    @property
+    def valid(self):
+        """(n, ) True if the tab lies completely on its line."""
+        return self.aligned & self.inside.all(axis=1)
+
+
+def resolve_tabs(tablist, tolerance=1E-6):
+    """Validate and resolve all tabs at once.
+
+    The tab points are ordered by increasing x coordinate, or by increasing
+    y coordinate for vertical lines.
+
+    Args:
+        tablist  : list of tab objects, see MainWindow.save()
+        tolerance: maximum distance of a tab point to the line
+    Returns:
+        (TabResolution)
+    """
+    linepoints = np.array([tab["linepoints"] for tab in tablist], dtype=float).reshape(-1, 4)
+    pos = np.array([tab["pos"] for tab in tablist], dtype=float).reshape(-1, 2)
+    width = np.array([tab["width"] for tab in tablist], dtype=float)
+    p1, p2 = linepoints[:, :2], linepoints[:, 2:]
+    ab = p2 - p1
+    length = np.hypot(ab[:, 0], ab[:, 1])
+    nonzero = length > 0
+    safelength = np.where(nonzero, length, 1)
+    u = ab / safelength[:, None]
+    # let the direction point to increasing x or y for vertical lines
+    flip = (u[:, 0] < 0) | ((u[:, 0] == 0) & (u[:, 1] < 0))
+    u[flip] = -u[flip]
+    offset = u * (width / 2)[:, None]
+    start, end = pos - offset, pos + offset
+
+    t = np.empty((len(pos), 2))
+    inside = np.empty((len(pos), 2), dtype=bool)
+    aligned = nonzero.copy()
+    eps = tolerance / safelength
+    for column, point in enumerate((start, end)):
+        ac = point - p1
+        # distance of point to line and position of projection on line
+        cross = (ab[:, 0] * ac[:, 1] - ab[:, 1] * ac[:, 0]) / safelength
+        t[:, column] = (ac * ab).sum(axis=1) / safelength ** 2
+        online = nonzero & (np.abs(cross) <= tolerance)
+        aligned &= online
+        inside[:, column] = online & (t[:, column] >= -eps) & (t[:, column] <= 1 + eps)
+    return TabResolution(start=start, end=end, t=t, aligned=aligned, inside=inside, fits=nonzero & (width <= length + tolerance))
+
+
 def _tabpoint_inside_segment(p1, p2, pt):
     """
     Return [bool, bool]
     with 1st element True if first tab point is within p1--p2 else False
     with 2nd element True if seconds tab point is within p1--p2 else False
     """
-    # calculate the corner points of tab
-    if p1.x == p2.x:
-        # vertical
-        poi_list = [Point(pt.x, pt.y - pt.tabwidth / 2), Point(pt.x, pt.y + pt.tabwidth / 2)]
-    else:
-        # non vertical
-        m = (p1.y - p2.y) / (p1.x - p2.x)
-        dx = (pt.tabwidth / 2) / math.sqrt(1 + m ** 2)
-        dy = m * dx
-        poi_list = [Point(pt.x - dx, pt.y - dy), Point(pt.x + dx, pt.y + dy)]
-
-    # check if tab position +/- tab width / 2 lies on the line where the tab is
-    # https://lucidar.me/en/mathematics/check-if-a-point-belongs-on-a-line-segment/
-    logger.debug(poi_list)
-    # poi_list = [left, right]
-
-    inside_list = []
-    for poi in poi_list:
-        logger.debug("----")
-        logger.debug(f"poi={poi}")
-        AB = Point(p2.x - p1.x, p2.y - p1.y)
-        AC = Point(poi.x - p1.x, poi.y - p1.y)
-
-        CP = crossproduct(AB, AC)
-        if CP != 0:
-            inside_list.append(False)
-            logger.debug(f"[1] Point {pt} is not aligned within {p1} and {p2}")
-            continue
+    tab = dict(pos=[pt.x, pt.y], width=pt.tabwidth, linepoints=[p1.x, p1.y, p2.x, p2.y])
+    return resolve_tabs([tab]).inside[0].tolist()
 
-        KAC = dotproduct(AB, AC)
-        if KAC < 0:
-            # poi is not between p1 and p2
-            logger.debug("2: poi is not between p1 and p2")
-            inside_list.append(False)
-            continue
-        elif KAC == 0:
-            # Point(xpos, ypos) is on p1
-            logger.debug("2: poi is on p1")
-            inside_list.append(True)
-            continue
 
-        KAB = dotproduct(AB, AB)
-        if KAC > KAB:
-            inside_list.append(False)
-            logger.debug(f"[2] Point {pt} is not aligned within {p1} and {p2}")
-            continue
-        if KAC == KAB:
-            # poi is on p2
-            logger.debug("3: poi is on p2")
-            inside_list.append(True)
-            continue
+def cumulative_length(xarr, yarr):
+    """Compute the length along a polyline at every polyline point.
+
+    Returns:
+        (n, ) array starting with 0 and ending with the length of the polyline
+    """
+    return np.concatenate(([0.0], np.cumsum(np.hypot(np.diff(xarr), np.diff(yarr)))))
+
+
+def point_at_length(xarr, yarr, cumlength, s):
+    """Compute the points at distances s along a polyline by binary search in cumlength.
+
+    Args:
+        xarr, yarr: coordinates of the polyline
+        cumlength : cumulative length array, see cumulative_length()
+        s         : array of distances along the polyline
+    Returns:
+        (tuple) of arrays with x, y of the points and index of the segment where the points lie on
+    """
+    s = np.clip(np.asarray(s, dtype=float), 0, cumlength[-1])
+    index = np.clip(np.searchsorted(cumlength, s, side="right") - 1, 0, len(cumlength) - 2)
+    seglength = cumlength[index + 1] - cumlength[index]
+    f = np.divide(s - cumlength[index], seglength, out=np.zeros_like(s), where=seglength > 0)
+    x = xarr[index] + f * (xarr[index + 1] - xarr[index])
+    y = yarr[index] + f * (yarr[index + 1] - yarr[index])
+    return x, y, index
+
+
+def project_to_length(xarr, yarr, cumlength, x, y):
+    """Compute the distance along a polyline of the polyline point nearest to (x, y)."""
+    a = np.column_stack((xarr[:-1], yarr[:-1]))
+    ab = np.column_stack((np.diff(xarr), np.diff(yarr)))
+    abab = (ab * ab).sum(axis=1)
+    t = np.clip(((np.array([x, y]) - a) * ab).sum(axis=1) / np.where(abab > 0, abab, 1), 0, 1)
+    d = np.hypot(a[:, 0] + t * ab[:, 0] - x, a[:, 1] + t * ab[:, 1] - y)
+    index = int(np.argmin(d))
+    return cumlength[index] + t[index] * math.sqrt(abab[index])
+
+
+def _insert_tabs(pointlist, intervals):
+    """Insert tabs into a polyline.
+
+    A tab starts with an inserted point at its start distance and ends with an inserted
+    point at its end distance, all points after the start point up to the end point are
+    marked with tab width and tab height, which means the move to that point is a tab.
+    For closed polylines tabs may wrap around the first point.
+
+    Args:
+        pointlist: list of Point
+        intervals: list of (start distance, end distance, tab width, tab height)
+    Returns:
+        (list) of Point
+    """
+    xarr = np.array([p.x for p in pointlist])
+    yarr = np.array([p.y for p in pointlist])
+    cumlength = cumulative_length(xarr, yarr)
+    total = cumlength[-1]
+    closed = is_closed(xarr, yarr)
+    pieces = []
+    for s0, s1, width, height in intervals:
+        if closed and s0 < 0:
+            pieces += [(s0 + total, total, width, height), (0, s1, width, height)]
+        elif closed and s1 > total:
+            pieces += [(s0, total, width, height), (0, s1 - total, width, height)]
+        else:
+            pieces.append((max(s0, 0), min(s1, total), width, height))
+    pieces.sort()
+    starts = np.array([piece[0] for piece in pieces])
+    ends = np.array([piece[1] for piece in pieces])
+
+    # new points at tab start and tab end, except where a polyline point already is
+    snew = np.concatenate((starts, ends))
+    nearest = np.clip(np.searchsorted(cumlength, snew), 1, len(cumlength) - 1)
+    duplicate = np.minimum(np.abs(cumlength[nearest] - snew), np.abs(cumlength[nearest - 1] - snew)) < 1E-9
+    snew = snew[~duplicate]
+    xnew, ynew, _ = point_at_length(xarr, yarr, cumlength, snew)
+
+    s = np.concatenate((cumlength, snew))
+    order = np.argsort(s, kind="stable")
+    s = s[order]
+    # a point is a tab point if it lies within start < s <= end of any tab or on start of a tab starting at 0
+    index = np.searchsorted(starts, s, side="left") - 1
+    istab = (index >= 0) & (s <= np.maximum.accumulate(ends)[np.maximum(index, 0)])
+    atzero = (s == 0) & (starts[0] == 0) if len(starts) else np.zeros_like(istab)
+    index = np.where(atzero, 0, index)
+    istab |= atzero
+
+    result = []
+    for position, isvertex, tab, tabindex in zip(order.tolist(), (order < len(pointlist)).tolist(), istab.tolist(), index.tolist()):
+        if isvertex:
+            p = pointlist[position]
+            if tab:
+                p = Point(p.x, p.y, pieces[tabindex][2], pieces[tabindex][3])
+        else:
+            position -= len(pointlist)
+            p = Point(float(xnew[position]), float(ynew[position]), *(pieces[tabindex][2:] if tab else ()))
+        result.append(p)
+    return result
 
-        logger.debug("poi is between p1 and p2")
-        inside_list.append(True)
-    logger.debug(inside_list)
-    return inside_list
 
+def process_tabs(dictobj, tolerance=GRID):
+    """Insert all tabs into the polygonpoints of the paths they belong to.
 
-def process_tabs(dictobj):
+    Tabs are placed by their distance along the path, so a tab may span as many
+    segments as needed. All tabs are validated at once against the segment
+    of their path nearest to their position, see resolve_tabs(). Tabs
+    farther than tolerance from their path are logged and skipped.
+    """
+    pathdict = {path["id"]: path for path in dictobj["pathlist"]}
+    tabsbypath = {}
     for tab in dictobj["tablist"]:
-        # search path to which tab belongs
-        found = False
-        for path in dictobj["pathlist"]:
-            if path["id"] == tab["refid"]:
-                found = True
-                break
-        if not found:
+        if tab["refid"] not in pathdict:
             raise ValueError("tab at {pos!r}: no parent path with id {refid} not found".format(**tab))
+        tabsbypath.setdefault(tab["refid"], []).append(tab)
+
+    placed = []
+    for refid, tablist in tabsbypath.items():
+        path = pathdict[refid]
+        xarr = np.array([p.x for p in path["polygonpoints"]])
+        yarr = np.array([p.y for p in path["polygonpoints"]])
+        cumlength = cumulative_length(xarr, yarr)
+        s = np.array([project_to_length(xarr, yarr, cumlength, *tab["pos"]) for tab in tablist])
+        _, _, index = point_at_length(xarr, yarr, cumlength, s)
+        for tab, position, i in zip(tablist, s.tolist(), index.tolist()):
+            linepoints = [xarr[i].item(), yarr[i].item(), xarr[i + 1].item(), yarr[i + 1].item()]
+            placed.append((refid, tab, position, cumlength[-1], linepoints))
+    if not placed:
+        return
+    resolution = resolve_tabs([dict(tab, linepoints=linepoints) for _, tab, _, _, linepoints in placed], tolerance)
+    profiler.count("process_tabs.invalid", int((~resolution.aligned).sum()))
+
+    intervalsbypath = {}
+    for (refid, tab, s, total, _), aligned, inside in zip(placed, resolution.aligned.tolist(), resolution.inside.all(axis=1).tolist()):
+        if not aligned:
+            logger.warning("tab at %r is not on its path %r, skipped", tab["pos"], refid)
+            continue
+        if tab["width"] >= total:
+            logger.warning("tab at %r is wider than its path %r", tab["pos"], refid)
+        elif not inside:
+            logger.debug("tab at %r spans a corner of path %r", tab["pos"], refid)
+        intervalsbypath.setdefault(refid, []).append((s - tab["width"] / 2, s + tab["width"] / 2, tab["width"], tab["height"]))
+        if tracer.enabled:
+            tracer.record("tab", refid=refid, pos=tab["pos"], start=s - tab["width"] / 2, end=s + tab["width"] / 2)
+    for refid, intervals in intervalsbypath.items():
+        path = pathdict[refid]
+        path["polygonpoints"] = _insert_tabs(path["polygonpoints"], intervals)
+
+
+def _merge_intervals(starts, ends):
+    """Merge overlapping intervals.
+
+    Returns:
+        (tuple) of arrays with sorted starts and ends of the disjoint intervals
+    """
+    order = np.argsort(starts)
+    starts, ends = starts[order], np.maximum.accumulate(ends[order])
+    if len(starts) == 0:
+        return starts, ends
+    new = np.ones(len(starts), dtype=bool)
+    new[1:] = starts[1:] > ends[:-1]
+    last = np.concatenate((np.flatnonzero(new)[1:] - 1, [len(starts) - 1]))
+    return starts[new], ends[last]
+
 
-        p1, p2 = Point(*tab["linepoints"][:2]), Point(*tab["linepoints"][2:])
-        # compute length of line where tab lies
-        linelength = distance(p1, p2)
-        tabwidth = tab["width"]
-        pt = Point(*tab["pos"], tabwidth)
-        print()
-        print("p1=", p1)
-        print("p2=", p2)
-        print("pt=", pt)
-
-        # check if tab width < length of line where tab lies
-        if tabwidth <= linelength:
-            # tab fits on line
-            _tabpoint_inside_segment(p1, p2, pt)
+def corner_indices(xarr, yarr, angle):
+    """Return the indices of all polyline points where the direction changes more than angle degrees.
 
+    For a closed polyline the first point is checked too.
+    """
+    dx, dy = np.diff(xarr), np.diff(yarr)
+    closed = len(xarr) > 2 and is_closed(xarr, yarr)
+    if closed:
+        dx, dy = np.concatenate((dx[-1:], dx)), np.concatenate((dy[-1:], dy))
+    else:
+        dx, dy = np.concatenate((dx[:1], dx, dx[-1:])), np.concatenate((dy[:1], dy, dy[-1:]))
+    turn = np.degrees(np.abs(np.arctan2(dx[:-1] * dy[1:] - dy[:-1] * dx[1:], dx[:-1] * dx[1:] + dy[:-1] * dy[1:])))
+    return np.flatnonzero(turn > angle)
+
+
+def auto_tabs(dictobj, width, height, count=None, spacing=None, angle=30, clearance=None):
+    """Generate tabs for all cut paths without tabs, pockets get no tabs.
+
+    Tabs are evenly distributed by their distance along the path and moved
+    away from corners, so that no corner lies within clearance of a tab.
+    The generated tabs are appended to dictobj["tablist"].
+
+    Args:
+        dictobj  : job, see MainWindow.save()
+        width    : tab width
+        height   : tab height
+        count    : number of tabs per path
+        spacing  : distance between tabs along the path, used if count is None
+        angle    : minimum direction change of a corner in degrees
+        clearance: minimum distance between tab and corner, default is width
+    Returns:
+        (list) of generated tabs
+    """
+    if count is None and spacing is None:
+        raise ValueError("either count or spacing is required")
+    if clearance is None:
+        clearance = width
+    keepout = width / 2 + clearance
+    tabbed = {tab["refid"] for tab in dictobj["tablist"]}
+    tablist = []
+    for path in dictobj["pathlist"]:
+        if path["parentid"] is None or path["id"] in tabbed or path.get("operation") == "pocket":
+            continue
+        xarr = np.asarray(path["polygon"]["xlist"], dtype=float)
+        yarr = np.asarray(path["polygon"]["ylist"], dtype=float)
+        cumlength = cumulative_length(xarr, yarr)
+        total = cumlength[-1]
+        closed = is_closed(xarr, yarr)
+        n = count if count is not None else max(1, round(total / spacing))
+        centers = (np.arange(n) + 0.5) * total / n
+
+        # forbidden intervals for the tab center around corners and at the ends of open paths
+        corners = cumlength[corner_indices(xarr, yarr, angle)]
+        if closed:
+            corners = np.concatenate((corners - total, corners, corners + total))
+        # start with an empty interval, so that there is always one
+        starts, ends = np.concatenate(([-np.inf], corners - keepout)), np.concatenate(([-np.inf], corners + keepout))
+        if not closed:
+            starts = np.concatenate((starts, [-keepout, total - keepout]))
+            ends = np.concatenate((ends, [keepout, total + keepout]))
+        starts, ends = _merge_intervals(starts, ends)
+
+        # move centers lying in a forbidden interval to the nearest interval end
+        index = np.maximum(np.searchsorted(starts, centers, side="right") - 1, 0)
+        blocked = (starts[index] <= centers) & (centers < ends[index])
+        left, right = starts[index], ends[index]
+        centers = np.where(blocked, np.where(centers - left < right - centers, left, right), centers)
+        if closed:
+            centers = np.unique(np.mod(centers, total))
         else:
-            # tab does not fit on line
-            pass
+            centers = np.unique(centers[(centers >= 0) & (centers <= total)])
+        # drop centers which are still in a forbidden interval, e.g. on paths with corners everywhere
+        index = np.maximum(np.searchsorted(starts, centers, side="right") - 1, 0)
+        centers = centers[~((starts[index] < centers) & (centers < ends[index]))]
+        # drop tabs overlapping the previous tab
+        keep = np.ones(len(centers), dtype=bool)
+        keep[1:] = np.diff(centers) >= width + clearance
+        centers = centers[keep]
+        if closed and len(centers) > 1 and centers[0] + total - centers[-1] < width + clearance:
+            centers = centers[:-1]
+        if len(centers) == 0:
+            logger.warning("path %r: no space for tabs", path["id"])
+            continue
 
-        print("=====================================")
+        x, y, segment = point_at_length(xarr, yarr, cumlength, centers)
+        for xpos, ypos, i in zip(x.tolist(), y.tolist(), segment.tolist()):
+            tablist.append(dict(refid=path["id"], parentid=path["parentid"], pos=[xpos, ypos], width=width, height=height,
+                                linepoints=[xarr[i].item(), yarr[i].item(), xarr[i + 1].item(), yarr[i + 1].item()]))
+    dictobj["tablist"].extend(tablist)
+    return tablist
 
 
-def _process_tabs(dictobj):
-    for tab in dictobj["tablist"]:
-        # search path to which tab belongs
-        found = False
-        for path in dictobj["pathlist"]:
-            if path["id"] == tab["refid"]:
-                found = True
-                break
-        if not found:
-            raise ValueError("tab at {pos!r}: no parent path with id {refid} not found".format(**tab))
+def signed_area(xarr, yarr):
+    """Compute the signed area of a closed polygon with the shoelace formula."""
+    return 0.5 * float(np.dot(xarr[:-1], yarr[1:]) - np.dot(yarr[:-1], xarr[1:]))
+
+
+def auto_overcuts(dictobj, angle=45):
+    """Generate overcuts for all inner corners of all cut paths.
+
+    A corner of a cut path is an inner corner if the tool cannot reach the
+    corner of the parent path: for a cut inside the parent path these are
+    the convex corners, for a cut outside the parent path the concave
+    corners of the cut path. Overcuts reuse the id of a corner at the same
+    position, which is removed from cornerlist. The generated overcuts are
+    appended to dictobj["overcutlist"]. Pockets are cleared without
+    overcuts and skipped.
 
-        pt = Point(*tab["pos"])
-        print(pt)
-        pl1, pl2 = Point(*tab["linepoints"][:2]), Point(*tab["linepoints"][2:])
-        if pl2.x <= pl1.x:
-            pl1.x, pl2.x = pl2.x, pl1.x
-            pl1.y, pl2.y = pl2.y, pl1.y
-            print("swap")
-        print(pl1.x, pl1.y, pl2.x, pl2.y)
-        index1 = _searchpoint(pl1, path["polygonpoints"])
-        index2 = _searchpoint(pl2, path["polygonpoints"])
-        print("index:", index1, index2)
-        if index1 is None or index2 is None:
-            raise(ValueError("points not found"))
-
-        # compute length of line where tab lies
-        linelength = math.sqrt((pl1.x - pl2.x) ** 2 + (pl1.y - pl2.y) ** 2)
-        w = tab["width"]
-
-        if w <= linelength:
-            # insert two points at tab position - width / 2 and tab position + width / 2 and mark them as tab
-            wx = tab["width"] * (pl2.x - pl1.x) / linelength
-            wy = tab["width"] * (pl2.y - pl1.y) / linelength
-            if round(pt.x - wx / 2 - pl1.x, 3) < 0 or round(pt.y - wy / 2 - pl1.y, 3) < 0:
-                print("i2")
-                # tab would extend over xt1 or yt1, so set tab start point to xt1, yt2
-                path["polygon"]["xlist"][index1] = [pl1.x, pl1.y, tab["width"]]
-                path["polygon"]["ylist"].insert(index1, [pl1.x + wx, pl1.y + wy, tab["width"]])
-            elif round(pt.x + wx / 2 - pl2.x, 3) > 0 or round(pt.y + wy / 2 - pl2.y, 3) > 0:
-                # tab would extend over xt2 or yt2, so set tab end point to xt2, yt2
-                print("i3")
-                xte, yte = pl2.x, pl2.y
-                xts, yts = pl2.x - wx, pl2.y - wy
+    Args:
+        dictobj: job, see MainWindow.save()
+        angle  : minimum direction change of a corner in degrees
+    Returns:
+        (list) of generated overcuts
+    """
+    pathdict = {path["id"]: path for path in dictobj["pathlist"]}
+    cornerdict = {(corner["parentid"], *gridkey(*corner["pos"])): corner for corner in dictobj["cornerlist"]}
+    existing = {(overcut["parentid"], *gridkey(*overcut["pos"])) for overcut in dictobj["overcutlist"]}
+    nextid = max([item["id"] for item in dictobj["cornerlist"] + dictobj["overcutlist"]], default=0) + 1
+    overcutlist = []
+    for path in dictobj["pathlist"]:
+        parentpath = pathdict.get(path["parentid"])
+        if parentpath is None or path.get("operation") == "pocket":
+            continue
+        xarr = np.asarray(path["polygon"]["xlist"], dtype=float)
+        yarr = np.asarray(path["polygon"]["ylist"], dtype=float)
+        if len(xarr) < 4 or not is_closed(xarr, yarr):
+            continue
+        area = signed_area(xarr, yarr)
+        inside = abs(area) < abs(signed_area(np.asarray(parentpath["polygon"]["xlist"], dtype=float), np.asarray(parentpath["polygon"]["ylist"], dtype=float)))
+
+        # direction change at every corner from cross and dot product of the adjacent edges
+        dx, dy = np.diff(xarr), np.diff(yarr)
+        pdx, pdy = np.roll(dx, 1), np.roll(dy, 1)
+        cross = pdx * dy - pdy * dx
+        turn = np.degrees(np.abs(np.arctan2(cross, pdx * dx + pdy * dy)))
+        convex = np.sign(cross) == np.sign(area)
+        for index in np.flatnonzero((turn > angle) & (convex == inside)).tolist():
+            pos = [xarr[index].item(), yarr[index].item()]
+            key = (path["id"], *gridkey(*pos))
+            if key in existing:
+                continue
+            existing.add(key)
+            corner = cornerdict.pop(key, None)
+            if corner is None:
+                overcutlist.append(dict(id=nextid, parentid=path["id"], pos=pos))
+                nextid += 1
             else:
-                # tab is lying between the two points
-                print("i4")
-
-                lt = math.sqrt((pt.x - pl1.x) ** 2 + (pt.y - pl1.y) ** 2)  # length between (xt, yt) and (pl1.x, pl1.y)
-                xta = ((lt - w / 2) / linelength) * (pl2.x - pl1.x) + pl1.x
-                yta = ((lt - w / 2) / linelength) * (pl2.y - pl1.y) + pl1.y
-                xtb = ((lt + w / 2) / linelength) * (pl2.x - pl1.x) + pl1.x
-                ytb = ((lt + w / 2) / linelength) * (pl2.y - pl1.y) + pl1.y
-
-                print(f"pl1.x={pl1.x:6.2f}, pl1.y={pl1.y:6.2f}, pl2.x={pl2.x:6.2f}, pl2.y={pl2.y:6.2f}")
-                print(f"lt={lt:6.2f}, l={linelength:6.2f}")
-                print(f"xta={xta:6.2f}, yta={yta:6.2f}, xtb={xtb:6.2f}, ytb={ytb:6.2f}")
-
-                path["polygonpoints"].insert(index2, Point(xta, yta))
-                path["polygonpoints"].insert(index2, Point(xtb, ytb, tab["width"]))
-
-                # path["polygon"]["xlist"].insert(index2, xta)
-                # path["polygon"]["ylist"].insert(index2, yta)
-                # path["polygon"]["xlist"].insert(index2, [xtb, tab["width"]])
-                # path["polygon"]["ylist"].insert(index2, [ytb, tab["width"]])
-        else:
-            # mark all points from tab position till tap position + tab width as tab
-            pass
+                overcutlist.append(dict(id=corner["id"], parentid=path["id"], pos=corner["pos"]))
+    usedids = {overcut["id"] for overcut in overcutlist}
+    dictobj["cornerlist"][:] = [corner for corner in dictobj["cornerlist"] if corner["id"] not in usedids]
+    dictobj["overcutlist"].extend(overcutlist)
+    return overcutlist
 
 
 def process_overcuts(dictobj):
+    """Insert the overcuts into the polygonpoints of their cut paths.
+
+    The corner of an overcut is looked up by its grid position, see gridkey().
+    The overcut goes from the corner towards the corner of the parent path.
+    This is the nearest parent vertex whose bisector passes through the
+    corner, as every vertex of an offset path lies on the bisector of its
+    parent vertex, so cut path and parent path need not have the same vertices.
+    """
+    pathdict = {path["id"]: path for path in dictobj["pathlist"]}
+    overcutsbypath = collections.defaultdict(list)
     for overcut in dictobj["overcutlist"]:
         # search path to which the overcut belongs to
-        found = False
-        parentid = overcut["parentid"]
-        for path in dictobj["pathlist"]:
-            if parentid == path['id']:
-                found = True
-                break
-        if not found:
+        path = pathdict.get(overcut["parentid"])
+        if path is None:
             raise ValueError("overcut {id}: no parent path {parentid} not found".format(**overcut))
-
-        found = False
-        for parentpath in dictobj["pathlist"]:
-            if parentpath["id"] == path["parentid"]:
-                found = True
-                break
-        if not found:
+        if path["parentid"] not in pathdict:
             raise ValueError("overcut {id}: no parent parent path {parentid} not found".format(**overcut))
+        overcutsbypath[path["id"]].append(overcut)
 
-        # print(parentpath["id"], path["parentid"])
+    for parentid, overcutlist in overcutsbypath.items():
+        path = pathdict[parentid]
+        parentpath = pathdict[path["parentid"]]
+        diameter = dictobj["toollist"][path["tool"]]["Diameter"]
 
         # search index of point in path where overcut is
-        found = False
+        indices = {}
         for index, p in enumerate(path["polygonpoints"]):
-            if math.isclose(p.x, overcut["pos"][0], rel_tol=1E-3) and math.isclose(p.y, overcut["pos"][1], rel_tol=1E-3):
-                found = True
-                break
-        if not found:
-            raise ValueError("overcut {id}: no position on parent path {parentid} not found".format(**overcut))
-        #        print(f"{path['id']}, {parentid}, {overcut['pos']}, {index}, {path['polygon']['xlist'][index]}, {path['polygon']['ylist'][index]}")
-
-        diameter = dictobj["toollist"][path["tool"]]["Diameter"]
-
-        p1 = path["polygonpoints"][index]
-        p2 = parentpath["polygonpoints"][index + 1] # why on hell +1 ???
-        # print(p1, p2)
-
-        p3 = get_point_at_line_in_distance(p1, p2, diameter / 2)
-
-        path['polygonpoints'].insert(index, Point(p3.x, p3.y, 10))
-        path['polygonpoints'].insert(index, Point(p1.x, p1.y, 10))
-
-        # required for process_tabs which comes after process_overcuts
-        parentpath['polygonpoints'].insert(index +1 , Point(p2.x, p2.y))
-        parentpath['polygonpoints'].insert(index +1, Point(p2.x, p2.y))
+            indices.setdefault(gridkey(p.x, p.y), index)
+        parentxy = np.array([(p.x, p.y) for p in parentpath["polygonpoints"]], dtype=float)
+        # bisector of the parent vertices 1 ... n, see _miter()
+        bisector = _miter(parentxy)
+        bisector /= np.hypot(bisector[:, 0], bisector[:, 1])[:, None]
+        found = []
+        for overcut in overcutlist:
+            index = indices.get(gridkey(*overcut["pos"]))
+            if index is None:
+                raise ValueError("overcut {id}: no position on parent path {parentid} not found".format(**overcut))
+            found.append((index, overcut))
+        corners = np.array([(path["polygonpoints"][index].x, path["polygonpoints"][index].y) for index, _ in found])
+        offset = corners[:, None, :] - parentxy[None, 1:, :]
+        across = np.abs(offset[..., 0] * bisector[:, 1] - offset[..., 1] * bisector[:, 0])
+        distance = np.where(across <= GRID, np.hypot(offset[..., 0], offset[..., 1]), np.inf)
+        invalid = np.flatnonzero(np.isinf(distance.min(axis=1)))
+        if len(invalid):
+            raise ValueError("overcut {id}: no corner of the parent path found".format(**found[invalid[0]][1]))
+        found = [(index, overcut, Point(*parentxy[1 + vertex].tolist())) for (index, overcut), vertex in zip(found, np.argmin(distance, axis=1).tolist())]
+
+        # inserting from the end keeps the indices of the corners before
+        for index, overcut, p2 in sorted(found, key=lambda item: item[0], reverse=True):
+            p1 = path["polygonpoints"][index]
+            p3 = get_point_at_line_in_distance(p1, p2, diameter / 2)
+
+            path['polygonpoints'].insert(index, Point(p3.x, p3.y, 10))
+            path['polygonpoints'].insert(index, Point(p1.x, p1.y, 10))
+            if tracer.enabled:
+                tracer.record("overcut", id=overcut["id"], parentid=parentid, index=index, corner=(p2.x, p2.y), end=(p3.x, p3.y))
 
 
 def get_point_at_line_in_distance(p1, p2, distance):
@@ -383,17 +1411,975 @@ def get_point_at_line_in_distance(p1, p2, distance):
     return Point(x, y)
 
 
-def make_gcode(dictobj):
-    process_overcuts(dictobj)
-    process_tabs(dictobj)
+FEED = 1200        # default feed rate in mm/min
+PLUNGE = 500       # default plunge rate in mm/min
+SPINDLE = 12000    # default spindle speed in rpm
+SAVEZ = 10         # default safe z in mm
+RAPID = 3000       # default rapid rate in mm/min
+ACCELERATION = 100  # default acceleration in mm/s^2
+JUNCTION_DEVIATION = 0.01  # default junction deviation in mm
+STEPOVER = 0.4     # default stepover of pockets as fraction of the tool diameter
+COMMONLINE = 0.01  # tolerance for cutting coincident edges of cut paths once in mm, see common_lines()
+
+
+def _add_polygonpoints(dictobj):
+    """Add polygonpoints as list of Point to all paths without polygonpoints."""
+    for path in dictobj["pathlist"]:
+        if "polygonpoints" not in path:
+            path["polygonpoints"] = [Point(x, y) for x, y in zip(path["polygon"]["xlist"], path["polygon"]["ylist"])]
+
+
+def _f(value):
+    return "{:.4f}".format(value)
+
+
+def gcode_header(tool):
+    return ["M3 S{}".format(tool.get("Speed", SPINDLE)), "G4 P3"]
+
+
+def gcode_footer(settings):
+    return ["G0 Z{}".format(_f(settings.get("savez", SAVEZ))), "M5"]
+
+
+def path2gcode(pointlist, settings, tool):
+    """Return the G-code lines for cutting along pointlist.
+
+    The path is cut in passes of the tool's Stepdown, or in one pass for the full
+    material thickness. An open path is cut forth and back in alternating passes.
+    Moves to points marked as tab are lifted to the tab height. The tool is
+    lifted to savez before the path, the next path, gcode_toolchange() or
+    gcode_footer() lift it after the path.
+
+    Args:
+        pointlist: list of Point
+        settings : dict with savez and materialthickness
+        tool     : dict with tool data, Feed, Plunge and Stepdown are optional
+    Returns:
+        (list) of str
+    """
+    savez = settings.get("savez", SAVEZ)
+    thickness = settings["materialthickness"]
+    feed, plunge = tool.get("Feed", FEED), tool.get("Plunge", PLUNGE)
+    stepdown = tool.get("Stepdown") or thickness
+    passes = max(1, math.ceil(thickness / stepdown - 1E-9))
+    first = pointlist[0]
+    closed = len(pointlist) > 2 and gridkey(first.x, first.y) == gridkey(pointlist[-1].x, pointlist[-1].y)
+    lines = ["G0 Z{}".format(_f(savez)), "G0 X{} Y{}".format(_f(first.x), _f(first.y))]
+    # a move is lifted by the tab height of its end point, backwards by the one of its start point
+    forward = list(zip(pointlist[1:], [p.tabheight for p in pointlist[1:]]))
+    backward = list(zip(pointlist[-2::-1], [p.tabheight for p in pointlist[:0:-1]]))
+    for n in range(1, passes + 1):
+        z = -min(n * stepdown, thickness)
+        start, moves = (first, forward) if closed or n % 2 else (pointlist[-1], backward)
+        zcurrent = max(z, start.tabheight - thickness) if start.tabheight else z
+        lines.append("G1 Z{} F{}".format(_f(zcurrent), plunge))
+        for p, tabheight in moves:
+            znext = max(z, tabheight - thickness) if tabheight else z
+            if znext != zcurrent:
+                lines.append("G1 Z{} F{}".format(_f(znext), plunge))
+                zcurrent = znext
+            lines.append("G1 X{} Y{} F{}".format(_f(p.x), _f(p.y), feed))
+    return lines
+
+
+def common_lines(pointlists, tolerance=COMMONLINE, tools=None):
+    """Remove the edges of cut paths which coincide with an edge of an earlier cut path.
+
+    Adjacent parts spaced by the tool diameter share the cut along their
+    common border. The segments of all paths are hashed into a grid, only
+    segments with overlapping bounding boxes in the same cell are compared,
+    which takes O(n) expected time. A part of a segment which lies within tolerance of a
+    segment of an earlier path with the same tool is removed, the rest of
+    the path is split into open pieces. Segments lifted by a tab are kept.
+
+    Args:
+        pointlists: list of list of Point, the cut paths in cutting order
+        tolerance : maximum distance of coincident edges
+        tools     : list of tool index of every path, None for the same tool
+    Returns:
+        (list) with list of pieces, each a list of Point, for every path
+    """
+    if not tolerance or len(pointlists) < 2:
+        return [[pointlist] for pointlist in pointlists]
+    with profiler.span("common_lines"):
+        tools = [0] * len(pointlists) if tools is None else tools
+        xy = [np.array([(p.x, p.y, p.tabheight) for p in pointlist], dtype=float).reshape(-1, 3) for pointlist in pointlists]
+        # a segment is lifted by the tab height of its end point
+        tabbed = np.concatenate([points[1:, 2] != 0 for points in xy])
+        a = np.concatenate([points[:-1, :2] for points in xy])
+        b = np.concatenate([points[1:, :2] for points in xy])
+        path = np.repeat(np.arange(len(xy)), [max(0, len(points) - 1) for points in xy])
+        segment = np.concatenate([np.arange(max(0, len(points) - 1)) for points in xy])
+        tool = np.asarray(tools)[path]
+        keep = ~tabbed & (np.hypot(*(b - a).T) > tolerance)
+        a, b, path, segment, tool = a[keep], b[keep], path[keep], segment[keep], tool[keep]
+
+        # the segments are put into the cells of a grid of about the size of their extents
+        lower, upper = np.minimum(a, b) - tolerance, np.maximum(a, b) + tolerance
+        size = 2 * float(np.median((upper - lower).max(axis=1))) if len(a) else 1.0
+        first, last = np.floor(lower / size).astype(np.int64), np.floor(upper / size).astype(np.int64)
+        span = last - first + 1
+        count = span[:, 0] * span[:, 1]
+        entry = np.repeat(np.arange(len(a)), count)
+        offset = np.arange(len(entry)) - np.repeat(np.cumsum(count) - count, count)
+        cx = first[entry, 0] + offset % span[entry, 0]
+        cy = first[entry, 1] + offset // span[entry, 0]
+        order = np.lexsort((entry, cy, cx))
+        entry, cell = entry[order], np.column_stack((cx[order], cy[order]))
+        # every entry is paired with the following entries in the same cell
+        newcell = np.ones(len(entry), dtype=bool)
+        newcell[1:] = (cell[1:] != cell[:-1]).any(axis=1)
+        start = np.flatnonzero(newcell)
+        end = np.repeat(np.append(start[1:], len(entry)), np.diff(np.append(start, len(entry))))
+        number = end - np.arange(len(entry)) - 1
+        i = np.repeat(np.arange(len(entry)), number)
+        j = i + 1 + np.arange(len(i)) - np.repeat(np.cumsum(number) - number, number)
+        i, j = entry[i], entry[j]
+        candidate = (path[i] != path[j]) & (tool[i] == tool[j]) & (lower[i] <= upper[j]).all(axis=1) & (lower[j] <= upper[i]).all(axis=1)
+        i, j = i[candidate], j[candidate]
+        # segments sharing more than one cell are paired more than once
+        i, j = np.unique(np.column_stack((i, j)), axis=0).reshape(-1, 2).T
+        removed = collections.defaultdict(list)
+        # the segment of the later path is cut away
+        later = path[j] > path[i]
+        i, j = np.where(later, i, j), np.where(later, j, i)
+        direction = b[j] - a[j]
+        lengthsquared = (direction * direction).sum(axis=1)
+        t0 = ((a[i] - a[j]) * direction).sum(axis=1) / lengthsquared
+        t1 = ((b[i] - a[j]) * direction).sum(axis=1) / lengthsquared
+        start, stop = np.clip(np.minimum(t0, t1), 0, 1), np.clip(np.maximum(t0, t1), 0, 1)
+        # both ends of the overlap lie within tolerance of the other segment
+        coincident = (stop - start) * np.sqrt(lengthsquared) > tolerance
+        for t in (start, stop):
+            point = a[j] + t[:, None] * direction
+            other = b[i] - a[i]
+            s = np.clip(((point - a[i]) * other).sum(axis=1) / (other * other).sum(axis=1), 0, 1)
+            coincident &= np.hypot(*(point - a[i] - s[:, None] * other).T) <= tolerance
+        for index in np.flatnonzero(coincident).tolist():
+            removed[path[j[index]], segment[j[index]]].append((start[index].item(), stop[index].item()))
+        profiler.count("common_lines.pairs", len(i))
+        profiler.count("common_lines.segments", len(removed))
+
+        bypath = collections.defaultdict(dict)
+        for (index, k), intervals in removed.items():
+            bypath[int(index)][int(k)] = intervals
+        result = []
+        for index, pointlist in enumerate(pointlists):
+            if index in bypath:
+                result.append(_remove_intervals(pointlist, bypath[index], tolerance))
+            else:
+                result.append([pointlist])
+    return result
+
+
+def _remove_intervals(pointlist, removed, tolerance):
+    """Split pointlist into the pieces not covered by the removed intervals.
+
+    Args:
+        pointlist: list of Point
+        removed  : dict of segment index to list of (t0, t1) intervals to remove
+        tolerance: pieces not longer than tolerance are dropped
+    Returns:
+        (list) of list of Point
+    """
+    def at(k, t):
+        if t <= 0:
+            return pointlist[k]
+        if t >= 1:
+            return pointlist[k + 1]
+        p, q = pointlist[k], pointlist[k + 1]
+        return Point(p.x + t * (q.x - p.x), p.y + t * (q.y - p.y))
+
+    pieces, piece = [], [pointlist[0]]
+    for k in range(len(pointlist) - 1):
+        position = 0.0
+        for t0, t1 in sorted(removed.get(k, ())):
+            if t1 <= position:
+                continue
+            if t0 > position:
+                piece.append(at(k, t0))
+            if len(piece) > 1:
+                pieces.append(piece)
+            piece = [at(k, t1)]
+            position = t1
+        if position < 1:
+            piece.append(pointlist[k + 1])
+    if len(piece) > 1:
+        pieces.append(piece)
+    closed = len(pointlist) > 2 and gridkey(pointlist[0].x, pointlist[0].y) == gridkey(pointlist[-1].x, pointlist[-1].y)
+    if closed and len(pieces) > 1 and pieces[0][0] is pointlist[0] and pieces[-1][-1] is pointlist[-1]:
+        # join the pieces across the start point of the closed path
+        pieces[0] = pieces.pop() + pieces[0][1:]
+    return [piece for piece in pieces if sum(math.hypot(q.x - p.x, q.y - p.y) for p, q in zip(piece, piece[1:])) > tolerance]
+
+
+_GCODE_WORD = re.compile(r"([A-Z])([-+]?(?:\d+\.?\d*|\.\d+))")
+
+
+def _number(value, fmt):
+    text = fmt % value
+    if "." in text:
+        text = text.rstrip("0").rstrip(".")
+    return "0" if text == "-0" else text
+
+
+def _mergeable(points, tolerance):
+    """Return list of flags of the points of a run kept after merging.
+
+    Points deviating more than tolerance from the line between their
+    neighbours and points where the direction reverses are always kept, so
+    a run going back on itself is not merged into one move. The pieces in
+    between are simplified with the Douglas-Peucker algorithm.
+    """
+    xy = np.array([point[1:3] for point in points], dtype=float)
+    a, b, c = xy[:-2], xy[1:-1], xy[2:]
+    cross = np.abs((c[:, 0] - a[:, 0]) * (b[:, 1] - a[:, 1]) - (c[:, 1] - a[:, 1]) * (b[:, 0] - a[:, 0]))
+    reverse = ((b - a) * (c - b)).sum(axis=1) < 0
+    keep = np.ones(len(xy), dtype=bool)
+    keep[1:-1] = reverse | (cross > tolerance * np.hypot(*(c - a).T))
+    bounds = np.flatnonzero(keep)
+    for first, last in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        if last - first > 2:
+            keep[first:last + 1] = _douglas_peucker(xy[first:last + 1], tolerance)
+    return keep.tolist()
+
+
+def optimize_gcode(lines, precision=4, tolerance=0.001):
+    """Return a shorter G-code program doing the same moves.
+
+    Consecutive cutting moves in the XY plane with the same feed rate are
+    merged if they deviate less than tolerance from a straight line, numbers
+    are written with at most precision decimals without trailing zeros and
+    G, X, Y, Z and F words are left out if they do not change.
+    Lines other than G0 and G1 moves are kept as they are.
+
+    Args:
+        lines    : list of G-code lines as returned by make_gcode()
+        precision: number of decimals
+        tolerance: maximum deviation of merged moves, 0 merges only exactly collinear moves
+    Returns:
+        (list) of G-code lines
+    """
+    with profiler.span("optimize_gcode"):
+        # moves as [g, x, y, z, f] with the modal values filled in, other lines as str
+        items = []
+        state = [None, None, None, None, None]
+        index = dict(G=0, X=1, Y=2, Z=3, F=4)
+        for line in lines:
+            words = _GCODE_WORD.findall(line.upper())
+            if not words or not all(letter in index and (letter != "G" or value in ("0", "1", "00", "01")) for letter, value in words):
+                items.append(line)
+                continue
+            for letter, value in words:
+                state[index[letter]] = float(value)
+            items.append(list(state))
+        # merge runs of cutting moves in the XY plane, a run starts at the end of the move before
+        merged = []
+        position, run = None, []
+        for item in items + [None]:
+            previous = run[-1] if run else position
+            planar = isinstance(item, list) and item[0] == 1 and None not in item and previous is not None and item[3] == previous[3]
+            if run and not (planar and item[4] == run[-1][4]):
+                points = [position] + run
+                if len(points) > 2:
+                    points = [point for point, flag in zip(points, _mergeable(points, tolerance)) if flag]
+                merged.extend(points[1:])
+                position, run = run[-1], []
+            if planar:
+                run.append(item)
+            elif item is not None:
+                merged.append(item)
+                if isinstance(item, list):
+                    position = item
+        # write only changed words
+        result = []
+        fmt = "%.{}f".format(precision)
+        g = x = y = z = f = None
+        for item in merged:
+            if isinstance(item, str):
+                result.append(item)
+                continue
+            words = []
+            if item[1] is not None and _number(item[1], fmt) != x:
+                x = _number(item[1], fmt)
+                words.append("X" + x)
+            if item[2] is not None and _number(item[2], fmt) != y:
+                y = _number(item[2], fmt)
+                words.append("Y" + y)
+            if item[3] is not None and _number(item[3], fmt) != z:
+                z = _number(item[3], fmt)
+                words.append("Z" + z)
+            if not words:
+                continue
+            if item[0] != g:
+                g = item[0]
+                words.insert(0, "G%d" % g)
+            # the feed rate is needed for cutting moves only
+            if g == 1 and item[4] is not None and _number(item[4], fmt) != f:
+                f = _number(item[4], fmt)
+                words.append("F" + f)
+            result.append(" ".join(words))
+    bytes_in, bytes_out = sum(len(line) + 1 for line in lines), sum(len(line) + 1 for line in result)
+    profiler.count("optimize_gcode.lines_in", len(lines))
+    profiler.count("optimize_gcode.lines_out", len(result))
+    profiler.count("optimize_gcode.bytes_in", bytes_in)
+    profiler.count("optimize_gcode.bytes_out", bytes_out)
+    logger.info("optimize_gcode: %d -> %d lines, %d -> %d bytes", len(lines), len(result), bytes_in, bytes_out)
+    return result
+
+
+def point_in_polygon(x, y, xarr, yarr):
+    """Test with the even-odd rule which points lie inside a closed polygon.
+
+    Args:
+        x, y      : (n, ) arrays with coordinates of the points
+        xarr, yarr: coordinates of the closed polygon, first point equal to last
+    Returns:
+        (n, ) boolean array
+    """
+    x, y = np.asarray(x, dtype=float)[:, None], np.asarray(y, dtype=float)[:, None]
+    x1, y1, x2, y2 = xarr[:-1], yarr[:-1], xarr[1:], yarr[1:]
+    crossing = (y1 > y) != (y2 > y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        xcross = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+    return (crossing & (x < xcross)).sum(axis=1) % 2 == 1
+
+
+def _clearance(points, xy):
+    """Return the smallest distance of the points to the segments of the polyline xy."""
+    a, ab = xy[:-1], np.diff(xy, axis=0)
+    abab = np.maximum((ab * ab).sum(axis=1), 1E-300)
+    ap = points[:, None] - a[None]
+    t = np.clip((ap * ab[None]).sum(axis=2) / abab, 0, 1)
+    return np.hypot(*(ap - t[..., None] * ab[None]).transpose(2, 0, 1)).min()
+
+
+def _closed(points):
+    return np.vstack((points, points[:1]))
+
+
+def _offset_rings(xy, distances):
+    """Offset a closed counterclockwise polygon inwards to all distances.
+
+    The polygon is offset with the vertex offsets of _miter() until the
+    next edge collapses, then the collapsed edges are removed and the
+    offsetting continues from there. Offsetting stops when the polygon
+    collapses or splits into parts, which shows as a ring coming nearer
+    than its distance to a concave corner of the polygon.
+
+    Args:
+        xy       : (n + 1, 2) array of points, first point equal to last
+        distances: ascending array of offsets
+    Returns:
+        (list) of (m + 1, 2) arrays of the closed rings
+    """
+    direction = np.diff(xy, axis=0)
+    turn = direction[:, 0] * np.roll(direction[:, 1], -1) - direction[:, 1] * np.roll(direction[:, 0], -1)
+    reflex = xy[1:][turn < 0]
+    rings = []
+    base, done, k = xy, 0.0, 0
+    while k < len(distances) and len(base) > 3:
+        offset = _miter(base)
+        if not np.isfinite(offset).all() or signed_area(base[:, 0], base[:, 1]) <= 0:
+            # the polygon has collapsed to a line
+            break
+        points = base[1:]
+        edge = np.roll(points, -1, axis=0) - points
+        length = np.hypot(edge[:, 0], edge[:, 1])
+        # the length of every edge shrinks linearly with the offset
+        rate = -((np.roll(offset, -1, axis=0) - offset) * edge).sum(axis=1) / length
+        with np.errstate(divide="ignore"):
+            collapse = np.where(rate > 1E-12, length / rate, np.inf)
+        event = done + collapse.min()
+        count = int(np.searchsorted(distances[k:], event))
+        for distance in distances[k:k + count]:
+            ring = _closed(points + (distance - done) * offset)
+            if len(reflex) and _clearance(reflex, ring) < distance * (1 - 1E-6):
+                logger.warning("pocket: polygon splits at offset %f, inner rings are left out", distance)
+                return rings
+            rings.append(ring)
+        k += count
+        if not np.isfinite(event):
+            break
+        points = points + (event - done) * offset
+        # remove the second point of every collapsed edge
+        points = points[~np.roll(collapse <= collapse.min() + 1E-9, 1)]
+        # edges collapsing nearly at the same time leave points on top of each other
+        points = points[np.hypot(*(points - np.roll(points, 1, axis=0)).T) > 1E-9]
+        if len(points) < 3:
+            break
+        base, done = np.vstack((points[-1:], points)), event
+    return rings
+
+
+def _cross(p, q):
+    return p[..., 0] * q[..., 1] - p[..., 1] * q[..., 0]
+
+
+def _clip(xy, closed, outside=(), inside=None):
+    """Split a polyline into the pieces outside the polygons outside and inside the polygon inside.
+
+    The segments are split at their intersections with the polygons and
+    the parts are kept or removed by the position of their midpoints.
+
+    Args:
+        xy     : (n, 2) array of points
+        closed : True if xy is a closed polygon, first point equal to last
+        outside: list of closed polygons as (m, 2) arrays
+        inside : closed polygon as (m, 2) array or None
+    Returns:
+        (list) of (m, 2) arrays
+    """
+    a, d = xy[:-1], np.diff(xy, axis=0)
+    lower, upper = np.minimum(xy[:-1], xy[1:]), np.maximum(xy[:-1], xy[1:])
+    indexlist, tlist = [np.arange(len(a))], [np.zeros(len(a))]
+    polygons = list(outside) + ([] if inside is None else [inside])
+    for polygon in polygons:
+        # only segments overlapping the bounding box of the polygon can intersect it
+        candidates = np.flatnonzero(((lower <= polygon.max(axis=0)) & (upper >= polygon.min(axis=0))).all(axis=1))
+        e = np.diff(polygon, axis=0)
+        ab = polygon[:-1][None] - a[candidates, None]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            denominator = _cross(d[candidates, None], e[None])
+            t, u = _cross(ab, e[None]) / denominator, _cross(ab, d[candidates, None]) / denominator
+        crossing = (t > 0) & (t < 1) & (u >= 0) & (u <= 1)
+        indexlist.append(candidates[np.nonzero(crossing)[0]])
+        tlist.append(t[crossing])
+    index, t = np.concatenate(indexlist), np.concatenate(tlist)
+    order = np.lexsort((t, index))
+    index, t = index[order], t[order]
+    xy = np.vstack((a[index] + t[:, None] * d[index], xy[-1:]))
+    mid = (xy[:-1] + xy[1:]) / 2
+
+    def within(polygon):
+        result = np.zeros(len(mid), dtype=bool)
+        candidates = np.flatnonzero(((mid >= polygon.min(axis=0)) & (mid <= polygon.max(axis=0))).all(axis=1))
+        result[candidates] = point_in_polygon(mid[candidates, 0], mid[candidates, 1], polygon[:, 0], polygon[:, 1])
+        return result
+
+    keep = np.ones(len(mid), dtype=bool)
+    for polygon in outside:
+        keep &= ~within(polygon)
+    if inside is not None:
+        keep &= within(inside)
+    if keep.all():
+        return [xy]
+    if closed and keep.any():
+        # start at a removed part, so no piece wraps around the first point
+        shift = int(np.argmin(keep)) + 1
+        xy, keep = np.vstack((xy[shift:-1], xy[:shift + 1])), np.roll(keep, -shift)
+    pieces = []
+    start = None
+    for index, flag in enumerate(keep.tolist() + [False]):
+        if flag and start is None:
+            start = index
+        elif not flag and start is not None:
+            pieces.append(xy[start:index + 1])
+            start = None
+    return pieces
+
+
+def pocket(polygon, radius, stepover, islands=()):
+    """Compute the toolpath clearing the inside of a closed polygon.
+
+    The rings are inward offsets of the polygon at radius, radius + stepover,
+    ... and are cut from the inside to the outside, followed by the contours
+    around the islands. Parts of rings within radius of an island are left out.
+    Every piece starts at the point nearest to the end of the piece before.
+
+    Args:
+        polygon : Polygon to clear
+        radius  : radius of the tool
+        stepover: distance between the rings
+        islands : list of Polygon inside polygon which are not cleared
+    Returns:
+        (list) of (xy, linked), xy is a (n, 2) array of the points of a piece,
+        linked is True if the piece can be reached at depth from the end of the piece before
+        without leaving the pocket
+    """
+    with profiler.span("pocket"):
+        def ccw(polygon):
+            return polygon.xy if polygon.orientation > 0 else polygon.xy[::-1]
+
+        xy = ccw(polygon)
+        # the largest possible offset is half the extent of the polygon
+        xmin, ymin, xmax, ymax = polygon.bbox
+        extent = max(xmax - xmin, ymax - ymin) / 2
+        rings = _offset_rings(xy, np.arange(radius, extent + stepover, stepover))
+        if not rings:
+            logger.warning("pocket: tool does not fit into polygon")
+            return []
+        keepout = []
+        contours = []
+        for island in islands:
+            island = ccw(island)
+            contours.append(_closed(island[1:] - radius * _miter(island)))
+            keepout.append(_closed(island[1:] - (radius + stepover / 2) * _miter(island)))
+        pieces = []
+        for ring in rings[:0:-1]:
+            pieces += [(piece, len(piece) == len(ring) and np.array_equal(piece, ring)) for piece in _clip(ring, True, keepout)]
+        for contour in contours:
+            pieces += [(piece, len(piece) == len(contour) and np.array_equal(piece, contour)) for piece in _clip(contour, True, inside=rings[0])]
+        pieces.append((rings[0], True))
+        # start every piece at the point nearest to the end of the piece before
+        toolpath = []
+        position = None
+        for piece, closed in pieces:
+            if position is not None:
+                distance = np.hypot(piece[:, 0] - position[0], piece[:, 1] - position[1])
+                if closed:
+                    index = int(np.argmin(distance[:-1]))
+                    piece = np.vstack((piece[index:-1], piece[:index + 1]))
+                elif distance[-1] < distance[0]:
+                    piece = piece[::-1]
+            # links crossing the first ring or an island leave the pocket
+            link = [] if position is None else _clip(np.array([position, piece[0]]), False, keepout, rings[0])
+            toolpath.append((piece, len(link) == 1 and len(link[0]) == 2))
+            position = piece[-1]
+    profiler.count("pocket.rings", len(rings))
+    profiler.count("pocket.pieces", len(toolpath))
+    return toolpath
+
+
+def pocket2gcode(toolpath, settings, tool):
+    """Return the G-code lines for clearing a pocket, see pocket().
+
+    Args:
+        toolpath: list of (xy, linked) as returned by pocket()
+        settings: dict with savez and materialthickness
+        tool    : dict with tool data, Feed, Plunge and Stepdown are optional
+    Returns:
+        (list) of str
+    """
+    savez = settings.get("savez", SAVEZ)
+    thickness = settings["materialthickness"]
+    feed, plunge = tool.get("Feed", FEED), tool.get("Plunge", PLUNGE)
+    stepdown = tool.get("Stepdown") or thickness
+    passes = max(1, math.ceil(thickness / stepdown - 1E-9))
+    lines = []
+    for n in range(1, passes + 1):
+        z = -min(n * stepdown, thickness)
+        for index, (xy, linked) in enumerate(toolpath):
+            x, y = xy[0]
+            if linked and index > 0:
+                lines.append("G1 X{} Y{} F{}".format(_f(x), _f(y), feed))
+            else:
+                lines += ["G0 Z{}".format(_f(savez)), "G0 X{} Y{}".format(_f(x), _f(y)), "G1 Z{} F{}".format(_f(z), plunge)]
+            lines += ["G1 X{} Y{} F{}".format(_f(x), _f(y), feed) for x, y in xy[1:].tolist()]
+    return lines
+
+
+def pocketpath2gcode(parentpath, islandpaths, settings, tool):
+    """Return the G-code lines for clearing the inside of parentpath except the islandpaths.
+
+    The rings are Stepover times the tool diameter apart, see STEPOVER.
+    """
+    diameter = tool["Diameter"]
+    toolpath = pocket(Polygon(**parentpath["polygon"]), diameter / 2, tool.get("Stepover", STEPOVER) * diameter,
+                      [Polygon(**path["polygon"]) for path in islandpaths])
+    return pocket2gcode(toolpath, settings, tool) if toolpath else []
+
+
+def process_paths(dictobj):
+    """Insert overcuts and tabs into the polygonpoints of all paths."""
+    _add_polygonpoints(dictobj)
+    with profiler.span("process_overcuts"):
+        process_overcuts(dictobj)
+    with profiler.span("process_tabs"):
+        process_tabs(dictobj)
+    profiler.count("process.paths", len(dictobj["pathlist"]))
+    profiler.count("process.tabs", len(dictobj["tablist"]))
+    profiler.count("process.overcuts", len(dictobj["overcutlist"]))
+
+
+def schedule(dictobj, start=(0.0, 0.0)):
+    """Order the cut paths for as few tool changes and rapid moves as possible.
+
+    The cut paths are grouped by tool and the groups are ordered by tool
+    diameter, smaller tools first. Within a group pockets are cut first,
+    then inner cuts and last outer cuts, so a part is still held by the
+    sheet while its inside is cut. Paths of the same kind are cut in
+    nearest neighbour order, starting at start.
+
+    Returns:
+        (list) of (tool index, list of cut paths)
+    """
+    pathdict = {path["id"]: path for path in dictobj["pathlist"]}
+    toollist = dictobj["toollist"]
+    groups = {}
+    for path in dictobj["pathlist"]:
+        if path["parentid"] is not None:
+            groups.setdefault(path["tool"], []).append(path)
+
+    def kind(path):
+        if path.get("operation") == "pocket":
+            return 0
+        parentpath = pathdict.get(path["parentid"])
+        if parentpath is None:
+            return 2
+        # like in auto_overcuts() an inner cut has a smaller area than its parent path
+        area = abs(signed_area(np.asarray(path["polygon"]["xlist"], dtype=float), np.asarray(path["polygon"]["ylist"], dtype=float)))
+        return 1 if area < abs(signed_area(np.asarray(parentpath["polygon"]["xlist"], dtype=float), np.asarray(parentpath["polygon"]["ylist"], dtype=float))) else 2
+
+    position = np.asarray(start, dtype=float)
+    result = []
+    with profiler.span("schedule"):
+        for toolindex in sorted(groups, key=lambda index: (toollist[index].get("Diameter", 0), index)):
+            kinds = [kind(path) for path in groups[toolindex]]
+            ordered = []
+            for current in (0, 1, 2):
+                paths = [path for path, k in zip(groups[toolindex], kinds) if k == current]
+                ends = np.array([(path["polygon"]["xlist"][i], path["polygon"]["ylist"][i]) for path in paths for i in (0, -1)], dtype=float).reshape(-1, 2, 2)
+                remaining = np.ones(len(paths), dtype=bool)
+                for _ in paths:
+                    distance = np.where(remaining, np.hypot(*(ends[:, 0] - position).T), np.inf)
+                    index = int(np.argmin(distance))
+                    remaining[index] = False
+                    ordered.append(paths[index])
+                    position = ends[index, 1]
+            result.append((toolindex, ordered))
+        profiler.count("schedule.tools", len(result))
+    return result
+
+
+def gcode_toolchange(tool, index, settings):
+    """Return the G-code lines for stopping the spindle, pausing for the change to tool index and starting again."""
+    return ["G0 Z{}".format(_f(settings.get("savez", SAVEZ))), "M5", "(tool {} diameter {})".format(index, tool.get("Diameter")), "M0"] + gcode_header(tool)
+
+
+def _check_references(dictobj):
+    """Raise ValueError for a cut path, tab or overcut whose path is missing."""
+    pathids = {path["id"] for path in dictobj["pathlist"]}
+    for path in dictobj["pathlist"]:
+        if path["parentid"] is not None and path["parentid"] not in pathids:
+            raise ValueError("path {id}: no parent path {parentid} found".format(**path))
+    for tab in dictobj["tablist"]:
+        if tab["refid"] not in pathids:
+            raise ValueError("tab at {pos!r}: no parent path with id {refid} not found".format(**tab))
+    for overcut in dictobj["overcutlist"]:
+        if overcut["parentid"] not in pathids:
+            raise ValueError("overcut {id}: no parent path {parentid} not found".format(**overcut))
+
+
+def _common_pieces(dictobj, groups, pointlists):
+    """Return a dict of the id of every cut path, except pockets, to its pieces left by common_lines().
+
+    Args:
+        dictobj   : job
+        groups    : scheduled cut paths, see schedule()
+        pointlists: dict of path id to processed points, None for pockets
+    """
+    profilepaths = [path for _, paths in groups for path in paths if pointlists[path["id"]] is not None]
+    pieces = common_lines([pointlists[path["id"]] for path in profilepaths], dictobj["settings"].get("commonline", 0), [path["tool"] for path in profilepaths])
+    return {path["id"]: item for path, item in zip(profilepaths, pieces)}
+
+
+def _emit(dictobj, groups, piecesbypath, pathlines, split):
+    """Return the program of the scheduled groups of cut paths.
+
+    Args:
+        dictobj     : job
+        groups      : scheduled cut paths, see schedule()
+        piecesbypath: dict of path id to pieces, see _common_pieces()
+        pathlines   : function(path, pieces) returning the G-code lines of a cut path,
+                      pieces is None for pockets
+        split       : if True return one program per tool
+    Returns:
+        (list) of G-code lines with tool changes, if split (list) of (tool index, lines)
+    """
+    settings, toollist = dictobj["settings"], dictobj["toollist"]
+    bodies = [(index, [line for path in paths for line in pathlines(path, piecesbypath.get(path["id"]))]) for index, paths in groups]
+    if split:
+        return [(index, gcode_header(toollist[index]) + body + gcode_footer(settings)) for index, body in bodies]
+    lines = []
+    for number, (index, body) in enumerate(bodies):
+        lines += (gcode_toolchange(toollist[index], index, settings) if number else gcode_header(toollist[index])) + body
+    return lines + gcode_footer(settings) if lines else []
+
+
+def make_gcode(dictobj, split=False):
+    """Process overcuts and tabs of all paths in place and return the G-code program.
+
+    The cut paths are cut in the order of schedule() with a tool change
+    between the tools. If the setting "commonline" is a tolerance other than
+    0, edges shared by cut paths are cut once, see common_lines().
+
+    Args:
+        dictobj: job, see MainWindow.save()
+        split  : if True return one program per tool
+    Returns:
+        (list) of G-code lines, if split (list) of (tool index, G-code lines)
+    Raises:
+        ValueError if a cut path, tab or overcut refers to a missing path
+    """
+    with profiler.span("make_gcode"):
+        _check_references(dictobj)
+        process_paths(dictobj)
+        with profiler.span("emit"):
+            pathdict = {path["id"]: path for path in dictobj["pathlist"]}
+            groups = schedule(dictobj)
+            pointlists = {path["id"]: None if path.get("operation") == "pocket" else path["polygonpoints"] for _, paths in groups for path in paths}
+
+            def pathlines(path, pieces):
+                tool = dictobj["toollist"][path["tool"]]
+                if pieces is None:
+                    return pocketpath2gcode(pathdict[path["parentid"]], [pathdict[islandid] for islandid in path.get("islands", [])], dictobj["settings"], tool)
+                return [line for piece in pieces for line in path2gcode(piece, dictobj["settings"], tool)]
+
+            lines = _emit(dictobj, groups, _common_pieces(dictobj, groups, pointlists), pathlines, split)
+    return lines
+
+
+class Job():
+    """Generate G-code and cache the processed G-code of every cut path.
+
+    A path is processed again only if anything its G-code depends on changed:
+    its polygon, the polygon of its parent path, its tool, its tabs, its
+    overcuts, its islands or the settings. The edges shared by cut paths,
+    see common_lines(), are searched again only if any cut path or the
+    cutting order changed.
+    """
+    def __init__(self):
+        self.cache = {}
+        self.common = None
+        self.processed = 0
+
+    @staticmethod
+    def _key(path, parentpath, tablist, overcutlist, settings, tool, islandpaths=()):
+        return (
+            path.get("operation"),
+            tuple(path["polygon"]["xlist"]), tuple(path["polygon"]["ylist"]),
+            tuple(parentpath["polygon"]["xlist"]), tuple(parentpath["polygon"]["ylist"]),
+            tuple((tuple(island["polygon"]["xlist"]), tuple(island["polygon"]["ylist"])) for island in islandpaths),
+            tuple((tuple(tab["pos"]), tab["width"], tab["height"]) for tab in tablist),
+            tuple(tuple(overcut["pos"]) for overcut in overcutlist),
+            tuple(sorted(settings.items())), tuple(sorted(tool.items())),
+        )
+
+    @staticmethod
+    def _process(path, parentpath, tablist, overcutlist, settings, toollist, islandpaths=()):
+        """Return the processed points, None for a pocket, and the G-code lines of path."""
+        if path.get("operation") == "pocket":
+            return None, pocketpath2gcode(parentpath, islandpaths, settings, toollist[0])
+        path = dict(path, tool=0)
+        parentpath = dict(parentpath)
+        path.pop("polygonpoints", None)
+        parentpath.pop("polygonpoints", None)
+        dictobj = dict(settings=settings, pathlist=[path, parentpath], tablist=tablist, overcutlist=overcutlist, toollist=toollist)
+        process_paths(dictobj)
+        return path["polygonpoints"], path2gcode(path["polygonpoints"], settings, toollist[0])
+
+    def make_gcode(self, dictobj, split=False):
+        """Return the G-code program for dictobj, see make_gcode(), dictobj is not changed.
+
+        Returns:
+            (list) of G-code lines, if split (list) of (tool index, G-code lines)
+        """
+        with profiler.span("job"):
+            _check_references(dictobj)
+            pathdict = {path["id"]: path for path in dictobj["pathlist"]}
+            tabsbypath, overcutsbypath = {}, {}
+            for tab in dictobj["tablist"]:
+                tabsbypath.setdefault(tab["refid"], []).append(tab)
+            for overcut in dictobj["overcutlist"]:
+                overcutsbypath.setdefault(overcut["parentid"], []).append(overcut)
+            settings = dictobj["settings"]
+            cache = {}
+            self.processed = 0
+            for path in dictobj["pathlist"]:
+                if path["parentid"] is None:
+                    continue
+                parentpath = pathdict[path["parentid"]]
+                tool = dictobj["toollist"][path["tool"]]
+                tablist = tabsbypath.get(path["id"], [])
+                overcutlist = overcutsbypath.get(path["id"], [])
+                islandpaths = [pathdict[islandid] for islandid in path.get("islands", [])]
+                key = self._key(path, parentpath, tablist, overcutlist, settings, tool, islandpaths)
+                entry = self.cache.get(path["id"])
+                if entry is None or entry[0] != key:
+                    with profiler.span("process"):
+                        entry = (key, *self._process(path, parentpath, tablist, overcutlist, settings, [tool], islandpaths))
+                    self.processed += 1
+                cache[path["id"]] = entry
+            self.cache = cache
+            profiler.count("job.processed", self.processed)
+
+            groups = schedule(dictobj)
+            key = (settings.get("commonline", 0), tuple((path["id"], path["tool"], cache[path["id"]][0]) for _, paths in groups for path in paths))
+            if self.common is None or self.common[0] != key:
+                self.common = (key, _common_pieces(dictobj, groups, {pathid: entry[1] for pathid, entry in cache.items()}), {})
+            _, piecesbypath, linesbypath = self.common
+
+            def pathlines(path, pieces):
+                # only the paths with removed edges are emitted from their pieces
+                entry = cache[path["id"]]
+                if pieces is None or (len(pieces) == 1 and pieces[0] is entry[1]):
+                    return entry[2]
+                if path["id"] not in linesbypath:
+                    linesbypath[path["id"]] = [line for piece in pieces for line in path2gcode(piece, settings, dictobj["toollist"][path["tool"]])]
+                return linesbypath[path["id"]]
+
+            return _emit(dictobj, groups, piecesbypath, pathlines, split)
+
+
+_GCODE_COMMENT = re.compile(r"\(.*?\)|;.*")
+
+
+@dataclass
+class Toolpath:
+    """Moves of a G-code program, see parse_gcode().
+
+    x, y, z: (n + 1, ) coordinates of the start point and the end points of all moves
+    rapid  : (n, ) True for rapid moves
+    feed   : (n, ) feed rate of the moves in mm/min
+    dwell  : total dwell time in s
+    """
+    x: np.ndarray
+    y: np.ndarray
+    z: np.ndarray
+    rapid: np.ndarray
+    feed: np.ndarray
+    dwell: float = 0.0
+
+    def lengths(self):
+        """(n, ) length of all moves."""
+        return np.sqrt(np.diff(self.x) ** 2 + np.diff(self.y) ** 2 + np.diff(self.z) ** 2)
+
+    def times(self, rapid=RAPID, acceleration=ACCELERATION, zacceleration=None, junction_deviation=JUNCTION_DEVIATION):
+        """Return (n, ) estimated time in s of all moves.
+
+        Every move accelerates and decelerates with a trapezoidal speed profile.
+        The speed at the junction of two moves is limited by the junction
+        deviation like in grbl, and by the speed which can be reached from the
+        previous and stopped within the following moves.
+
+        Args:
+            rapid             : rapid rate in mm/min
+            acceleration      : acceleration of the X and Y axis in mm/s^2
+            zacceleration     : acceleration of the Z axis in mm/s^2, if None same as acceleration
+            junction_deviation: junction deviation in mm, 0 stops at every corner
+        """
+        length = self.lengths()
+        result = np.zeros(len(length))
+        moving = length > 0
+        d = length[moving]
+        if len(d) == 0:
+            return result
+        unit = np.column_stack((np.diff(self.x), np.diff(self.y), np.diff(self.z)))[moving] / d[:, None]
+        speed = (np.where(self.rapid, rapid, self.feed) / 60)[moving]
+        axisacceleration = np.array([acceleration, acceleration, acceleration if zacceleration is None else zacceleration])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            accel = (axisacceleration / np.abs(unit)).min(axis=1)
+            # junction speed from the angle between the moves
+            costheta = -(unit[:-1] * unit[1:]).sum(axis=1)
+            sinhalf = np.sqrt(np.clip(0.5 * (1 - costheta), 0, 1))
+            junction = np.minimum(accel[:-1], accel[1:]) * junction_deviation * sinhalf / (1 - sinhalf)
+        junction = np.where(sinhalf >= 1, np.inf, junction)
+        limit = np.concatenate(([0], np.minimum(junction, np.minimum(speed[:-1], speed[1:]) ** 2), [0]))
+        # v[j]^2 <= v[k]^2 + 2 a (distance from k to j) for all k before j and all k after j
+        energy = np.concatenate(([0], np.cumsum(2 * accel * d)))
+        forward = energy + np.minimum.accumulate(limit - energy)
+        remaining = energy[-1] - energy
+        backward = remaining + np.minimum.accumulate((limit - remaining)[::-1])[::-1]
+        v2 = np.maximum(np.minimum(limit, np.minimum(forward, backward)), 0)
+        v0, v1 = np.sqrt(v2[:-1]), np.sqrt(v2[1:])
+        cruise = d - (2 * speed ** 2 - v2[:-1] - v2[1:]) / (2 * accel)
+        # moves too short to reach full speed accelerate to peak and decelerate at once
+        peak = np.sqrt((2 * accel * d + v2[:-1] + v2[1:]) / 2)
+        result[moving] = np.where(cruise >= 0, (2 * speed - v0 - v1) / accel + np.maximum(cruise, 0) / speed, (2 * peak - v0 - v1) / accel)
+        return result
+
+    def duration(self, rapid=RAPID, acceleration=ACCELERATION, zacceleration=None, junction_deviation=JUNCTION_DEVIATION):
+        """Return estimated time in s of the program, see times()."""
+        return float(self.times(rapid, acceleration, zacceleration, junction_deviation).sum()) + self.dwell
+
+
+def machine(settings):
+    """Return the machine data of settings as keyword arguments of Toolpath.times()."""
+    return dict(
+        rapid=settings.get("rapid", RAPID), acceleration=settings.get("acceleration", ACCELERATION),
+        zacceleration=settings.get("zacceleration"), junction_deviation=settings.get("junction_deviation", JUNCTION_DEVIATION),
+    )
+
+
+def estimate_time(lines, settings):
+    """Return estimated machining time in s of the G-code lines on the machine of settings."""
+    with profiler.span("estimate_time"):
+        return parse_gcode(lines).duration(**machine(settings))
+
+
+def _forward_fill(values, start):
+    """Replace nan in values by the last value before, the first by start."""
+    values = np.concatenate(([start], values))
+    index = np.where(np.isnan(values), 0, np.arange(len(values)))
+    return values[np.maximum.accumulate(index)]
+
+
+def parse_gcode(lines, start=(0.0, 0.0, 0.0)):
+    """Parse the linear moves of a G-code program.
+
+    Only the G0, G1 and G4 commands and the X, Y, Z, F and P words are
+    interpreted, the program is expected in absolute millimeter coordinates.
+    The P word of G4 is the dwell time in seconds as in grbl, not in
+    milliseconds as in the G-code notes at the end of this module.
+    The whole program is tokenized at once and the modal values are filled
+    in with numpy.
+
+    Args:
+        lines: list of G-code lines
+        start: (x, y, z) machine position before the program
+    Returns:
+        (Toolpath)
+    """
+    with profiler.span("parse_gcode"):
+        text = _GCODE_COMMENT.sub("", "\n".join(lines)).upper().replace(" ", "").replace("\t", "")
+        code = np.frombuffer(text.encode("ascii", "replace") + b"\n", dtype=np.uint8)
+        numeric = ((code >= ord("0")) & (code <= ord("9"))) | np.isin(code, np.frombuffer(b".+-", dtype=np.uint8))
+        position = np.flatnonzero((code >= ord("A")) & (code <= ord("Z")))
+        letter = code[position].view("S1").astype("U1")
+        line = np.cumsum(code == ord("\n"))[position]
+        # all numbers are parsed at once, letters without number get nan
+        numbers = np.fromstring(np.where(numeric, code, ord(" ")).astype(np.uint8).tobytes().decode(), sep=" ")
+        hasnumber = numeric[position + 1]
+        if len(numbers) != hasnumber.sum():
+            raise ValueError("malformed G-code, numbers without address letter")
+        value = np.full(len(position), np.nan)
+        value[hasnumber] = numbers
+        count = len(lines)
+
+        gcode = letter == "G"
+        arc = gcode & ((value == 2) | (value == 3))
+        if arc.any():
+            raise ValueError("arc moves are not supported: {}".format(lines[line[arc][0]].strip()))
+        dwelling = np.zeros(count, dtype=bool)
+        dwelling[line[gcode & (value == 4)]] = True
+        dwell = float(value[(letter == "P") & dwelling[line]].sum())
+
+        # one row per line with the motion mode, X, Y, Z and F word or nan
+        rows = np.full((count, 5), np.nan)
+        motion = gcode & ((value == 0) | (value == 1))
+        rows[line[motion], 0] = value[motion]
+        for column, name in enumerate("XYZF", 1):
+            mask = letter == name
+            rows[line[mask], column] = value[mask]
+        rows = rows[~dwelling & ~np.isnan(rows).all(axis=1)]
+
+        mode = _forward_fill(rows[:, 0], 0)
+        x, y, z = (_forward_fill(rows[:, index + 1], start[index]) for index in range(3))
+        feed = _forward_fill(rows[:, 4], FEED)
+        # drop rows without move like a modal feed rate, their values are filled in already
+        move = ~np.isnan(rows[:, 1:4]).all(axis=1)
+        keep = np.concatenate(([True], move))
+        toolpath = Toolpath(x[keep], y[keep], z[keep], mode[1:][move] == 0, feed[1:][move], dwell)
+    profiler.count("parse_gcode.moves", len(toolpath.rapid))
+    return toolpath
 
 
 def start():
     ifilename = "./drawings/overcut.json"
     ofilename = "./drawings/debug.json"
     dictobj = json.load(open(ifilename))
-    for path in dictobj["pathlist"]:
-        path["polygonpoints"] = [Point(x, y) for x, y in zip(path["polygon"]["xlist"], path["polygon"]["ylist"])]
+    _add_polygonpoints(dictobj)
     for path in dictobj["pathlist"]:
         assert len(path["polygonpoints"]) == len(path["polygon"]["xlist"])
         assert len(path["polygonpoints"]) == len(path["polygon"]["ylist"])
@@ -427,6 +2413,7 @@ G4: Dwell
 Pause the machine for a period of time.
 Parameters
 Pnnn Time to wait, in milliseconds (In Teacup, P0, wait until all previous moves are finished)
+     in seconds for grbl, which is assumed by parse_gcode()
 Snnn Time to wait, in seconds (Only on Repetier, Marlin, Prusa, Smoothieware, and RepRapFirmware 1.16 and later)
 
 
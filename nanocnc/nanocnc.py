@@ -12,17 +12,24 @@ Line -> Shapely
 import sys
 import enum
 import json
+import logging
+import os
 import pathlib
 import math
 import traceback
 import pprint
+import tempfile
+import numpy as np
 from PyQt5 import QtWidgets, QtCore, QtGui
 
 import libnanocnc
+import journal
 
 
 PROGNAME = "nanocnc"
 
+logger = logging.getLogger(PROGNAME)
+
 # TODO: fix id off TAB, has to refer to base polygon, not to INNER or OUTER polygon
 
 COLOR_NORMAL = QtGui.QColor(QtCore.Qt.black)
@@ -31,6 +38,9 @@ COLOR_CUTPATH = QtGui.QColor(QtCore.Qt.blue)
 COLOR_TAB =  QtGui.QColor(QtCore.Qt.red)
 COLOR_OVERCUT = QtGui.QColor(QtCore.Qt.magenta)
 COLOR_DISABLE = QtGui.QColor(QtCore.Qt.gray)
+COLOR_RAPID = QtGui.QColor(QtCore.Qt.darkGray)
+COLOR_FEED_SHALLOW = QtGui.QColor(144, 238, 144)
+COLOR_FEED_DEEP = QtGui.QColor(0, 100, 0)
 
 
 class Attribute(enum.Enum):
@@ -47,12 +57,159 @@ class Attribute(enum.Enum):
     OVERCUT = enum.auto()   # indicates an OVERCUT
     CORNER = enum.auto()
     DEBUG = enum.auto()
+    POCKET = enum.auto()    # indicates a pocket for path
 
 
 class Zoom(enum.Enum):
     FIT, IN, OUT = enum.auto(), enum.auto(), enum.auto()
 
 
+LOD_BOX_PIXELS = 4         # paths smaller than this on screen are drawn as bounding box
+LOD_SEGMENT_PIXELS = 2     # paths with shorter average segments on screen are drawn simplified
+LOD_MARKER_PIXELS = 1      # markers smaller than this on screen are not drawn
+
+
+def levelOfDetail(painter):
+    return QtWidgets.QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+
+
+_pens = {}
+
+
+def pen(color, width=0):
+    """Return shared pen of color and width, width 0 is a cosmetic pen."""
+    key = (color.rgba(), width)
+    if key not in _pens:
+        _pens[key] = QtGui.QPen(color, width)
+    return _pens[key]
+
+
+class StyledItem():
+    """Mixin for items painting themselves in the color of their state.
+
+    The color is chosen in paint() with a shared pen, so changing the state
+    only repaints the item.
+    """
+    _color = COLOR_NORMAL
+    _hover = False
+    _width = 0
+
+    def setColor(self, color):
+        self._color = color
+        self.update()
+
+    def setHover(self, hover):
+        self._hover = hover
+        self.update()
+
+    def pen(self):
+        return pen(COLOR_HOVER if self._hover else self._color, self._width)
+
+
+class PathItem(StyledItem, QtWidgets.QGraphicsItem):
+    """Path drawn as one polyline with level of detail.
+
+    Zoomed out the path is drawn as simplified outline or only as its
+    bounding box, see detail(). Scene items are recognized as paths by
+    _ispath.
+    """
+    _ispath = True
+
+    def __init__(self):
+        super().__init__()
+        self._outlines = {}
+        self._segmentlength = 0
+        self._polyline = QtGui.QPolygonF()
+
+    def setPolygon(self, polygon):
+        self.prepareGeometryChange()
+        self._polyline = QtGui.QPolygonF([QtCore.QPointF(x, y) for x, y in zip(polygon.xlist, polygon.ylist)])
+        self._segmentlength = polygon.perimeter / max(1, len(polygon.xlist) - 1)
+        self._outlines = {}
+
+    def lines(self):
+        return [QtCore.QLineF(self._polyline[index], self._polyline[index + 1]) for index in range(self._polyline.count() - 1)]
+
+    def boundingRect(self):
+        return self._polyline.boundingRect()
+
+    def detail(self, lod):
+        """Return "box", "outline" or "segments" for level of detail lod."""
+        rect = self.boundingRect()
+        if max(rect.width(), rect.height()) * lod < LOD_BOX_PIXELS:
+            return "box"
+        if self._segmentlength * lod < LOD_SEGMENT_PIXELS:
+            return "outline"
+        return "segments"
+
+    def outline(self, lod):
+        # cache one outline per power of two of the tolerance
+        level = math.floor(math.log2(LOD_SEGMENT_PIXELS / 4 / lod))
+        if level not in self._outlines:
+            polygon = self._polygon.simplify(2 ** level)
+            self._outlines[level] = QtGui.QPolygonF([QtCore.QPointF(x, y) for x, y in zip(polygon.xlist, polygon.ylist)])
+        return self._outlines[level]
+
+    def paint(self, painter, option, widget=None):
+        lod = levelOfDetail(painter)
+        detail = self.detail(lod)
+        painter.setPen(self.pen())
+        if detail == "box":
+            painter.drawRect(self.boundingRect())
+        elif detail == "outline":
+            painter.drawPolyline(self.outline(lod))
+        else:
+            painter.drawPolyline(self._polyline)
+
+
+class MarkerItem(StyledItem, QtWidgets.QGraphicsEllipseItem):
+    """Tab, corner or overcut marker, not drawn if too small on screen."""
+    _width = 1
+
+    def paint(self, painter, option, widget=None):
+        if self.rect().width() * levelOfDetail(painter) >= LOD_MARKER_PIXELS:
+            painter.setPen(self.pen())
+            painter.setBrush(QtCore.Qt.NoBrush)
+            painter.drawEllipse(self.rect())
+
+
+class ToolpathItem(QtWidgets.QGraphicsItem):
+    """Overlay of a libnanocnc.Toolpath.
+
+    Rapid moves are drawn dashed, cutting moves in a color from light to dark
+    green by depth, so tab lifts and depth passes are visible. All moves of
+    one kind are drawn with one drawLines() call.
+    """
+    def __init__(self, toolpath):
+        super().__init__()
+        self.setZValue(1)
+        x, y, z = toolpath.x, toolpath.y, toolpath.z
+        planar = (x[1:] != x[:-1]) | (y[1:] != y[:-1])
+        self._rect = QtCore.QRectF(QtCore.QPointF(x.min(), y.min()), QtCore.QPointF(x.max(), y.max()))
+        self._lines = [(QtGui.QPen(COLOR_RAPID, 0, QtCore.Qt.DashLine), self._linesOf(x, y, planar & toolpath.rapid))]
+        cut = planar & ~toolpath.rapid
+        depth = np.round(z[1:], 4)
+        levels = np.unique(depth[cut])
+        # deepest cuts last, so only lifted parts of the last pass show the shallow colors
+        for level in levels[::-1]:
+            t = 0 if len(levels) == 1 else (levels[-1] - level) / (levels[-1] - levels[0])
+            color = QtGui.QColor.fromRgbF(*[(1 - t) * a + t * b for a, b in zip(COLOR_FEED_SHALLOW.getRgbF(), COLOR_FEED_DEEP.getRgbF())])
+            self._lines.append((QtGui.QPen(color, 0), self._linesOf(x, y, cut & (depth == level))))
+
+    @staticmethod
+    def _linesOf(x, y, mask):
+        index = np.flatnonzero(mask)
+        return [QtCore.QLineF(*line) for line in zip(x[index].tolist(), y[index].tolist(), x[index + 1].tolist(), y[index + 1].tolist())]
+
+    def boundingRect(self):
+        return self._rect
+
+    def paint(self, painter, option, widget=None):
+        for pen, lines in self._lines:
+            painter.setPen(pen)
+            painter.drawLines(lines)
+
+
 class GraphicView(QtWidgets.QGraphicsView):
 
     signal_itemselect = QtCore.pyqtSignal(QtWidgets.QGraphicsItem, float, float)
@@ -61,20 +218,19 @@ class GraphicView(QtWidgets.QGraphicsView):
     def __init__(self):
         super().__init__()
         self.setScene(QtWidgets.QGraphicsScene(QtCore.QRectF()))
-        self.selectlist = [Attribute.NONE, Attribute.INNER, Attribute.OUTER, Attribute.DISABLE]
+        self.selectlist = [Attribute.NONE, Attribute.INNER, Attribute.OUTER, Attribute.POCKET, Attribute.DISABLE]
         self.setMouseTracking(True)
         self.pid = 0
         self.mid = 0
         self.previousitemslist = []
+        self.toolpathitem = None
 
     def setAction(self, action):
         if self.scene() is not None:
             [item.setVisible(False) for item in self.scene().items() if getattr(item, "_pathattr", None) == Attribute.CORNER]
         if action in [Attribute.ADD_TAB]:
             self.selectlist = [Attribute.CUTPATH]
-            self.selectitem = QtWidgets.QGraphicsItemGroup
-            self.selectlist = [Attribute.CUTPATH]
-            self.selectitem = QtWidgets.QGraphicsItemGroup
+            self.selectitem = PathItem
         elif action in [Attribute.REMOVE_TAB]:
             self.selectlist = [Attribute.TAB]
             self.selectitem = QtWidgets.QGraphicsEllipseItem
@@ -86,15 +242,14 @@ class GraphicView(QtWidgets.QGraphicsView):
             self.selectlist = [Attribute.OVERCUT]
             self.selectitem = QtWidgets.QGraphicsEllipseItem
         else:
-            self.selectlist = [Attribute.NONE, Attribute.INNER, Attribute.OUTER, Attribute.DISABLE]
-            self.selectitem = QtWidgets.QGraphicsItemGroup
+            self.selectlist = [Attribute.NONE, Attribute.INNER, Attribute.OUTER, Attribute.POCKET, Attribute.DISABLE]
+            self.selectitem = PathItem
 
     def drawMarkerList(self, polygon, parentid):
-        for index in range(len(polygon.xlist) - 1):
-            self.drawMarker(polygon.xlist[index], polygon.ylist[index], parentid)
+        return [self.drawMarker(polygon.xlist[index], polygon.ylist[index], parentid) for index in range(len(polygon.xlist) - 1)]
 
     def drawMarker(self, xpos, ypos, parentid, id=None):
-        marker = QtWidgets.QGraphicsEllipseItem(xpos - 1, ypos - 1, 2, 2)
+        marker = MarkerItem(xpos - 1, ypos - 1, 2, 2)
         marker._pathattr = Attribute.CORNER
         marker._parentrefid = parentid
         if id is None:
@@ -107,43 +262,29 @@ class GraphicView(QtWidgets.QGraphicsView):
         return marker
 
     def drawPolygon(self, polygon, pathattr, tool=None):
-        group = QtWidgets.QGraphicsItemGroup()
+        group = PathItem()
         self.pid += 1
 
-        # determine if polygon is clockwise or counterclockwise
-        # from https://gamedev.stackexchange.com/questions/43356/how-can-i-tell-whether-an-object-is-moving-cw-or-ccw-around-a-connected-path
-        area = 0
-        for index in range(len(polygon.xlist) - 1):
-            bx = polygon.xlist[index]
-            by = polygon.ylist[index]
-            ex = polygon.xlist[index + 1]
-            ey = polygon.ylist[index + 1]
-            area += bx * ey - by * ex
-        clockwise = area > 0
-        if not clockwise:
-            polygon.xlist = polygon.xlist[::-1]
-            polygon.ylist = polygon.ylist[::-1]
-
-        for index in range(len(polygon.xlist) - 1):
-            x1, y1 = polygon.xlist[index], polygon.ylist[index]
-            x2, y2 = polygon.xlist[index + 1], polygon.ylist[index + 1]
-            group.addToGroup(QtWidgets.QGraphicsLineItem(x1, y1, x2, y2))
-
-            DRAW_LABEL = False
-            if DRAW_LABEL:
+        # positive area is clockwise on screen with y pointing down
+        polygon.orient(1)
+
+        DRAW_LABEL = False
+        if DRAW_LABEL:
+            for index in range(len(polygon.xlist) - 1):
                 label = QtWidgets.QGraphicsSimpleTextItem(str(index))
-                label.setPos(x1, y1)
+                label.setPos(polygon.xlist[index], polygon.ylist[index])
                 self.scene().addItem(label)
 
         group._pathattr = pathattr
         group._polygon = polygon
+        group.setPolygon(polygon)
         group._tool = tool
         group._pid = self.pid
         # print(group, self.pid)
         if pathattr == Attribute.CUTPATH:
-            effect = QtWidgets.QGraphicsColorizeEffect()
-            effect.setColor(COLOR_CUTPATH)
-            group.setGraphicsEffect(effect)
+            group.setColor(COLOR_CUTPATH)
+        elif pathattr == Attribute.DISABLE:
+            group.setColor(COLOR_DISABLE)
         self.scene().addItem(group)
         return group
 
@@ -154,63 +295,111 @@ class GraphicView(QtWidgets.QGraphicsView):
             self.setScene(QtWidgets.QGraphicsScene(QtCore.QRectF()))
             self.scene().addItem(QtWidgets.QGraphicsLineItem(-2, 0, +2, 0))
             self.scene().addItem(QtWidgets.QGraphicsLineItem(0, -2, 0, +2))
+        # culling and hit testing use the BSP tree index of the scene, which is
+        # built once after adding all items instead of being updated per item
+        self.scene().setItemIndexMethod(QtWidgets.QGraphicsScene.NoIndex)
+        groupdict = {}
         for path in jsonobj["pathlist"]:
             polygon = libnanocnc.Polygon(path["polygon"]["xlist"], path["polygon"]["ylist"])
             item = self.drawPolygon(polygon, Attribute(path["pathattr"]), path["tool"])
             item._parent = path["parentid"]
             item._pid = path["id"]
+            item._markers = []
+            if "operation" in path:
+                item._operation, item._islands = path["operation"], path["islands"]
+            groupdict[item._pid] = item
+        for item in groupdict.values():
+            if item._parent in groupdict:
+                groupdict[item._parent]._group = item
+        self.pid = max(groupdict, default=0)
+        self.mid = max([item["id"] for item in jsonobj["cornerlist"] + jsonobj["overcutlist"]], default=0)
         for corner in jsonobj["cornerlist"]:
-            self.drawMarker(*corner["pos"], parentid=corner["parentid"], id=corner["id"])
+            marker = self.drawMarker(*corner["pos"], parentid=corner["parentid"], id=corner["id"])
+            if corner["parentid"] in groupdict:
+                groupdict[corner["parentid"]]._markers.append(marker)
         for tab in jsonobj["tablist"]:
             # TODO: set attributes of returned tab item, 0 is not correct
             self.drawTab(tab["refid"], tab["pos"][0], tab["pos"][1], tab["width"], tab["height"], tab["parentid"], tab["linepoints"])
         for overcut in jsonobj["overcutlist"]:
             item = self.drawMarker(*overcut["pos"], parentid=overcut["parentid"], id=overcut["id"])
             self.addOverCut(item)
+            if overcut["parentid"] in groupdict:
+                groupdict[overcut["parentid"]]._markers.append(item)
+        self.scene().setItemIndexMethod(QtWidgets.QGraphicsScene.BspTreeIndex)
         self.fitInView(self.scene().itemsBoundingRect(), QtCore.Qt.KeepAspectRatio)
         self.update()
 
+    def showToolpath(self, toolpath):
+        """Show toolpath as overlay, remove the overlay if toolpath is None."""
+        if self.toolpathitem is not None and self.toolpathitem.scene() is self.scene():
+            self.scene().removeItem(self.toolpathitem)
+        self.toolpathitem = None if toolpath is None else ToolpathItem(toolpath)
+        if self.toolpathitem is not None:
+            self.scene().addItem(self.toolpathitem)
+
+    def islands(self, item):
+        """Return the ids of the paths directly inside the path item, which are left out of its pocket."""
+        def inside(inner, outer):
+            (ixmin, iymin, ixmax, iymax), (oxmin, oymin, oxmax, oymax) = inner.bbox, outer.bbox
+            if ixmin < oxmin or iymin < oymin or ixmax > oxmax or iymax > oymax:
+                return False
+            return libnanocnc.point_in_polygon(inner.xy[:, 0], inner.xy[:, 1], outer.xy[:, 0], outer.xy[:, 1]).all()
+
+        candidates = [other for other in self.scene().items() if getattr(other, "_ispath", False) and other is not item
+                      and getattr(other, "_parent", None) is None and other._pathattr != Attribute.DISABLE
+                      and inside(other._polygon, item._polygon)]
+        return [other._pid for other in candidates
+                if not any(inside(other._polygon, outer._polygon) for outer in candidates if outer is not other)]
+
     def deleteGroup(self, group):
-        print("deleteGroup")
+        """Remove the cut path group with its markers and tabs, the tabs are kept in group._tabs for restoreGroup()."""
         group.prepareGeometryChange()
+        group._tabs = [item for item in self.scene().items() if getattr(item, "_pathattr", None) == Attribute.TAB and item._refid == group._pid]
         self.scene().removeItem(group)
+        for item in getattr(group, "_markers", []) + group._tabs:
+            self.scene().removeItem(item)
+
+    def restoreGroup(self, group):
+        self.scene().addItem(group)
+        for item in getattr(group, "_markers", []) + getattr(group, "_tabs", []):
+            self.scene().addItem(item)
 
     def addTab(self, itemgroup, xpos, ypos, tabwidth, tabheight, parentrefid):
-        print("addTab", itemgroup._pid)
-        nearest_item = None
+        logger.debug("addTab %s at (%f, %f)", itemgroup._pid, xpos, ypos)
+        nearest_line = None
         nearest_distance = 2 ** 30
         N = 10
-        # get the item with nearest distance to (xpos, ypos)
-        for item in itemgroup.childItems():
+        # get the line with nearest distance to (xpos, ypos)
+        for line in itemgroup.lines():
             for t in range(N):
-                pt = item.line().pointAt(t / N)
+                pt = line.pointAt(t / N)
                 distance = (xpos - pt.x()) ** 2 + (ypos - pt.y()) ** 2
                 if distance < nearest_distance:
                     nearest_distance = distance
-                    nearest_item = item
-        if nearest_item is None:
-            print("No nearest item found")
+                    nearest_line = line
+        if nearest_line is None:
+            logger.warning("addTab: no nearest line found at (%f, %f)", xpos, ypos)
             return
         # get position at line where to put tab on
-        if nearest_item.line().length() <= tabwidth:
-            center = nearest_item.line().center()
+        if nearest_line.length() <= tabwidth:
+            center = nearest_line.center()
             tabxpos, tabypos = center.x(), center.y()
         else:
             nearest_distance = 2 ** 30
-            nearest_point = nearest_item.line().p1()
+            nearest_point = nearest_line.p1()
             N = 100
             for t in range(N):
-                pt = nearest_item.line().pointAt(t / N)
+                pt = nearest_line.pointAt(t / N)
                 distance = (xpos - pt.x()) ** 2 + (ypos - pt.y()) ** 2
                 if distance < nearest_distance:
                     nearest_distance = distance
                     nearest_point = pt
             tabxpos, tabypos = nearest_point.x(), nearest_point.y()
-        item = self.drawTab(itemgroup._pid, tabxpos, tabypos, tabwidth, tabheight, parentrefid, [nearest_item.line().x1(), nearest_item.line().y1(), nearest_item.line().x2(), nearest_item.line().y2()])
+        item = self.drawTab(itemgroup._pid, tabxpos, tabypos, tabwidth, tabheight, parentrefid, [nearest_line.x1(), nearest_line.y1(), nearest_line.x2(), nearest_line.y2()])
         return item
 
     def drawTab(self, pid, tabxpos, tabypos, tabwidth, tabheight, parentrefid, linepoints):
-        item = QtWidgets.QGraphicsEllipseItem(tabxpos - 1, tabypos - 1, 2, 2)
+        item = MarkerItem(tabxpos - 1, tabypos - 1, 2, 2)
         item._pathattr = Attribute.TAB
         item._pos = (tabxpos, tabypos)
         item._tabwidth = tabwidth
@@ -218,9 +407,7 @@ class GraphicView(QtWidgets.QGraphicsView):
         item._refid = pid
         item._parentrefid = parentrefid
         item._linepoints = linepoints
-        effect = QtWidgets.QGraphicsColorizeEffect()
-        effect.setColor(COLOR_TAB)
-        item.setGraphicsEffect(effect)
+        item.setColor(COLOR_TAB)
         self.scene().addItem(item)
         return item
 
@@ -229,21 +416,15 @@ class GraphicView(QtWidgets.QGraphicsView):
         self.scene().removeItem(item)
 
     def addOverCut(self, item):
-        effect = QtWidgets.QGraphicsColorizeEffect()
-        effect.setColor(COLOR_OVERCUT)
-        item.setGraphicsEffect(effect)
+        item.setColor(COLOR_OVERCUT)
         item._pathattr = Attribute.OVERCUT
         item.setVisible(True)
-        self.previousitemslist = [theitem for theitem in self.previousitemslist if theitem != item]
 
     def removeOverCut(self, item):
-        effect = QtWidgets.QGraphicsColorizeEffect()
-        effect.setColor(COLOR_NORMAL)
-        item.setGraphicsEffect(effect)
+        item.setColor(COLOR_NORMAL)
         item._pathattr = Attribute.CORNER
         item.setVisible(False)
         self.update()
-        #self.previousitemslist = [theitem for theitem in self.previousitemslist if theitem != item]
 
     def getSelectionRect(self, scenePoint):
         extension = 3
@@ -262,41 +443,128 @@ class GraphicView(QtWidgets.QGraphicsView):
 
     def mouseMoveEvent(self, event):
         for item in self.previousitemslist:
-            if 1:
-                effect = QtWidgets.QGraphicsColorizeEffect()
-                effect.setColor(getattr(item, "_last_effect", COLOR_NORMAL))
-                item.setGraphicsEffect(effect)
-            else:
-                effect = QtWidgets.QGraphicsColorizeEffect()
-                action = getattr(item, "_pathattr", None)
-                #print(action)
-                if action in [Attribute.CUTPATH, Attribute.TAB]:
-                    effect.setColor(COLOR_CUTPATH)
-                elif action in [Attribute.ADD_OVERCUT, Attribute.REMOVE_OVERCUT]:
-                    effect.setColor(COLOR_HOVER)
-                else:
-                    effect.setColor(COLOR_NORMAL)
-                item.setGraphicsEffect(effect)
+            item.setHover(False)
 
         pos = self.cursor().pos()
         scenePoint = self.mapToScene(self.mapFromGlobal(pos))
         # put all items in previousitemslist ifthey are in getSelectionRect() and right item
         self.previousitemslist = [item for item in self.scene().items(self.getSelectionRect(scenePoint)) if isinstance(item, self.selectitem) and item._pathattr in self.selectlist]
-        effect = QtWidgets.QGraphicsColorizeEffect()
-        effect.setColor(COLOR_HOVER)
-        # highlight all items in previousitemslist in color red
+        # highlight all items in previousitemslist
         for item in self.previousitemslist:
-            try:
-                item._last_effect = item.graphicsEffect().color()
-            except Exception:
-                pass
-            item.setGraphicsEffect(effect)
+            item.setHover(True)
         self.signal_mousepos_changed.emit(scenePoint.x(), scenePoint.y())
 
 
+def pathdict(item):
+    result = dict(id=item._pid, parentid=getattr(item, "_parent", None), pathattr=item._pathattr.value, polygon=item._polygon.asdict(), tool=item._tool)
+    if getattr(item, "_operation", None) is not None:
+        result.update(operation=item._operation, islands=item._islands)
+    return result
+
+
+def tabdict(item):
+    return dict(refid=item._refid, parentid=item._parentrefid, pos=item._pos, width=item._tabwidth, height=item._tabheight, linepoints=item._linepoints)
+
+
+def markerdict(item):
+    return dict(id=item._id, parentid=item._parentrefid, pos=item._pos)
+
+
+class EditCommand(QtWidgets.QUndoCommand):
+    """Base class of undoable edits.
+
+    Subclasses implement apply(forward) and record(forward), which returns
+    the journal record of the edit, see journal.apply_journal().
+    """
+    def __init__(self, text, view, log=None):
+        super().__init__(text)
+        self.view = view
+        self.log = log
+
+    def redo(self):
+        self.apply(True)
+        if self.log is not None:
+            self.log(self.record(True))
+
+    def undo(self):
+        self.apply(False)
+        if self.log is not None:
+            self.log(self.record(False))
+
+
+class PathCommand(EditCommand):
+    """Change the attribute of a path, adding or deleting its cut path.
+
+    The command keeps the already offset cut path group, its markers and its
+    tabs, so undo and redo only add them to or remove them from the scene.
+    """
+    def __init__(self, view, item, pathattr, tool=None, group=None, log=None):
+        super().__init__(pathattr.name, view, log)
+        self.item = item
+        self.old = (item._pathattr, getattr(item, "_tool", None), getattr(item, "_group", None))
+        self.new = (pathattr, tool, group)
+
+    def apply(self, forward):
+        pathattr, tool, group = self.new if forward else self.old
+        current = getattr(self.item, "_group", None)
+        if current is not None and current is not group:
+            self.view.deleteGroup(current)
+        if group is not None and group.scene() is None:
+            self.view.restoreGroup(group)
+        self.item._pathattr = pathattr
+        self.item._tool = tool
+        self.item._group = group
+        self.item.setColor(COLOR_DISABLE if pathattr == Attribute.DISABLE else COLOR_NORMAL)
+
+    def record(self, forward):
+        pathattr, tool, group = self.new if forward else self.old
+        markers = [] if group is None else getattr(group, "_markers", [])
+        return dict(op="path", id=self.item._pid, pathattr=pathattr.value, tool=tool, cut=None if group is None else pathdict(group),
+                    cornerlist=[markerdict(marker) for marker in markers if marker._pathattr == Attribute.CORNER],
+                    overcutlist=[markerdict(marker) for marker in markers if marker._pathattr == Attribute.OVERCUT],
+                    tablist=[] if group is None else [tabdict(tab) for tab in getattr(group, "_tabs", [])])
+
+
+class TabCommand(EditCommand):
+    """Add or remove a tab item."""
+    def __init__(self, view, item, add, log=None):
+        super().__init__("Add tab" if add else "Remove tab", view, log)
+        self.item = item
+        self.add = add
+
+    def apply(self, forward):
+        add = self.add == forward
+        if add and self.item.scene() is None:
+            self.view.scene().addItem(self.item)
+        elif not add and self.item.scene() is not None:
+            self.view.removeTab(self.item)
+
+    def record(self, forward):
+        return dict(op="tab", add=self.add == forward, tab=tabdict(self.item))
+
+
+class OverCutCommand(EditCommand):
+    """Turn a corner marker into an overcut or back."""
+    def __init__(self, view, item, add, log=None):
+        super().__init__("Add overcut" if add else "Remove overcut", view, log)
+        self.item = item
+        self.add = add
+
+    def apply(self, forward):
+        if self.add == forward:
+            self.view.addOverCut(self.item)
+        else:
+            self.view.removeOverCut(self.item)
+
+    def record(self, forward):
+        return dict(op="overcut", add=self.add == forward, overcut=markerdict(self.item))
+
+
 class CommandWidget(QtWidgets.QWidget):
 
     signal_actionclicked = QtCore.pyqtSignal()
+    signal_autotabs = QtCore.pyqtSignal()
+    signal_autoovercuts = QtCore.pyqtSignal()
 
     def __init__(self, graphicview):
         super().__init__()
@@ -334,6 +602,13 @@ class CommandWidget(QtWidgets.QWidget):
         button.setCheckable(True)
         layout.addWidget(button)
 
+        button = QtWidgets.QPushButton("Cut Pocket")
+        button._data = Attribute.POCKET
+        button.clicked.connect(self.buttonActionClicked)
+        self.buttongroup.addButton(button)
+        button.setCheckable(True)
+        layout.addWidget(button)
+
         button = QtWidgets.QPushButton("Delete Cut")
         button._data = Attribute.NONE
         button.clicked.connect(self.buttonActionClicked)
@@ -381,6 +656,16 @@ class CommandWidget(QtWidgets.QWidget):
         self.wgTabHeight.setValue(4)
         self.wgTabHeight.setDecimals(1)
         layout.addWidget(self.wgTabHeight)
+
+        layout.addWidget(QtWidgets.QLabel("Tabs per path"))
+        self.wgTabCount = QtWidgets.QSpinBox()
+        self.wgTabCount.setRange(1, 20)
+        self.wgTabCount.setValue(4)
+        layout.addWidget(self.wgTabCount)
+
+        button = QtWidgets.QPushButton("Auto tabs")
+        button.clicked.connect(self.signal_autotabs)
+        layout.addWidget(button)
         layout.addStretch(1)
 
         button = QtWidgets.QPushButton("Add overcut")
@@ -396,6 +681,10 @@ class CommandWidget(QtWidgets.QWidget):
         self.buttongroup.addButton(button)
         button.setCheckable(True)
         layout.addWidget(button)
+
+        button = QtWidgets.QPushButton("Auto overcuts")
+        button.clicked.connect(self.signal_autoovercuts)
+        layout.addWidget(button)
         layout.addStretch(1)
 
         layout.addWidget(QtWidgets.QLabel("Material Thickness"))
@@ -494,12 +783,19 @@ class MainWindow(QtWidgets.QMainWindow):
         self.setGeometry(0, 0, 1024, 1024)
         self.settings = settings
         self.filename = filename
+        self.job = libnanocnc.Job()
+        self.journal = None
+        self.autosaveTimer = QtCore.QTimer(self)
+        self.autosaveTimer.timeout.connect(self.compactJournal)
+        self.autosaveTimer.start(int(1000 * settings.get("autosave_compact_interval", 300)))
         self.graphicview = GraphicView()
         self.graphicview.signal_itemselect.connect(self.itemSelect)
         self.graphicview.signal_mousepos_changed.connect(self.viewMousePosition)
 
         self.commandwidget = CommandWidget(self.graphicview)
         self.commandwidget.signal_actionclicked.connect(self.updateAction)
+        self.commandwidget.signal_autotabs.connect(self.autoTabs)
+        self.commandwidget.signal_autoovercuts.connect(self.autoOvercuts)
         self.updateAction()
 
         self.toolWidget = ToolWidget(settings["tooltable"])
@@ -516,9 +812,27 @@ class MainWindow(QtWidgets.QMainWindow):
         self.fileMenu.addAction(self.exitAct)
         self.menuBar().addMenu(self.fileMenu)
 
+        self.undostack = QtWidgets.QUndoStack(self)
+        self.undoAct = self.undostack.createUndoAction(self, "&Undo")
+        self.undoAct.setShortcut(QtGui.QKeySequence.Undo)
+        self.redoAct = self.undostack.createRedoAction(self, "&Redo")
+        self.redoAct.setShortcut(QtGui.QKeySequence.Redo)
+        self.editMenu = QtWidgets.QMenu("&Edit", self)
+        self.editMenu.addAction(self.undoAct)
+        self.editMenu.addAction(self.redoAct)
+        self.menuBar().addMenu(self.editMenu)
+
+        self.previewAct = QtWidgets.QAction("&Preview Toolpath", self, shortcut="Ctrl+P", checkable=True, triggered=self.updatePreview)
+        self.viewMenu = QtWidgets.QMenu("&View", self)
+        self.viewMenu.addAction(self.previewAct)
+        self.menuBar().addMenu(self.viewMenu)
+        self.undostack.indexChanged.connect(self.updatePreview)
+
         self.mouseposLabel = QtWidgets.QLabel("----.-, ----.-")
         statusBar = self.statusBar()
         statusBar.addWidget(self.mouseposLabel)
+        self.durationLabel = QtWidgets.QLabel("")
+        statusBar.addPermanentWidget(self.durationLabel)
 
         dockWidget = QtWidgets.QDockWidget("Commands")
         dockWidget.setFeatures(QtWidgets.QDockWidget.DockWidgetMovable)
@@ -562,59 +876,49 @@ class MainWindow(QtWidgets.QMainWindow):
         tool = self.toolWidget.currenttool
         diameter = self.settings["tooltable"][tool]["Diameter"]
         if self.commandwidget.action == Attribute.NONE:
-            item._pathattr = Attribute.NONE
-            effect = QtWidgets.QGraphicsColorizeEffect()
-            effect.setColor(COLOR_NORMAL)
-            item.setGraphicsEffect(effect)
-            group = getattr(item, "_group", None)
-            if group is not None:
-                self.graphicview.deleteGroup(group)
-                item._group = None
-        elif self.commandwidget.action == Attribute.INNER:
+            self.undostack.push(PathCommand(self.graphicview, item, Attribute.NONE, log=self.journalRecord))
+        elif self.commandwidget.action in [Attribute.INNER, Attribute.OUTER]:
             if item._pathattr == Attribute.NONE:
-                print("INNER")
-                print(item._pid)
-                group = self.graphicview.drawPolygon(item._polygon.expand(diameter / 2), pathattr=Attribute.CUTPATH)
-                self.graphicview.drawMarkerList(group._polygon, group._pid)
-                item._group = group
-                item._pathattr = Attribute.INNER
-                item._tool = tool
+                logger.debug("%s %s", self.commandwidget.action.name, item._pid)
+                distance = diameter / 2 if self.commandwidget.action == Attribute.INNER else -diameter / 2
+                group = self.graphicview.drawPolygon(item._polygon.expand(distance), pathattr=Attribute.CUTPATH)
+                group._markers = self.graphicview.drawMarkerList(group._polygon, group._pid)
                 group._parent = item._pid
                 group._tool = tool
-        elif self.commandwidget.action == Attribute.OUTER:
+                self.undostack.push(PathCommand(self.graphicview, item, self.commandwidget.action, tool, group, log=self.journalRecord))
+        elif self.commandwidget.action == Attribute.POCKET:
             if item._pathattr == Attribute.NONE:
-                print("OUTER")
-                print(item._pid)
-                group = self.graphicview.drawPolygon(item._polygon.expand(-diameter / 2), pathattr=Attribute.CUTPATH)
-                self.graphicview.drawMarkerList(group._polygon, group._pid)
-                item._group = group
-                item._pathattr = Attribute.OUTER
-                item._tool = tool
+                logger.debug("POCKET %s", item._pid)
+                # the first ring of the pocket is shown as its cut path
+                group = self.graphicview.drawPolygon(item._polygon.expand(diameter / 2), pathattr=Attribute.CUTPATH)
+                group._markers = []
                 group._parent = item._pid
                 group._tool = tool
+                group._operation = "pocket"
+                group._islands = self.graphicview.islands(item)
+                self.undostack.push(PathCommand(self.graphicview, item, Attribute.POCKET, tool, group, log=self.journalRecord))
         elif self.commandwidget.action == Attribute.DISABLE:
             if item._pathattr == Attribute.NONE:
-                print("DISABLE")
-                effect = QtWidgets.QGraphicsColorizeEffect()
-                effect.setColor(COLOR_DISABLE)
-                item.setGraphicsEffect(effect)
-                item._pathattr = Attribute.DISABLE
+                logger.debug("DISABLE %s", item._pid)
+                self.undostack.push(PathCommand(self.graphicview, item, Attribute.DISABLE, log=self.journalRecord))
         elif self.commandwidget.action == Attribute.CUTPATH:
             pass
         elif self.commandwidget.action == Attribute.ADD_TAB:
-            print("ADD_TAB")
+            logger.debug("ADD_TAB")
             width = self.commandwidget.wgTabWidth.value()
             height = self.commandwidget.wgTabHeight.value()
             tabitem = self.graphicview.addTab(item, xpos, ypos, width, height, parentrefid=getattr(item, "_parent", None))
+            if tabitem is not None:
+                self.undostack.push(TabCommand(self.graphicview, tabitem, add=True, log=self.journalRecord))
         elif self.commandwidget.action == Attribute.REMOVE_TAB:
-            print("REMOVE_TAB")
-            self.graphicview.removeTab(item)
+            logger.debug("REMOVE_TAB")
+            self.undostack.push(TabCommand(self.graphicview, item, add=False, log=self.journalRecord))
         elif self.commandwidget.action == Attribute.ADD_OVERCUT:
-            print("ADD_OVERCUT")
-            self.graphicview.addOverCut(item)
+            logger.debug("ADD_OVERCUT %s", item._id)
+            self.undostack.push(OverCutCommand(self.graphicview, item, add=True, log=self.journalRecord))
         elif self.commandwidget.action == Attribute.REMOVE_OVERCUT:
-            print("REMOVE_OVERCUT")
-            self.graphicview.removeOverCut(item)
+            logger.debug("REMOVE_OVERCUT %s", item._id)
+            self.undostack.push(OverCutCommand(self.graphicview, item, add=False, log=self.journalRecord))
         else:
             raise AttributeError(self.commandwidget.action)
 
@@ -625,21 +929,78 @@ class MainWindow(QtWidgets.QMainWindow):
             jsonobj = self.get_as_dict()
             for path in jsonobj["pathlist"]:
                 path.pop("polygon")
-            pprint.pprint(jsonobj)
+            logger.debug("%s", pprint.pformat(jsonobj))
+            if libnanocnc.tracer.enabled:
+                logger.debug("%s", libnanocnc.tracer.format())
         else:
             self.graphicview.setAction(self.commandwidget.action)
 
+    def autoTabs(self):
+        width = self.commandwidget.wgTabWidth.value()
+        height = self.commandwidget.wgTabHeight.value()
+        count = self.commandwidget.wgTabCount.value()
+        tablist = libnanocnc.auto_tabs(self.get_as_dict(), width, height, count=count)
+        self.undostack.beginMacro("Auto tabs")
+        for tab in tablist:
+            item = self.graphicview.drawTab(tab["refid"], tab["pos"][0], tab["pos"][1], tab["width"], tab["height"], tab["parentid"], tab["linepoints"])
+            self.undostack.push(TabCommand(self.graphicview, item, add=True, log=self.journalRecord))
+        self.undostack.endMacro()
+        self.graphicview.update()
+
+    def autoOvercuts(self):
+        overcutlist = libnanocnc.auto_overcuts(self.get_as_dict())
+        cornerdict = {item._id: item for item in self.graphicview.scene().items() if getattr(item, "_pathattr", None) == Attribute.CORNER}
+        self.undostack.beginMacro("Auto overcuts")
+        for overcut in overcutlist:
+            item = cornerdict.get(overcut["id"])
+            if item is None:
+                item = self.graphicview.drawMarker(*overcut["pos"], parentid=overcut["parentid"])
+            self.undostack.push(OverCutCommand(self.graphicview, item, add=True, log=self.journalRecord))
+        self.undostack.endMacro()
+        self.graphicview.update()
+
     def loadSvgFile(self, filename):
-        polygonlist = libnanocnc.svg2polygon(filename)
+        with libnanocnc.profiler.span("load_svg"):
+            polygonlist = libnanocnc.svg2polygon(filename, tolerance=self.settings.get("tolerance"))
+            self.drawPolygonList(polygonlist)
+            self.startAutosave(filename)
+
+    def loadDxfFile(self, filename):
+        with libnanocnc.profiler.span("load_dxf"):
+            polygonlist = libnanocnc.dxf2polygon(filename, flatness=self.settings.get("flatness", 0.01), tolerance=self.settings.get("tolerance"))
+            self.drawPolygonList(polygonlist)
+            self.startAutosave(filename)
+
+    def drawPolygonList(self, polygonlist):
         jsonobj = dict(settings={}, tablist=[], overcutlist=[], cornerlist=[], toollist=[])
         jsonobj["pathlist"] = [dict(id=index, parentid=None, pathattr=Attribute.NONE, tool=None, polygon=polygon.asdict()) for index, polygon in enumerate(polygonlist)]
-        self.graphicview.drawJson(jsonobj, clear=True)
+        with libnanocnc.profiler.span("draw"):
+            self.graphicview.drawJson(jsonobj, clear=True)
 
     def loadJsonFile(self, filename):
-        with open(filename) as fh:
-            jsonobj = json.load(fh)
-        self.graphicview.drawJson(jsonobj, clear=True)
-        self.toolWidget.init(jsonobj["toollist"])
+        with libnanocnc.profiler.span("load_json"):
+            with libnanocnc.profiler.span("parse"):
+                with open(filename) as fh:
+                    jsonobj = json.load(fh)
+            records = journal.Journal.read(filename)
+            recovered = False
+            if records:
+                answer = QtWidgets.QMessageBox.question(
+                    self, "Recover", f"{filename} has {len(records)} unsaved edits. Recover them?\n"
+                    f"Otherwise they are kept in {filename}.journal.bak and not applied.")
+                recovered = answer == QtWidgets.QMessageBox.Yes
+                if recovered:
+                    with libnanocnc.profiler.span("recover"):
+                        journal.apply_journal(jsonobj, records)
+            self.startJournal(filename)
+            if recovered:
+                self.journal.compact(jsonobj)
+            elif records:
+                # new edits must not be replayed after the rejected ones
+                os.replace(self.journal.journalname, self.journal.journalname + ".bak")
+            with libnanocnc.profiler.span("draw"):
+                self.graphicview.drawJson(jsonobj, clear=True)
+            self.toolWidget.init(jsonobj["toollist"])
 
     def save(self, _, filename=None):
         """
@@ -682,69 +1043,159 @@ class MainWindow(QtWidgets.QMainWindow):
         """
         if filename is None:
             proposedname = str(pathlib.Path(self.filename).with_suffix(".json"))
-            print(proposedname)
             filename = QtWidgets.QFileDialog.getSaveFileName(self, "Save to", proposedname, "JSON (*.json);; All files (*.*")[0]
         if filename == "":
             return
         self._last_folder = str(pathlib.Path(filename).parent)
-        json.dump(self.get_as_dict(), open(filename, "w"), indent=4)
+        with libnanocnc.profiler.span("save"):
+            with libnanocnc.profiler.span("collect"):
+                dictobj = self.get_as_dict()
+            with libnanocnc.profiler.span("serialize"):
+                self.startJournal(filename)
+                self.journal.compact(dictobj)
+
+    def startJournal(self, filename):
+        """Journal all following edits for autosave to filename."""
+        if self.journal is not None:
+            self.journal.close()
+        self.journal = journal.Journal(filename, interval=self.settings.get("autosave_interval", 2.0))
+
+    def startAutosave(self, filename):
+        """Journal the edits of an imported file to a new JSON file in the temporary folder."""
+        fd, autosavename = tempfile.mkstemp(prefix=pathlib.Path(filename).stem + ".", suffix=".json")
+        os.close(fd)
+        self.startJournal(autosavename)
+        self.journal.compact(self.get_as_dict())
+        logger.info("autosave of %s to %s", filename, autosavename)
+        self.statusBar().showMessage(f"Autosave to {autosavename}")
+
+    def journalRecord(self, record):
+        if self.journal is None:
+            return
+        self.journal.append(record)
+        if self.journal.count >= self.settings.get("autosave_records", 500):
+            self.compactJournal()
+
+    def compactJournal(self):
+        if self.journal is not None and self.journal.count > 0:
+            with libnanocnc.profiler.span("autosave"):
+                self.journal.compact(self.get_as_dict())
+
+    def closeEvent(self, event):
+        if self.journal is not None:
+            self.journal.close()
+        super().closeEvent(event)
 
     def get_as_dict(self):
-        itemlist = [item for item in self.graphicview.scene().items() if isinstance(item, QtWidgets.QGraphicsItemGroup)]
-        pathlist = [dict(id=item._pid, parentid=getattr(item, "_parent", None), pathattr=item._pathattr.value, polygon=item._polygon.asdict(), tool=item._tool) for item in itemlist]
+        itemlist = [item for item in self.graphicview.scene().items() if getattr(item, "_ispath", False)]
+        pathlist = [pathdict(item) for item in itemlist]
 
         itemlist = [item for item in self.graphicview.scene().items() if isinstance(item, QtWidgets.QGraphicsEllipseItem) and getattr(item, "_pathattr", None) == Attribute.TAB]
-        tablist = [dict(refid=item._refid, parentid=item._parentrefid, pos=item._pos, width=item._tabwidth, height=item._tabheight, linepoints=item._linepoints) for item in itemlist]
+        tablist = [tabdict(item) for item in itemlist]
 
         itemlist = [item for item in self.graphicview.scene().items() if isinstance(item, QtWidgets.QGraphicsEllipseItem) and getattr(item, "_pathattr", None) == Attribute.OVERCUT]
-        overcutlist = [dict(id=item._id, parentid=item._parentrefid, pos=item._pos) for item in itemlist]
+        overcutlist = [markerdict(item) for item in itemlist]
 
         itemlist = [item for item in self.graphicview.scene().items() if isinstance(item, QtWidgets.QGraphicsEllipseItem) and getattr(item, "_pathattr", None) == Attribute.CORNER]
-        cornerlist = [dict(id=item._id, parentid=item._parentrefid, pos=item._pos) for item in itemlist]
+        cornerlist = [markerdict(item) for item in itemlist]
 
         settings = dict(savez=self.commandwidget.wgSaveZ.value(), materialthickness=self.commandwidget.wgMaterialThickness.value())
+        if self.settings.get("commonline"):
+            # cut edges shared by adjacent cut paths once
+            settings["commonline"] = self.settings["commonline"]
 
         return dict(settings=settings, pathlist=pathlist, tablist=tablist, overcutlist=overcutlist, cornerlist=cornerlist, toollist=self.settings["tooltable"])
 
-    def save_gcode(self):
-        dictobj = self.get_as_dict()
+    def save_gcode(self, _=None, filename=None):
+        with libnanocnc.profiler.span("collect"):
+            dictobj = self.get_as_dict()
+        # with split_programs one program per tool is saved to <name>.T<tool index>.nc
+        split = self.settings.get("split_programs", False)
         try:
-            libnanocnc.make_gcode(dictobj)
+            programs = self.job.make_gcode(dictobj, split=True) if split else [(None, self.job.make_gcode(dictobj))]
         except Exception as e:
-            print(traceback.format_exc())
+            logger.exception("Error processing file")
             QtWidgets.QMessageBox.critical(self, "Error processing file", traceback.format_exc())
             return
+        logger.debug("save_gcode: %d of %d paths processed", self.job.processed, len(self.job.cache))
+        if filename is None:
+            proposedname = str(pathlib.Path(self.filename or "noname").with_suffix(".nc"))
+            filename = QtWidgets.QFileDialog.getSaveFileName(self, "Save G-code to", proposedname, "G-code (*.nc *.gcode);; All files (*.*)")[0]
+        if filename == "":
+            return
+        filenames, size, optimizedsize, count, seconds = [], 0, 0, 0, 0
+        for index, lines in programs:
+            path = pathlib.Path(filename)
+            name = filename if index is None else str(path.with_name("{}.T{}{}".format(path.stem, index, path.suffix)))
+            optimized = libnanocnc.optimize_gcode(lines, self.settings.get("precision", 4), self.settings.get("merge_tolerance", 0.001))
+            with open(name, "w") as fh:
+                fh.write("\n".join(optimized) + "\n")
+            seconds += libnanocnc.estimate_time(optimized, self.settings) if optimized else 0
+            size += sum(len(line) + 1 for line in lines)
+            optimizedsize += sum(len(line) + 1 for line in optimized)
+            count += len(optimized)
+            filenames.append(name)
+        reduction = 1 - optimizedsize / max(1, size)
+        self.statusBar().showMessage("{} saved, {} lines ({:.0%} smaller), estimated time {}".format(", ".join(filenames), count, reduction, formatDuration(seconds)))
+
+    def updatePreview(self, _=None):
+        if not self.previewAct.isChecked():
+            self.graphicview.showToolpath(None)
+            self.durationLabel.setText("")
+            return
+        with libnanocnc.profiler.span("preview"):
+            try:
+                lines = self.job.make_gcode(self.get_as_dict())
+                toolpath = libnanocnc.parse_gcode(lines) if lines else None
+            except Exception:
+                logger.exception("Error processing file")
+                QtWidgets.QMessageBox.critical(self, "Error processing file", traceback.format_exc())
+                self.previewAct.setChecked(False)
+                return
+            self.graphicview.showToolpath(toolpath)
+        if toolpath is None:
+            self.durationLabel.setText("")
+            return
+        seconds = toolpath.duration(**libnanocnc.machine(self.settings))
+        self.durationLabel.setText("estimated time {}".format(formatDuration(seconds)))
 
     def open(self, _, filename=None):
-        print(filename)
+        logger.debug("open %s", filename)
         if filename is None:
-            filename = QtWidgets.QFileDialog.getOpenFileName(self, "Open File", self._last_folder, "*.svg;; *.json")[0]
+            filename = QtWidgets.QFileDialog.getOpenFileName(self, "Open File", self._last_folder, "*.svg;; *.dxf;; *.json")[0]
         if filename:
-            suffix = pathlib.Path(filename).suffix
+            suffix = pathlib.Path(filename).suffix.lower()
             try:
                 if suffix == ".svg":
                     self.loadSvgFile(filename)
+                elif suffix == ".dxf":
+                    self.loadDxfFile(filename)
                 elif suffix == ".json":
                     self.loadJsonFile(filename)
                 else:
                     raise ValueError(f"Don't know how to {filename}")
+                self.undostack.clear()
                 self._last_folder = str(pathlib.Path(filename).parent)
                 self.setWindowTitle(f"{PROGNAME} {filename}")
             except Exception:
-                print(traceback.format_exc())
+                logger.exception("Error opening file %s", filename)
                 QtWidgets.QMessageBox.critical(self, "Error opening file", traceback.format_exc())
                 return
 
 
+def formatDuration(seconds):
+    return "{}:{:02d}:{:02d}".format(int(seconds // 3600), int(seconds // 60 % 60), int(seconds % 60))
+
+
 def debug(itemlist):
     for item in itemlist:
-        print("{0}: _pathattr={1}, _refid={2}, _parentrefid={3}".format(item, getattr(item, "_pathattr", None), getattr(item, "_refid", None), getattr(item, "_parentrefid", None)))
+        logger.debug("%s: _pathattr=%s, _refid=%s, _parentrefid=%s", item, getattr(item, "_pathattr", None), getattr(item, "_refid", None), getattr(item, "_parentrefid", None))
 
 
 if __name__ == '__main__':
+    logging.basicConfig(level=os.environ.get("NANOCNC_LOGLEVEL", "WARNING"))
     settings = json.load(open("settings.json"))
     filename = None if len(sys.argv) < 2 else sys.argv[1]
-    print(filename)
     #filename = "/home/achim/Dokumente/cnc/kreispoly.svg"
     app = QtWidgets.QApplication([sys.argv[0]] + ["-style", "Fusion"] + sys.argv[1:])
     o = MainWindow(settings, filename)
@@ -0,0 +1,189 @@
+import collections
+import logging
+import os
+import queue
+import select
+import threading
+import time
+try:
+    from . import libnanocnc
+except ImportError:
+    # run as script from the nanocnc folder, see nanocnc.py
+    import libnanocnc
+
+
+logger = logging.getLogger(__name__)
+
+
+RX_BUFFER = 128    # default size of the serial receive buffer of the controller in bytes
+
+
+class Sender():
+    """Stream G-code to a GRBL compatible controller at a serial or pty device.
+
+    A background thread sends the lines queued by put() with character
+    counting flow control: lines are sent as long as the characters of all
+    lines not yet acknowledged by ok or error fit into the receive buffer of
+    the controller, so the planner of the controller is never starved by
+    waiting for the ok of every line. The queue is bounded, so put() blocks
+    when the generator runs ahead of the controller.
+    """
+    POLL = 0.01     # seconds to wait for the device or the queue at once
+
+    def __init__(self, device, baudrate=115200, rx_buffer=RX_BUFFER, queuesize=256, timeout=30.0):
+        self.device = str(device)
+        self.rx_buffer = rx_buffer
+        self.timeout = timeout
+        self.errors = []
+        self._fd = self._open(self.device, baudrate)
+        self._queue = queue.Queue(queuesize)
+        self._exception = None
+        self._lock = threading.Lock()
+        self._stats = dict(lines=0, bytes=0, acknowledged=0, occupancy=0, max_occupancy=0)
+        self._start = self._last = time.perf_counter()
+        self._integral = 0.0
+        self._thread = threading.Thread(target=self._run, name="sender", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _open(device, baudrate):
+        # termios exists on POSIX only
+        import termios
+        import tty
+        fd = os.open(device, os.O_RDWR | os.O_NOCTTY)
+        if os.isatty(fd):
+            tty.setraw(fd)
+            attributes = termios.tcgetattr(fd)
+            attributes[4] = attributes[5] = getattr(termios, "B{}".format(baudrate))
+            termios.tcsetattr(fd, termios.TCSANOW, attributes)
+            termios.tcflush(fd, termios.TCIOFLUSH)
+        return fd
+
+    def put(self, line):
+        """Queue line for sending, comments and blanks are removed and empty lines skipped."""
+        if self._exception is not None:
+            raise self._exception
+        line = libnanocnc._GCODE_COMMENT.sub("", line).replace(" ", "").strip()
+        if not line:
+            return
+        data = line.encode("ascii") + b"\n"
+        if len(data) > self.rx_buffer:
+            raise ValueError("G-code line {!r} exceeds the receive buffer of {} bytes".format(line, self.rx_buffer))
+        while True:
+            try:
+                self._queue.put(data, timeout=self.POLL)
+                return
+            except queue.Full:
+                if self._exception is not None:
+                    raise self._exception
+
+    def send(self, lines):
+        """Queue all lines of an iterable, e.g. a G-code generator, and wait until they are acknowledged.
+
+        Returns:
+            (dict) see status()
+        """
+        for line in lines:
+            self.put(line)
+        return self.finish()
+
+    def finish(self):
+        """Wait until all queued lines are acknowledged and close the device.
+
+        Returns:
+            (dict) see status()
+        """
+        while self._thread.is_alive():
+            try:
+                self._queue.put(None, timeout=self.POLL)
+                break
+            except queue.Full:
+                pass
+        self._thread.join()
+        os.close(self._fd)
+        if self._exception is not None:
+            raise self._exception
+        status = self.status()
+        libnanocnc.profiler.count("sender.lines", status["lines"])
+        libnanocnc.profiler.count("sender.bytes", status["bytes"])
+        logger.info("sent %d lines in %.1f s, %.0f bytes/s, mean buffer occupancy %.0f of %d bytes",
+                    status["lines"], status["seconds"], status["bytes_per_second"], status["mean_occupancy"], self.rx_buffer)
+        return status
+
+    def status(self):
+        """Return the progress of sending.
+
+        Returns:
+            (dict) with lines and bytes sent, acknowledged lines, number of errors,
+            current, maximum and time averaged mean occupancy of the receive buffer
+            in bytes, seconds since start, bytes and lines per second
+        """
+        with self._lock:
+            now = time.perf_counter()
+            status = dict(self._stats, errors=len(self.errors), seconds=now - self._start)
+            integral = self._integral + self._stats["occupancy"] * (now - self._last)
+        seconds = max(status["seconds"], 1E-9)
+        status.update(mean_occupancy=integral / seconds, bytes_per_second=status["bytes"] / seconds, lines_per_second=status["lines"] / seconds)
+        return status
+
+    def _occupy(self, size):
+        with self._lock:
+            now = time.perf_counter()
+            self._integral += self._stats["occupancy"] * (now - self._last)
+            self._last = now
+            self._stats["occupancy"] += size
+            self._stats["max_occupancy"] = max(self._stats["max_occupancy"], self._stats["occupancy"])
+            if size > 0:
+                self._stats["lines"] += 1
+                self._stats["bytes"] += size
+            else:
+                self._stats["acknowledged"] += 1
+
+    def _run(self):
+        pending = collections.deque()   # sent lines not yet acknowledged
+        received = b""
+        data, done = None, False
+        lastresponse = time.perf_counter()
+        try:
+            while True:
+                if data is None and not done:
+                    try:
+                        data = self._queue.get_nowait() if pending else self._queue.get(timeout=self.POLL)
+                    except queue.Empty:
+                        pass
+                    else:
+                        done = data is None
+                if data is not None and self._stats["occupancy"] + len(data) <= self.rx_buffer:
+                    view = memoryview(data)
+                    while view:
+                        view = view[os.write(self._fd, view):]
+                    if not pending:
+                        lastresponse = time.perf_counter()
+                    pending.append(data)
+                    self._occupy(len(data))
+                    data = None
+                    continue
+                if done and not pending:
+                    return
+                if not pending:
+                    continue
+                if select.select([self._fd], [], [], self.POLL)[0]:
+                    received += os.read(self._fd, 4096)
+                    lastresponse = time.perf_counter()
+                elif time.perf_counter() - lastresponse > self.timeout:
+                    raise TimeoutError("no response from {} for {} s".format(self.device, self.timeout))
+                *responses, received = received.split(b"\n")
+                for response in responses:
+                    response = response.strip().decode("ascii", "replace")
+                    if response == "ok" or response.startswith("error"):
+                        line = pending.popleft()
+                        self._occupy(-len(line))
+                        if response != "ok":
+                            logger.error("%s: %s", line.decode("ascii").strip(), response)
+                            self.errors.append((line.decode("ascii").strip(), response))
+                    elif response.startswith("ALARM"):
+                        raise RuntimeError("{} reported {}".format(self.device, response))
+                    elif response:
+                        logger.info("%s: %s", self.device, response)
+        except Exception as exception:
+            self._exception = exception
@@ -1,7 +1,16 @@
+import copy
+import functools
+import json
 import logging
+import os
+import threading
+import time
+import numpy as np
 import pytest
 from nanocnc import libnanocnc
+from nanocnc.journal import Journal, apply_journal
 from nanocnc.libnanocnc import Point
+from nanocnc.sender import RX_BUFFER, Sender
 
 ##libnanocnc.logger.setLevel(logging.DEBUG)
 
@@ -163,3 +172,639 @@ class Test():
         expected = tab["expected"]
         assert obtained == expected
 
+    def test_resolve_tabs(self):
+        tablist = [
+            dict(pos=[20, 20], width=4.0, linepoints=[10, 20, 100, 20]),
+            dict(pos=[9, 20], width=4.0, linepoints=[10, 20, 100, 20]),
+            dict(pos=[10, 201], width=4.0, linepoints=[10, 20, 10, 200]),
+            dict(pos=[49, 49], width=4.0, linepoints=[150, 150, 50, 50]),
+        ]
+        resolution = libnanocnc.resolve_tabs(tablist)
+        assert resolution.inside.tolist() == [[True, True], [False, True], [True, False], [False, True]]
+        assert resolution.aligned.all()
+        assert resolution.fits.all()
+
+    def test_resolve_tabs_not_aligned(self):
+        tab = dict(pos=[20, 20.5], width=4.0, linepoints=[10, 20, 100, 20])
+        resolution = libnanocnc.resolve_tabs([tab])
+        assert resolution.aligned.tolist() == [False]
+        assert resolution.inside.tolist() == [[False, False]]
+        resolution = libnanocnc.resolve_tabs([tab], tolerance=1)
+        assert resolution.valid.tolist() == [True]
+        assert resolution.t[0].tolist() == pytest.approx([8 / 90, 12 / 90])
+
+    @pytest.mark.parametrize("method", ["douglas-peucker", "visvalingam"])
+    def test_simplify(self, method):
+        # square with collinear points and near duplicates on every edge
+        t = [0, 0.25, 0.5, 0.5000001, 0.75]
+        xlist = [10 * v for v in t] + [10] * 5 + [10 - 10 * v for v in t] + [0] * 5 + [0]
+        ylist = [0] * 5 + [10 * v for v in t] + [10] * 5 + [10 - 10 * v for v in t] + [0]
+        polygon = libnanocnc.Polygon(xlist, ylist).simplify(0.01, method)
+        assert polygon.xlist == [0, 10, 10, 0, 0]
+        assert polygon.ylist == [0, 0, 10, 10, 0]
+
+    def test_simplify_keeps_deviation(self):
+        xlist, ylist = [0, 5, 10], [0, 1, 0]
+        xarr, yarr = libnanocnc.simplify(xlist, ylist, 0.5)
+        assert xarr.tolist() == xlist
+        xarr, yarr = libnanocnc.simplify(xlist, ylist, 2)
+        assert xarr.tolist() == [0, 10]
+
+    @pytest.mark.parametrize("method", ["douglas-peucker", "visvalingam"])
+    def test_simplify_hausdorff(self, method):
+        rng = np.random.default_rng(1)
+        for _ in range(20):
+            xy = np.cumsum(rng.normal(scale=0.01, size=(200, 2)), axis=0)
+            xarr, yarr = libnanocnc.simplify(xy[:, 0], xy[:, 1], 0.01, method)
+            simplified = np.column_stack((xarr, yarr))
+            assert len(simplified) < len(xy)
+            # the simplified points are points of the polyline, so the Hausdorff distance
+            # is the largest distance of a point of the polyline to the simplified polyline
+            distance = np.min([libnanocnc._segment_distance(xy, a, b) for a, b in zip(simplified[:-1], simplified[1:])], axis=0)
+            assert distance.max() <= 0.01
+
+    def test_polygon_properties(self):
+        polygon = libnanocnc.Polygon([0, 0, 20, 20, 0], [0, 10, 10, 0, 0])
+        assert polygon.signed_area == -200 and polygon.orientation == -1
+        assert polygon.bbox == (0, 0, 20, 10) and polygon.perimeter == 60
+        assert polygon.cumulative_length.tolist() == [0, 10, 30, 40, 60]
+        assert polygon.orient(1) is polygon
+        assert polygon.xlist == [0, 20, 20, 0, 0] and polygon.signed_area == 200
+        assert polygon.cumulative_length.tolist() == [0, 20, 30, 50, 60]
+        # assigning the points forgets the cached properties, changes in place need invalidate()
+        polygon.xlist = [2 * x for x in polygon.xlist]
+        assert polygon.signed_area == 400 and polygon.bbox == (0, 0, 40, 10)
+        polygon.ylist[2] = polygon.ylist[3] = 20
+        assert polygon.signed_area == 400
+        polygon.invalidate()
+        assert polygon.signed_area == 800
+
+    def test_process_tabs_multiple_segments(self):
+        # square 10 x 10 with tab around corner (10, 0) and tab wrapping around the first point
+        xlist, ylist = [0, 10, 10, 0, 0], [0, 0, 10, 10, 0]
+        path = dict(id=1, polygonpoints=[Point(x, y) for x, y in zip(xlist, ylist)])
+        tablist = [
+            dict(refid=1, pos=[9, 0], width=4.0, height=2.0),
+            dict(refid=1, pos=[0, 1], width=4.0, height=3.0),
+        ]
+        libnanocnc.process_tabs(dict(pathlist=[path], tablist=tablist))
+        obtained = [(p.x, p.y, p.tabheight) for p in path["polygonpoints"]]
+        assert obtained == [
+            (0, 0, 3.0), (1, 0, 3.0), (7, 0, 0), (10, 0, 2.0), (10, 1, 2.0),
+            (10, 10, 0), (0, 10, 0), (0, 3, 0), (0, 0, 3.0)
+        ]
+
+    def test_process_tabs_off_path(self, caplog):
+        xlist, ylist = [0, 10, 10, 0, 0], [0, 0, 10, 10, 0]
+        path = dict(id=1, polygonpoints=[Point(x, y) for x, y in zip(xlist, ylist)])
+        tablist = [dict(refid=1, pos=[5, 0.0005], width=2.0, height=2.0), dict(refid=1, pos=[5, 12], width=2.0, height=2.0)]
+        libnanocnc.process_tabs(dict(pathlist=[path], tablist=tablist))
+        assert [(p.x, p.y) for p in path["polygonpoints"] if p.tabheight] == [(6, 0)]
+        assert "tab at [5, 12] is not on its path 1, skipped" in caplog.text
+
+    def test_process_tabs_flattened_curve(self):
+        # tab on a circle with many tiny segments
+        t = np.linspace(0, 2 * np.pi, 1001)
+        xlist, ylist = 100 * np.cos(t), 100 * np.sin(t)
+        path = dict(id=1, polygonpoints=[Point(x, y) for x, y in zip(xlist.tolist(), ylist.tolist())])
+        tablist = [dict(refid=1, pos=[0, 100], width=10.0, height=2.0)]
+        libnanocnc.process_tabs(dict(pathlist=[path], tablist=tablist))
+        assert len(path["polygonpoints"]) == 1003
+        xarr = np.array([p.x for p in path["polygonpoints"]])
+        yarr = np.array([p.y for p in path["polygonpoints"]])
+        cumlength = libnanocnc.cumulative_length(xarr, yarr)
+        istab = np.array([p.tabheight != 0 for p in path["polygonpoints"]])
+        assert np.diff(cumlength)[istab[1:]].sum() == pytest.approx(10.0)
+
+    def test_auto_tabs(self):
+        pathlist = [
+            dict(id=0, parentid=None, polygon=dict(xlist=[0, 100, 100, 0, 0], ylist=[0, 0, 50, 50, 0])),
+            dict(id=1, parentid=0, polygon=dict(xlist=[0, 100, 100, 0, 0], ylist=[0, 0, 50, 50, 0])),
+            dict(id=2, parentid=0, polygon=dict(xlist=[0, 10, 10, 0, 0], ylist=[0, 0, 10, 10, 0])),
+            dict(id=3, parentid=0, polygon=dict(xlist=[0, 100], ylist=[0, 0])),
+        ]
+        dictobj = dict(pathlist=pathlist, tablist=[dict(refid=3, pos=[50, 0])])
+        tablist = libnanocnc.auto_tabs(dictobj, 4.0, 2.0, count=3)
+        # tabs are moved away from corners, no tabs on short edges and paths with tabs
+        assert [(tab["refid"], tab["pos"]) for tab in tablist] == [(1, [50, 0]), (1, [94, 50]), (1, [0, 44])]
+        assert tablist[1]["linepoints"] == [100, 50, 0, 50]
+        assert len(dictobj["tablist"]) == 4
+
+    def test_auto_overcuts(self):
+        pathlist = [
+            # L shaped part with outer cut
+            dict(id=0, parentid=None, polygon=dict(xlist=[0, 20, 20, 10, 10, 0, 0], ylist=[0, 0, 10, 10, 20, 20, 0])),
+            dict(id=1, parentid=0, polygon=dict(xlist=[-1, 21, 21, 11, 11, -1, -1], ylist=[-1, -1, 11, 11, 21, 21, -1])),
+            # square hole with inner cut in reverse orientation
+            dict(id=2, parentid=None, polygon=dict(xlist=[0, 0, 10, 10, 0], ylist=[0, 10, 10, 0, 0])),
+            dict(id=3, parentid=2, polygon=dict(xlist=[1, 1, 9, 9, 1], ylist=[1, 9, 9, 1, 1])),
+        ]
+        cornerlist = [dict(id=7, parentid=1, pos=[11, 11]), dict(id=8, parentid=1, pos=[21, 11])]
+        overcutlist = [dict(id=9, parentid=3, pos=[9, 9])]
+        dictobj = dict(pathlist=pathlist, cornerlist=cornerlist, overcutlist=overcutlist)
+        obtained = libnanocnc.auto_overcuts(dictobj)
+        assert obtained == [
+            dict(id=7, parentid=1, pos=[11, 11]),
+            dict(id=10, parentid=3, pos=[1, 1]),
+            dict(id=11, parentid=3, pos=[1, 9]),
+            dict(id=12, parentid=3, pos=[9, 1]),
+        ]
+        assert dictobj["cornerlist"] == [dict(id=8, parentid=1, pos=[21, 11])]
+        assert len(dictobj["overcutlist"]) == 5
+        # pockets are cleared without overcuts, their corners are kept
+        pathlist[3]["operation"] = "pocket"
+        dictobj = dict(pathlist=pathlist, cornerlist=[dict(id=1, parentid=3, pos=[1, 1])], overcutlist=[])
+        assert libnanocnc.auto_overcuts(dictobj) == [dict(id=2, parentid=1, pos=[11, 11])]
+        assert dictobj["cornerlist"] == [dict(id=1, parentid=3, pos=[1, 1])]
+
+    def test_process_overcuts(self):
+        part = libnanocnc.Polygon([1000, 1010, 1010, 1000, 1000], [0, 0, 10, 10, 0])
+        cut = part.expand(1)
+        pathlist = [dict(id=0, parentid=None, polygon=part.asdict()), dict(id=1, parentid=0, tool=0, polygon=cut.asdict())]
+        # corners are matched on the 1 um grid independent of the distance to the origin
+        overcutlist = [dict(id=5, parentid=1, pos=[1001, 9]), dict(id=6, parentid=1, pos=[1009.0000004, 9])]
+        dictobj = dict(pathlist=pathlist, tablist=[], overcutlist=overcutlist, toollist=[dict(Diameter=2 * np.sqrt(2))])
+        libnanocnc.process_paths(dictobj)
+        obtained = [(p.x, p.y, p.tabwidth) for p in pathlist[1]["polygonpoints"]]
+        assert obtained == pytest.approx([
+            (1009, 1, 0), (1009, 9, 10), (1010, 10, 10), (1009, 9, 0), (1001, 9, 10), (1000, 10, 10), (1001, 9, 0), (1001, 1, 0), (1009, 1, 0)
+        ])
+        dictobj["overcutlist"] = [dict(id=7, parentid=1, pos=[1009.5, 9])]
+        with pytest.raises(ValueError):
+            libnanocnc.process_paths(dictobj)
+        # the parent path has a vertex more than the cut path, its corner is found by position
+        pathlist = [dict(id=0, parentid=None, polygon=dict(xlist=[0, 5, 10, 10, 0, 0], ylist=[0, 0, 0, 10, 10, 0])),
+                    dict(id=1, parentid=0, tool=0, polygon=dict(xlist=[9, 9, 1, 1, 9], ylist=[1, 9, 9, 1, 1]))]
+        dictobj = dict(pathlist=pathlist, tablist=[], overcutlist=[dict(id=5, parentid=1, pos=[9, 9])], toollist=[dict(Diameter=2 * np.sqrt(2))])
+        libnanocnc.process_paths(dictobj)
+        obtained = [(p.x, p.y) for p in pathlist[1]["polygonpoints"]]
+        assert obtained == pytest.approx([(9, 1), (9, 9), (10, 10), (9, 9), (1, 9), (1, 1), (9, 1)])
+
+    def test_grid(self):
+        assert libnanocnc.gridkey(1000.0000004, -0.0006) == libnanocnc.gridkey(1000, -0.001) == (1000000, -1)
+        assert libnanocnc.to_grid([[0.0014, 2.5]]).tolist() == [[1, 2500]]
+        # points at the same grid position are removed, the closing point is kept
+        polygon = libnanocnc.Polygon([0, 0.0002, 10, 10, 0.0003, 0], [0, 0, 0, 10, 0.0001, 0])
+        assert polygon.xlist == [0, 10, 10, 0] and polygon.ylist == [0, 0, 10, 0]
+        assert polygon.gridxy.tolist() == [[0, 0], [10000, 0], [10000, 10000], [0, 0]]
+        assert libnanocnc.Polygon.fromarray(np.column_stack((polygon.xlist, polygon.ylist))).xlist == polygon.xlist
+
+    def test_profiler(self):
+        profiler = libnanocnc.Profiler()
+        assert profiler.span("disabled") is profiler.span("other")
+        profiler.count("disabled")
+        assert profiler.report() == dict(spans={}, counters={})
+        profiler.enabled = True
+        with profiler.span("outer"):
+            with profiler.span("inner"):
+                profiler.count("vertices", 3)
+            with profiler.span("inner"):
+                profiler.count("vertices", 4)
+        report = profiler.report()
+        assert list(report["spans"]) == ["outer/inner", "outer"]
+        assert report["spans"]["outer/inner"]["calls"] == 2
+        assert report["counters"] == dict(vertices=7)
+
+    def test_tracer(self, monkeypatch):
+        tracer = libnanocnc.Tracer(size=2)
+        monkeypatch.setattr(libnanocnc, "tracer", tracer)
+        xlist, ylist = [0, 10, 10, 0, 0], [0, 0, 10, 10, 0]
+        path = dict(id=1, polygonpoints=[Point(x, y) for x, y in zip(xlist, ylist)])
+        tablist = [dict(refid=1, pos=[5, 0], width=2.0, height=2.0) for _ in range(3)]
+        libnanocnc.process_tabs(dict(pathlist=[path], tablist=tablist))
+        assert len(tracer.events) == 2
+        assert tracer.events[-1][1] == "tab"
+        assert tracer.events[-1][2] == dict(refid=1, pos=[5, 0], start=4.0, end=6.0)
+        tracer.enable(0)
+        assert tracer.enabled is False
+
+    @staticmethod
+    def dxf(entities, units=4):
+        pairs = ["0", "SECTION", "2", "HEADER", "9", "$INSUNITS", "70", str(units), "0", "ENDSEC", "0", "SECTION", "2", "ENTITIES"]
+        for entity in entities:
+            for code, value in entity:
+                pairs += [str(code), str(value)]
+        return "\n".join(pairs + ["0", "ENDSEC", "0", "EOF"]) + "\n"
+
+    def test_dxf2polygon(self, tmp_path, caplog):
+        def line(x1, y1, x2, y2):
+            return [(0, "LINE"), (8, "0"), (10, x1), (20, y1), (30, 0), (11, x2), (21, y2), (31, 0)]
+
+        entities = [
+            # square of lines in arbitrary order and direction
+            line(0, 0, 10, 0), line(10, 10, 10, 0), line(10, 10, 0, 10), line(0, 10, 0, 0),
+            [(0, "CIRCLE"), (10, 50), (20, 50), (40, 10)],
+            # rectangle with a half circle as right side
+            [(0, "LWPOLYLINE"), (90, 4), (70, 1), (10, 20), (20, 0), (10, 30), (20, 0), (42, 1), (10, 30), (20, 10), (10, 20), (20, 10)],
+            # half circle closed by a line
+            [(0, "ARC"), (10, 0), (20, 25), (40, 5), (50, 90), (51, 270)], line(0, 20, 0, 30),
+            [(0, "TEXT"), (1, "ignored")],
+        ]
+        filename = tmp_path / "parts.dxf"
+        filename.write_text(self.dxf(entities))
+        polygonlist = libnanocnc.dxf2polygon(filename, flatness=0.01)
+        areas = sorted(abs(libnanocnc.signed_area(np.array(p.xlist), np.array(p.ylist))) for p in polygonlist)
+        assert areas == pytest.approx([np.pi * 25 / 2, 100, 100 + np.pi * 25 / 2, np.pi * 100], rel=5E-3)
+        assert all((p.xlist[0], p.ylist[0]) == (p.xlist[-1], p.ylist[-1]) for p in polygonlist)
+        # the flattened circle deviates less than flatness
+        circle = [p for p in polygonlist if max(p.xlist) > 50][0]
+        radius = np.hypot(np.array(circle.xlist) - 50, np.array(circle.ylist) - 50)
+        assert radius.max() == pytest.approx(10) and radius.min() > 9.99
+        # inches are converted to mm, open contours are kept with a warning
+        filename.write_text(self.dxf([line(0, 0, 1, 0), line(1, 0, 1, 1)], units=1))
+        polygonlist = libnanocnc.dxf2polygon(filename)
+        assert polygonlist[0].xlist == pytest.approx([0, 25.4, 25.4]) and polygonlist[0].ylist == pytest.approx([0, 0, 25.4])
+        assert "open contour" in caplog.text
+
+    def test_join_contours(self, tmp_path, caplog):
+        # square of single lines with jittered end points and an open polyline
+        svg = """<svg xmlns="http://www.w3.org/2000/svg">
+            <path d="M 0 0 L 10 0"/><path d="M 10.0004 10 L 10 0.0003"/>
+            <path d="M 0 10 L 0 0.0002"/><path d="M 9.9996 10 L 0 10"/>
+            <path d="M 20 0 L 30 0 L 30 10"/>
+            <path d="M 50 0 L 60 0 L 60 10 Z"/>
+        </svg>"""
+        filename = tmp_path / "fragments.svg"
+        filename.write_text(svg)
+        polygonlist = libnanocnc.svg2polygon(filename)
+        assert len(polygonlist) == 3
+        square = polygonlist[0]
+        assert (square.xlist[0], square.ylist[0]) == (square.xlist[-1], square.ylist[-1])
+        assert abs(libnanocnc.signed_area(np.array(square.xlist), np.array(square.ylist))) == pytest.approx(100, rel=1E-3)
+        assert polygonlist[2].xlist == [50, 60, 60, 50]
+        assert "open contour from (20.000000, 0.000000) to (30.000000, 10.000000)" in caplog.text
+        # fragments are joined at their nearest end point only
+        pieces = [np.array([[0, 0], [1, 0]]), np.array([[1.0005, 0], [2, 0]]), np.array([[1.0001, 0], [1, 1]]), np.array([[1, 1], [0, 0]])]
+        contours = libnanocnc.join_contours(pieces, 0.001)
+        assert [closed for _, closed in contours] == [True, False]
+        assert contours[0][0].tolist() == [[0, 0], [1, 0], [1, 1], [0, 0]]
+
+    def test_remove_duplicates(self, tmp_path, caplog):
+        # square as path, as reversed copy with another start point and as duplicated single lines
+        svg = """<svg xmlns="http://www.w3.org/2000/svg">
+            <path d="M 0 0 L 10 0 L 10 10 L 0 10 Z"/><path d="M 10 10.0000001 L 10 0 L 0 0 L 0 10 Z"/>
+            <path d="M 0 0 L 10 0"/><path d="M 10 0 L 10 10"/><path d="M 10 10 L 0 10"/><path d="M 0 10 L 0 0"/>
+            <path d="M 0 0 L 10 0"/><path d="M 10 10 L 10 0"/>
+            <path d="M 0 0 L 10 0 L 10 10 Z"/>
+        </svg>"""
+        filename = tmp_path / "copies.svg"
+        filename.write_text(svg)
+        polygonlist = libnanocnc.svg2polygon(filename)
+        assert [len(polygon.xlist) for polygon in polygonlist] == [5, 4]
+        assert "removed 3 duplicate polylines" in caplog.text and "removed 1 duplicate polylines" in caplog.text
+        # open polylines are the same in both directions, but not with another start point
+        line = np.array([[0, 0], [1, 0], [1, 1]])
+        assert len(libnanocnc.remove_duplicates([line, line[::-1] + 1E-4, np.roll(line, 1, axis=0)])) == 2
+        assert len(libnanocnc.remove_duplicates([line, line[::-1], line + 0.1], resolution=0.5)) == 1
+        # copies closer than resolution on both sides of a grid cell boundary, a copy farther away is kept
+        square = np.array([[0, 0], [10, 0], [10, 10], [0, 10], [0, 0]], dtype=float)
+        copies = [square + 0.0004996, np.roll(square[:-1], 2, axis=0)[::-1] + 0.0005004, square + 0.003]
+        copies[1] = np.vstack((copies[1], copies[1][:1]))
+        assert [len(item) for item in libnanocnc.remove_duplicates(copies)] == [5, 5]
+        assert libnanocnc.remove_duplicates(copies)[1] is copies[2]
+
+    def test_dxf_chunks(self, tmp_path):
+        filename = tmp_path / "parts.dxf"
+        filename.write_text(self.dxf([[(0, "CIRCLE"), (10, index), (20, 0), (40, 1)] for index in range(50)]).replace("\n", "\r\n"))
+        with open(filename, "rb") as fh:
+            chunks = list(libnanocnc._dxf_chunks(fh, size=100))
+        # entities are never split between chunks
+        assert len(chunks) > 10 and all(codes[0] == 0 for codes, _, _ in chunks)
+        codes = np.concatenate([codes for codes, _, _ in chunks])
+        numbers = np.concatenate([numbers for _, numbers, _ in chunks])
+        assert len(codes) == 7 + 4 * 50 + 2
+        assert numbers[codes == 10].tolist() == list(range(50))
+        assert {value(0) for _, _, value in chunks} <= {b"SECTION", b"ENDSEC", b"CIRCLE", b"EOF"}
+
+    def test_dxf_units_in_chunks(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(libnanocnc, "_dxf_chunks", functools.partial(libnanocnc._dxf_chunks, size=64))
+        filename = tmp_path / "inch.dxf"
+        # $INSUNITS far behind the start of the header and behind other sections
+        text = self.dxf([[(0, "CIRCLE"), (10, index), (20, 0), (40, 0.25)] for index in range(20)], units=1)
+        variables = "".join(f"9\n$VAR{index}\n70\n0\n" for index in range(50))
+        filename.write_text(text.replace("0\nSECTION\n2\nHEADER\n", "0\nSECTION\n2\nHEADER\n" + variables, 1))
+        polygonlist = libnanocnc.dxf2polygon(filename)
+        assert len(polygonlist) == 20 and max(polygonlist[-1].xlist) == pytest.approx(19.25 * 25.4)
+        # a truncated header variable is ignored
+        filename.write_text("0\nSECTION\n2\nHEADER\n9\n$INSUNITS\n")
+        assert libnanocnc.dxf2polygon(filename) == []
+
+    def sheet(self, count=3):
+        pathlist, tablist, overcutlist = [], [], []
+        for index in range(count):
+            x0 = 20 * index
+            polygon = libnanocnc.Polygon([x0, x0 + 10, x0 + 10, x0, x0], [0, 0, 10, 10, 0])
+            cutpolygon = polygon.expand(-1)
+            if libnanocnc.signed_area(np.array(cutpolygon.xlist), np.array(cutpolygon.ylist)) < libnanocnc.signed_area(np.array(polygon.xlist), np.array(polygon.ylist)):
+                cutpolygon = polygon.expand(1)
+            pathlist.append(dict(id=2 * index, parentid=None, pathattr=3, tool=None, polygon=polygon.asdict()))
+            pathlist.append(dict(id=2 * index + 1, parentid=2 * index, pathattr=5, tool=0, polygon=cutpolygon.asdict()))
+            tablist.append(dict(refid=2 * index + 1, parentid=2 * index, pos=[x0 + 5, -1], width=2.0, height=3.0, linepoints=[]))
+        settings = dict(savez=10, materialthickness=5)
+        return dict(settings=settings, pathlist=pathlist, tablist=tablist, overcutlist=overcutlist, cornerlist=[], toollist=[dict(Diameter=2.0, Stepdown=2.5)])
+
+    def test_make_gcode(self):
+        lines = libnanocnc.make_gcode(self.sheet(1))
+        assert lines[:6] == ["M3 S12000", "G4 P3", "G0 Z10.0000", "G0 X11.0000 Y-1.0000", "G1 Z-2.5000 F500", "G1 X11.0000 Y11.0000 F1200"]
+        # first pass is lifted to the tab height of 3 on material thickness 5
+        assert lines[8:13] == ["G1 X4.0000 Y-1.0000 F1200", "G1 Z-2.0000 F500", "G1 X6.0000 Y-1.0000 F1200", "G1 Z-2.5000 F500", "G1 X11.0000 Y-1.0000 F1200"]
+        # second pass
+        assert lines[13:] == [
+            "G1 Z-5.0000 F500", "G1 X11.0000 Y11.0000 F1200", "G1 X-1.0000 Y11.0000 F1200", "G1 X-1.0000 Y-1.0000 F1200",
+            "G1 X4.0000 Y-1.0000 F1200", "G1 Z-2.0000 F500", "G1 X6.0000 Y-1.0000 F1200", "G1 Z-5.0000 F500", "G1 X11.0000 Y-1.0000 F1200",
+            "G0 Z10.0000", "M5"
+        ]
+
+    def test_parse_gcode(self):
+        toolpath = libnanocnc.parse_gcode(libnanocnc.make_gcode(self.sheet(1)))
+        assert toolpath.dwell == 3
+        assert len(toolpath.rapid) == len(toolpath.feed) == len(toolpath.x) - 1 == 21
+        assert (toolpath.x[2], toolpath.y[2], toolpath.z[2]) == (11, -1, 10)
+        assert toolpath.rapid.tolist() == [True, True] + [False] * 18 + [True]
+        # plunges at plunge rate, cuts at feed rate
+        assert toolpath.feed[2:8].tolist() == [500, 1200, 1200, 1200, 1200, 500]
+        # two passes with the tab lifted to z = -2
+        cuts = (~toolpath.rapid) & (np.diff(toolpath.z) == 0)
+        assert sorted(set(toolpath.z[1:][cuts].tolist())) == [-5, -2.5, -2]
+        toolpath = libnanocnc.parse_gcode(["%", "g1 x1 y2 (comment) f100", "G1X3Y-.5;comment"])
+        assert toolpath.x.tolist() == [0, 1, 3] and toolpath.y.tolist() == [0, 2, -0.5] and toolpath.feed.tolist() == [100, 100]
+        # dwell times are summed in seconds, P of other commands is ignored
+        toolpath = libnanocnc.parse_gcode(["G4 P0.5", "G1 X1 F60", "g4p2 (spindle)", "M3 S1000 P7"])
+        assert toolpath.dwell == 2.5 and toolpath.duration() == pytest.approx(1 + 2.5, abs=0.1)
+        with pytest.raises(ValueError):
+            libnanocnc.parse_gcode(["G2 X1 Y1 R1"])
+        with pytest.raises(ValueError):
+            libnanocnc.parse_gcode(["G1 X1", "2"])
+
+    def test_toolpath_times(self):
+        toolpath = libnanocnc.parse_gcode(["G1 X10 F600", "G0 X0", "G4 P2"])
+        # 10 mm at 10 mm/s, acceleration ramps add v / a
+        assert toolpath.times(rapid=1200, acceleration=100).tolist() == pytest.approx([1.1, 0.7])
+        assert toolpath.duration(rapid=1200, acceleration=100) == pytest.approx(3.8)
+        # never reaches full speed
+        assert toolpath.times(acceleration=1)[0] == pytest.approx(2 * np.sqrt(10))
+
+    def test_toolpath_junctions(self):
+        machine = dict(rapid=1200, acceleration=100)
+        single = libnanocnc.parse_gcode(["G1 X20 F600"]).duration(**machine)
+        # collinear moves do not slow down, however short they are
+        assert libnanocnc.parse_gcode(["G1 X10 F600", "G1 X20"]).duration(**machine) == pytest.approx(single)
+        assert libnanocnc.parse_gcode([f"G1 X{x / 10} F600" for x in range(1, 201)]).duration(**machine) == pytest.approx(single)
+        # corners are taken faster with a larger junction deviation
+        corner = ["G1 X10 F600", "G1 Y10"]
+        stop = libnanocnc.parse_gcode(corner).duration(**machine, junction_deviation=0)
+        assert stop == pytest.approx(2 * 1.1)
+        assert libnanocnc.parse_gcode(corner).duration(**machine, junction_deviation=0.05) < libnanocnc.parse_gcode(corner).duration(**machine) < stop
+        # plunges with a slower Z axis
+        plunge = libnanocnc.parse_gcode(["G1 Z-10 F600"])
+        assert plunge.duration(**machine, zacceleration=10) == pytest.approx(1.0 + 1.0)
+
+    def test_toolpath_times_sequential(self):
+        # compare the vectorized planner to the sequential forward and backward pass
+        rng = np.random.default_rng(1)
+        lines = ["G1 X{:.3f} Y{:.3f} Z{:.3f} F{}".format(*rng.uniform(-5, 5, 3), rng.choice([300, 1200])) for _ in range(200)]
+        toolpath = libnanocnc.parse_gcode(lines)
+        acceleration, deviation = 50, 0.02
+        d = toolpath.lengths()
+        unit = np.column_stack((np.diff(toolpath.x), np.diff(toolpath.y), np.diff(toolpath.z))) / d[:, None]
+        speed = toolpath.feed / 60
+        accel = (acceleration / np.abs(unit)).min(axis=1)
+        v2 = [0.0]
+        for i in range(1, len(d)):
+            sinhalf = np.sqrt(0.5 * (1 + unit[i - 1] @ unit[i]))
+            v2.append(min(min(accel[i - 1], accel[i]) * deviation * sinhalf / (1 - sinhalf), speed[i - 1] ** 2, speed[i] ** 2, v2[-1] + 2 * accel[i - 1] * d[i - 1]))
+        v2.append(0.0)
+        for i in range(len(d) - 1, -1, -1):
+            v2[i] = min(v2[i], v2[i + 1] + 2 * accel[i] * d[i])
+        expected = 0
+        for i in range(len(d)):
+            peak = min(speed[i], np.sqrt((2 * accel[i] * d[i] + v2[i] + v2[i + 1]) / 2))
+            cruise = d[i] - (2 * peak ** 2 - v2[i] - v2[i + 1]) / (2 * accel[i])
+            expected += (2 * peak - np.sqrt(v2[i]) - np.sqrt(v2[i + 1])) / accel[i] + cruise / speed[i]
+        assert toolpath.duration(acceleration=acceleration, junction_deviation=deviation) == pytest.approx(expected)
+
+    def test_optimize_gcode(self):
+        lines = libnanocnc.make_gcode(self.sheet(1))
+        optimized = libnanocnc.optimize_gcode(lines)
+        assert optimized[:9] == ["M3 S12000", "G4 P3", "G0 Z10", "X11 Y-1", "G1 Z-2.5 F500", "Y11 F1200", "X-1", "Y-1", "X4"]
+        assert optimized[-2:] == ["G0 Z10", "M5"] and len(optimized) == len(lines)
+        before, after = libnanocnc.parse_gcode(lines), libnanocnc.parse_gcode(optimized)
+        assert after.x.tolist() == before.x.tolist() and after.z.tolist() == before.z.tolist()
+        # collinear and nearly collinear moves are merged, reversals are kept
+        lines = ["G1 X0 Y0 Z-1 F100", "G1 X1 Y0", "G1 X2 Y0.0004", "G1 X3 Y0", "G1 X1 Y0", "G1 X1 Y1"]
+        assert libnanocnc.optimize_gcode(lines) == ["G1 X0 Y0 Z-1 F100", "X3", "X1", "Y1"]
+        assert libnanocnc.optimize_gcode(lines, tolerance=0) == ["G1 X0 Y0 Z-1 F100", "X1", "X2 Y0.0004", "X3 Y0", "X1", "Y1"]
+        assert libnanocnc.optimize_gcode(["G0 X1.23456 Y-0.00001"], precision=2) == ["G0 X1.23 Y0"]
+
+    def test_schedule(self):
+        dictobj = self.sheet(3)
+        # the third part is cut with a smaller tool, a hole in the second part with an inner cut
+        dictobj["toollist"].append(dict(Diameter=1.0, Stepdown=5))
+        dictobj["pathlist"][5]["tool"] = 1
+        hole = libnanocnc.Polygon([22, 28, 28, 22, 22], [2, 2, 8, 8, 2])
+        dictobj["pathlist"] += [dict(id=6, parentid=None, pathattr=2, tool=None, polygon=hole.asdict()),
+                                dict(id=7, parentid=6, pathattr=5, tool=0, polygon=hole.expand(1).asdict())]
+        groups = libnanocnc.schedule(dictobj)
+        assert [(index, [path["id"] for path in paths]) for index, paths in groups] == [(1, [5]), (0, [7, 3, 1])]
+        lines = libnanocnc.make_gcode(copy.deepcopy(dictobj))
+        change = lines.index("M0")
+        assert lines[change - 3:change + 3] == ["G0 Z10.0000", "M5", "(tool 0 diameter 2.0)", "M0", "M3 S12000", "G4 P3"]
+        assert lines.count("M0") == 1 and lines[-1] == "M5"
+        programs = libnanocnc.Job().make_gcode(dictobj, split=True)
+        assert [index for index, _ in programs] == [1, 0]
+        assert programs[0][1][:-2] + programs[1][1] == lines[:change - 3] + lines[change + 1:]
+
+    def test_common_lines(self, monkeypatch):
+        common_lines = libnanocnc.common_lines
+        # the cut paths of two parts spaced by the tool diameter share the edge x = 11
+        dictobj = self.sheet(2)
+        for path in dictobj["pathlist"][2:]:
+            path["polygon"]["xlist"] = [x - 8 for x in path["polygon"]["xlist"]]
+        dictobj["tablist"][1]["pos"] = [17, -1]
+        separate = libnanocnc.make_gcode(copy.deepcopy(dictobj))
+        dictobj["settings"]["commonline"] = libnanocnc.COMMONLINE
+        lines = libnanocnc.make_gcode(copy.deepcopy(dictobj))
+        # the second path is cut as open path forth and back, the tab is kept in both directions
+        assert lines[23:] == [
+            "G0 X11.0000 Y-1.0000", "G1 Z-2.5000 F500", "G1 X16.0000 Y-1.0000 F1200", "G1 Z-2.0000 F500", "G1 X18.0000 Y-1.0000 F1200",
+            "G1 Z-2.5000 F500", "G1 X23.0000 Y-1.0000 F1200", "G1 X23.0000 Y11.0000 F1200", "G1 X11.0000 Y11.0000 F1200",
+            "G1 Z-5.0000 F500", "G1 X23.0000 Y11.0000 F1200", "G1 X23.0000 Y-1.0000 F1200", "G1 X18.0000 Y-1.0000 F1200",
+            "G1 Z-2.0000 F500", "G1 X16.0000 Y-1.0000 F1200", "G1 Z-5.0000 F500", "G1 X11.0000 Y-1.0000 F1200",
+            "G0 Z10.0000", "M5"
+        ]
+        # shared edges are cut twice unless enabled
+        assert len(separate) > len(lines)
+        shared, toolpath = [libnanocnc.parse_gcode(item) for item in (lines, separate)]
+        length = [np.hypot(np.diff(item.x), np.diff(item.y))[~item.rapid].sum() for item in (shared, toolpath)]
+        assert length[1] - length[0] == pytest.approx(2 * 12)
+        assert shared.times().sum() < toolpath.times().sum()
+        job = libnanocnc.Job()
+        assert job.make_gcode(dictobj) == lines
+        # shared edges are searched again only if a cut path changed
+        calls = []
+        monkeypatch.setattr(libnanocnc, "common_lines", lambda *args: calls.append(args) or common_lines(*args))
+        assert job.make_gcode(dictobj) == lines and calls == []
+        dictobj["tablist"][1]["pos"] = [20, -1]
+        job.make_gcode(dictobj)
+        assert len(calls) == 1
+        # pieces across the start point of a closed path are joined
+        square = [Point(x, y) for x, y in [(0, 0), (10, 0), (10, 10), (0, 10), (0, 0)]]
+        other = [Point(x, y) for x, y in [(0, 4), (0, 6), (-5, 6), (-5, 4), (0, 4)]]
+        pieces = common_lines([other, square])
+        assert pieces[0] == [other]
+        assert [[(p.x, p.y) for p in piece] for piece in pieces[1]] == [[(0, 4), (0, 0), (10, 0), (10, 10), (0, 10), (0, 6)]]
+
+    def test_job_incremental(self):
+        dictobj = self.sheet()
+        job = libnanocnc.Job()
+        lines = job.make_gcode(dictobj)
+        assert job.processed == 3
+        assert lines == libnanocnc.make_gcode(self.sheet())
+        assert job.make_gcode(dictobj) == lines
+        assert job.processed == 0
+        # entries are compared by the full key, a hash collision can not reuse another path
+        assert all(isinstance(entry[0], tuple) for entry in job.cache.values())
+        dictobj["tablist"][1]["pos"] = [26, -1]
+        lines = job.make_gcode(dictobj)
+        assert job.processed == 1
+        assert lines == libnanocnc.make_gcode(self.sheet() | dict(tablist=dictobj["tablist"]))
+        dictobj["settings"]["materialthickness"] = 4
+        job.make_gcode(dictobj)
+        assert job.processed == 3
+
+    @pytest.mark.parametrize("listname, key", [("pathlist", "parentid"), ("tablist", "refid"), ("overcutlist", "parentid")])
+    def test_make_gcode_missing_path(self, listname, key):
+        # both entry points reject a reference to a missing path the same way
+        for make_gcode in (libnanocnc.make_gcode, libnanocnc.Job().make_gcode):
+            dictobj = self.sheet(1)
+            if listname == "overcutlist":
+                dictobj["overcutlist"] = [dict(id=10, parentid=1, pos=[-1, -1])]
+            dictobj[listname][-1][key] = 99
+            with pytest.raises(ValueError, match="99"):
+                make_gcode(dictobj)
+
+    def test_pocket(self, caplog):
+        square = libnanocnc.Polygon([0, 20, 20, 0, 0], [0, 0, 20, 20, 0])
+        toolpath = libnanocnc.pocket(square, 1, 2)
+        # rings at 1, 3, 5, 7, 9 cut from the inside out
+        assert [xy[:, 0].min() for xy, _ in toolpath] == pytest.approx([9, 7, 5, 3, 1])
+        assert [linked for _, linked in toolpath] == [False, True, True, True, True]
+        assert all(np.array_equal(xy[0], xy[-1]) for xy, _ in toolpath)
+        # no material is left around an island
+        island = libnanocnc.Polygon([8, 12, 12, 8, 8], [8, 8, 12, 12, 8])
+        toolpath = libnanocnc.pocket(square, 1, 0.8, [island])
+        xy = np.vstack([xy for xy, _ in toolpath])
+        assert np.abs(xy - 10).max(axis=1).min() == pytest.approx(3)
+        assert toolpath[-1][0][:, 0].min() == pytest.approx(1)
+        # splitting into two pockets is not supported
+        dumbbell = libnanocnc.Polygon([0, 40, 40, 60, 60, 100, 100, 60, 60, 40, 40, 0, 0], [0, 0, 40, 40, 0, 0, 100, 100, 60, 60, 100, 100, 0])
+        assert len(libnanocnc.pocket(dumbbell, 1, 2)) == 5
+        assert "splits" in caplog.text
+        assert libnanocnc.pocket(square, 11, 2) == []
+
+    def test_pocket_gcode(self):
+        dictobj = self.sheet(1)
+        dictobj["pathlist"][0]["polygon"] = dict(xlist=[-10, 30, 30, -10, -10], ylist=[-10, -10, 30, 30, -10])
+        dictobj["pathlist"][1].update(operation="pocket", islands=[2])
+        dictobj["pathlist"].append(dict(id=2, parentid=None, pathattr=1, tool=None, polygon=dict(xlist=[0, 10, 10, 0, 0], ylist=[0, 0, 10, 10, 0])))
+        dictobj["tablist"] = []
+        lines = libnanocnc.make_gcode(self.sheet(0) | dict(pathlist=dictobj["pathlist"]))
+        toolpath = libnanocnc.parse_gcode(lines)
+        cut = ~toolpath.rapid & (np.diff(toolpath.z) == 0)
+        assert sorted(set(toolpath.z[1:][cut].tolist())) == [-5, -2.5]
+        x, y = toolpath.x[1:][cut], toolpath.y[1:][cut]
+        assert x.min() == y.min() == -9 and x.max() == y.max() == 29
+        assert (np.maximum(np.abs(x - 5), np.abs(y - 5)) >= 6 - 1E-9).all()
+        job = libnanocnc.Job()
+        assert job.make_gcode(dictobj) == lines
+        dictobj["pathlist"][2]["polygon"]["xlist"] = [1, 10, 10, 1, 1]
+        assert job.make_gcode(dictobj) != lines and job.processed == 1
+
+    def test_journal(self, tmp_path):
+        filename = tmp_path / "job.json"
+        dictobj = self.sheet(1)
+        dictobj["cornerlist"] = [dict(id=1, parentid=1, pos=[11, -1])]
+        journal = Journal(filename, interval=0.01)
+        journal.compact(dictobj)
+        cut = dict(id=7, parentid=0, pathattr=5, tool=0, polygon=dict(xlist=[1, 9, 9, 1, 1], ylist=[1, 1, 9, 9, 1]))
+        records = [
+            dict(op="overcut", add=True, overcut=dict(id=1, parentid=1, pos=[11, -1])),
+            dict(op="tab", add=True, tab=dict(refid=1, parentid=0, pos=[5, 11], width=2.0, height=3.0, linepoints=[])),
+            dict(op="tab", add=False, tab=dict(refid=1, parentid=0, pos=[5, -1], width=2.0, height=3.0, linepoints=[])),
+            dict(op="path", id=0, pathattr=2, tool=0, cut=cut, cornerlist=[dict(id=2, parentid=7, pos=[1, 1])]),
+        ]
+        for record in records:
+            journal.append(record)
+        time.sleep(0.1)
+        # journal is written by background thread
+        assert Journal.read(filename) == records
+        with open(str(filename) + ".journal", "a") as fh:
+            fh.write('{"op": "ta')
+        journal.close()
+        with open(filename) as fh:
+            recovered = apply_journal(json.load(fh), Journal.read(filename))
+        assert [path["id"] for path in recovered["pathlist"]] == [0, 7]
+        assert recovered["pathlist"][0]["pathattr"] == 2
+        # the tabs of the replaced cut path are removed with it
+        assert recovered["tablist"] == []
+        assert recovered["overcutlist"] == []
+        assert recovered["cornerlist"] == [dict(id=2, parentid=7, pos=[1, 1])]
+
+        journal = Journal(filename)
+        journal.compact(recovered)
+        journal.close()
+        assert Journal.read(filename) == []
+
+    def test_apply_journal_delete_cut(self):
+        dictobj = self.sheet(2)
+        tab = dict(refid=3, parentid=2, pos=[17, 11], width=2.0, height=3.0, linepoints=[])
+        dictobj["tablist"].append(tab)
+        dictobj["overcutlist"] = [dict(id=1, parentid=3, pos=[23, 11])]
+        record = dict(op="path", id=2, pathattr=2, tool=None, cut=None, cornerlist=[], overcutlist=[], tablist=[])
+        deleted = apply_journal(copy.deepcopy(dictobj), [record])
+        assert [path["id"] for path in deleted["pathlist"]] == [0, 1, 2]
+        assert [item["refid"] for item in deleted["tablist"]] == [1] and deleted["overcutlist"] == []
+        assert libnanocnc.make_gcode(deleted)
+        # undo restores the cut path with its tabs and overcuts
+        cut = dictobj["pathlist"][3]
+        record = dict(record, pathattr=5, tool=0, cut=cut, overcutlist=dictobj["overcutlist"], tablist=dictobj["tablist"][1:])
+        restored = apply_journal(deleted, [record])
+        assert restored["tablist"] == dictobj["tablist"] and restored["overcutlist"] == dictobj["overcutlist"]
+
+    def test_sender(self):
+        # fake controller at a pty which executes one line per millisecond
+        master, slave = os.openpty()
+        received, occupancy = [], []
+
+        def controller():
+            buffer = b""
+            while True:
+                try:
+                    buffer += os.read(master, 1024)
+                except OSError:
+                    return
+                occupancy.append(len(buffer))
+                while b"\n" in buffer:
+                    line, buffer = buffer.split(b"\n", 1)
+                    time.sleep(0.001)
+                    received.append(line.decode())
+                    os.write(master, b"error:20\r\n" if line == b"G99" else b"ok\r\n")
+
+        thread = threading.Thread(target=controller)
+        thread.start()
+        sender = Sender(os.ttyname(slave))
+        os.close(slave)
+        lines = ("G1 X{} Y{} F1200 ; move {}".format(index, index % 7, index) for index in range(300))
+        sender.put("(start)")
+        sender.put("G99")
+        status = sender.send(lines)
+        thread.join()
+        os.close(master)
+        assert received == ["G99"] + ["G1X{}Y{}F1200".format(index, index % 7) for index in range(300)]
+        assert sender.errors == [("G99", "error:20")]
+        assert status["lines"] == status["acknowledged"] == 301 and status["occupancy"] == 0
+        # lines are sent ahead of the ok without overflowing the receive buffer
+        assert 64 < max(occupancy) <= RX_BUFFER
+        assert status["max_occupancy"] <= RX_BUFFER and status["mean_occupancy"] > 0
+        with pytest.raises(ValueError):
+            sender.put("G1 X" + "1" * RX_BUFFER)